@@ -1,54 +1,264 @@
 from os import path
 import os
-import pickle
+import json
+import hashlib
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
 import torch
-from torch.utils.data import DataLoader, Dataset
+from torch.utils.data import DataLoader, Dataset, Subset
+
+# Bump whenever the layout of the binary cache changes, so stale caches get rebuilt
+CACHE_FORMAT_VERSION = 1
+
+
+def file_sha256(file_path, chunk_size=1 << 20):
+    """
+    Compute the SHA-256 hex digest of a file, reading it in chunks.
+
+    Args:
+        file_path (str): Path of the file to hash.
+        chunk_size (int): Number of bytes read at a time.
+
+    Returns:
+        str: The hex digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_fingerprint(file_path, sha256=None):
+    """
+    Describe the current state of a source file (size, modification time and content hash).
+
+    Args:
+        file_path (str): Path of the source file.
+        sha256 (str): Already computed hash of the file, if any.
+
+    Returns:
+        dict: The fingerprint of the file.
+    """
+    stat = os.stat(file_path)
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': sha256 if sha256 is not None else file_sha256(file_path),
+    }
 
 class MoviesSummaryDataset(Dataset):
     """
     A dataset implements 2 functions
         - __len__  (returns the number of samples in our dataset)
         - __getitem__ (returns a sample from the dataset at the given index idx)
+
+    The plain TSV file is parsed once and cached in a columnar binary file (Arrow IPC / Feather,
+    uncompressed) under `<data_dir>/bin/`. The cache is memory-mapped on load, so only the requested
+    columns are read, and the pages are shared between processes reading the same file.
+    The cache is rebuilt whenever the source file or the column names change.
+
+    The Arrow table stays the backing store: numeric columns without missing values are exposed as zero-copy
+    NumPy views of the mapped file, the other columns are only converted for the rows of each batch.
+    The pandas DataFrame `data` is only materialized when used (e.g. `save_data`).
     """
 
-    def __init__(self, data_dir, filename, categories):
+    def __init__(self, data_dir, filename, categories, columns=None, rebuild_cache=False):
+        """
+        Args:
+            data_dir (str): Directory containing the 'plain' (and 'bin') folders.
+            filename (str): Name of the TSV file in the 'plain' folder.
+            categories (list): Names of all the columns of the TSV file.
+            columns (list): Subset of `categories` to load. Defaults to all of them.
+            rebuild_cache (bool): Force the binary cache to be rebuilt from the TSV file.
+        """
         super().__init__()
         if not path.isdir(data_dir):
             raise ValueError(f"The directory {data_dir} does not exist.")
         if not path.isfile(path.join(data_dir, 'plain', filename)):
             raise ValueError(f"The file {filename} does not exist in the directory {data_dir}.")
-        
+
         self.filename = filename
-        self.categories = categories
+        self.categories = list(categories)
+        self.columns = self.categories if columns is None else list(columns)
 
-        binary_file_path = path.join(data_dir, 'bin', f"{filename}.pkl")
-        if path.isfile(binary_file_path):
-            with open(binary_file_path, 'rb') as f:
-                self.data = pickle.load(f)
-        else:
-            self.data = pd.read_csv(path.join(data_dir, 'plain', filename), sep='\t', header=None, names=categories)
-            os.makedirs(os.path.dirname(binary_file_path), exist_ok=True)
-            with open(binary_file_path, 'wb') as f:
-                pickle.dump(self.data, f)
+        unknown_columns = [column for column in self.columns if column not in self.categories]
+        if unknown_columns:
+            raise ValueError(f"The columns {unknown_columns} are not part of the categories of {filename}.")
+
+        plain_file_path = path.join(data_dir, 'plain', filename)
+        binary_file_path = path.join(data_dir, 'bin', f"{filename}.arrow")
+        meta_file_path = path.join(data_dir, 'bin', f"{filename}.meta.json")
+
+        if rebuild_cache or not self._is_cache_valid(plain_file_path, binary_file_path, meta_file_path):
+            self._build_cache(plain_file_path, binary_file_path, meta_file_path)
+
+        # Memory-mapped: only the pages of the selected columns are ever read from disk
+        self.table = feather.read_table(binary_file_path, columns=self.columns, memory_map=True)
+        self._data = None
+        self._views = {}
+
+    def _is_cache_valid(self, plain_file_path, binary_file_path, meta_file_path):
+        """
+        Check whether the binary cache matches the current source file and categories.
+
+        The content hash is only computed when the size or modification time changed, so that
+        a touched but identical file does not trigger a rebuild.
+
+        Returns:
+            bool: True if the cache can be used as is.
+        """
+        if not (path.isfile(binary_file_path) and path.isfile(meta_file_path)):
+            return False
+
+        try:
+            with open(meta_file_path, 'r') as f:
+                meta = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return False
+
+        if meta.get('version') != CACHE_FORMAT_VERSION or meta.get('categories') != self.categories:
+            return False
+
+        cached = meta.get('source', {})
+        stat = os.stat(plain_file_path)
+        if cached.get('size') == stat.st_size and cached.get('mtime_ns') == stat.st_mtime_ns:
+            return True
+        if cached.get('size') != stat.st_size:
+            return False
+
+        # Same size but different modification time: compare the content
+        sha256 = file_sha256(plain_file_path)
+        if cached.get('sha256') != sha256:
+            return False
+
+        meta['source'] = source_fingerprint(plain_file_path, sha256=sha256)
+        self._write_meta(meta_file_path, meta)
+        return True
+
+    def _build_cache(self, plain_file_path, binary_file_path, meta_file_path):
+        """
+        Parse the TSV file and write it as an uncompressed Arrow file with its metadata.
+        """
+        df = pd.read_csv(plain_file_path, sep='\t', header=None, names=self.categories, low_memory=False)
+
+        os.makedirs(path.dirname(binary_file_path), exist_ok=True)
+        tmp_file_path = f"{binary_file_path}.tmp"
+        # Uncompressed so that the file can be memory-mapped without decoding
+        feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), tmp_file_path, compression='uncompressed')
+        os.replace(tmp_file_path, binary_file_path)
+
+        self._write_meta(meta_file_path, {
+            'version': CACHE_FORMAT_VERSION,
+            'categories': self.categories,
+            'source': source_fingerprint(plain_file_path),
+        })
+
+    @staticmethod
+    def _write_meta(meta_file_path, meta):
+        tmp_file_path = f"{meta_file_path}.tmp"
+        with open(tmp_file_path, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_file_path, meta_file_path)
+
+    @property
+    def data(self):
+        """The loaded columns as a pandas DataFrame, materialized (copied in memory) on first use."""
+        if self._data is None:
+            self._data = self.table.to_pandas()
+        return self._data
 
     def __len__(self):
         """Return the total number of samples."""
-        return len(self.data)
+        return self.table.num_rows
 
     def __getitem__(self, idx):
         """
         Args:
-            idx (int): Index of the data item to retrieve.
+            idx (int, slice or list): Index of the data item to retrieve, or indices of a batch.
         
         Returns:
-            Sample (Tensor): A single data sample, optionally transformed.
+            Sample (Series): A single data sample, or a batch (dict) if several indices are given.
         """
-        if idx < 0 or idx >= len(self.data):
+        if not isinstance(idx, (int, np.integer)):
+            return self.get_batch(idx)
+
+        if idx < 0 or idx >= len(self):
             raise IndexError(f"Index {idx} is out of bounds.")
         
-        sample = self.data.iloc[idx]
+        sample = pd.Series({column: values[0] for column, values in self.get_batch([idx]).items()}, name=idx)
         return sample
+
+    def __getitems__(self, indices):
+        """Batched fetch used by torch's DataLoader instead of one __getitem__ call per sample."""
+        return self.get_batch(indices, as_tensor=True)
+
+    def _view(self, column):
+        """Zero-copy NumPy view of a numeric column without missing values, None for the other columns."""
+        if column not in self._views:
+            chunked = self.table.column(column)
+            is_numeric = pa.types.is_integer(chunked.type) or pa.types.is_floating(chunked.type)
+            if is_numeric and chunked.num_chunks == 1 and chunked.null_count == 0:
+                self._views[column] = chunked.chunk(0).to_numpy(zero_copy_only=True)
+            else:
+                self._views[column] = None
+        return self._views[column]
+
+    def column(self, column):
+        """
+        Args:
+            column (str): Name of a loaded column.
+
+        Returns:
+            np.ndarray: The whole column, a zero-copy view when possible (see `get_batch`).
+        """
+        view = self._view(column)
+        return view if view is not None else self.table.column(column).to_numpy()
+
+    @property
+    def arrays(self):
+        """Column name -> NumPy array of the whole column (see `column`)."""
+        return {column: self.column(column) for column in self.columns}
+
+    def get_batch(self, indices, columns=None, as_tensor=False):
+        """
+        Retrieve a batch of samples as column slices instead of one pandas Series per row.
+
+        Numeric columns without missing values are indexed on zero-copy views of the memory-mapped file
+        (a slice returns a view, a list or array of indices a single fancy-indexing call per column).
+        The other columns (strings, missing values) are gathered by Arrow and only the rows of the batch are converted.
+
+        Args:
+            indices (slice, list or np.ndarray): Indices of the samples.
+            columns (list): Columns to return. Defaults to all loaded columns.
+            as_tensor (bool): Convert the numeric columns to torch tensors (string columns stay NumPy arrays).
+
+        Returns:
+            dict: Column name -> values of the batch.
+        """
+        if not isinstance(indices, slice):
+            indices = np.asarray(indices, dtype=np.int64)
+            if indices.size and (indices.min() < -len(self) or indices.max() >= len(self)):
+                raise IndexError(f"Indices out of bounds for a dataset of size {len(self)}.")
+
+        columns = self.columns if columns is None else columns
+        batch, positions = {}, None
+        for column in columns:
+            view = self._view(column)
+            if view is not None:
+                values = view[indices]
+            else:
+                if positions is None:
+                    positions = np.arange(len(self))[indices] if isinstance(indices, slice) else indices % max(len(self), 1)
+                values = self.table.column(column).take(pa.array(positions, type=pa.int64())).to_numpy()
+            if as_tensor and values.dtype.kind in 'biuf':
+                if not values.flags.writeable:
+                    values = values.copy()
+                values = torch.from_numpy(values)
+            batch[column] = values
+        return batch
     
     def save_data(self, save_dir):
         """
@@ -64,10 +274,95 @@ class MoviesSummaryDataset(Dataset):
         self.data.to_csv(csv_file_path, sep='\t', index=False)
 
 
-class SomeDatamodule(DataLoader):
+def collate_batch(batch):
+    """Batches are already collated by MoviesSummaryDataset.__getitems__, keep them as they are."""
+    return batch
+
+
+class SomeDatamodule:
     """
     Allows you to sample train/val/test data, to later do training with models.
-        
+
+    The splits are seeded and optionally stratified on a column of the dataset. Every dataloader
+    yields pre-collated batches (dict of column -> tensor / array), fetched in one call per batch.
     """
-    def __init__(self):
-        super().__init__()
\ No newline at end of file
+    def __init__(self, dataset, batch_size=64, val_size=0.1, test_size=0.1, stratify_by=None,
+                 n_bins=None, num_workers=0, seed=42):
+        """
+        Args:
+            dataset (MoviesSummaryDataset): The dataset to split.
+            batch_size (int): Number of samples per batch.
+            val_size (float): Fraction of the samples used for validation.
+            test_size (float): Fraction of the samples used for testing.
+            stratify_by (str): Column used to stratify the splits, if any.
+            n_bins (int): If set, the stratification column is binned into `n_bins` quantiles
+                (for continuous columns such as 'box_office_revenue').
+            num_workers (int): Number of worker processes of the dataloaders.
+            seed (int): Seed of the splits and of the shuffling.
+        """
+        if val_size < 0 or test_size < 0 or val_size + test_size >= 1:
+            raise ValueError("val_size and test_size must be positive and sum to less than 1.")
+
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.seed = seed
+
+        train_indices, val_indices, test_indices = self._split(val_size, test_size, stratify_by, n_bins)
+        self.train_set = Subset(dataset, train_indices)
+        self.val_set = Subset(dataset, val_indices)
+        self.test_set = Subset(dataset, test_indices)
+
+    def _split(self, val_size, test_size, stratify_by, n_bins):
+        """
+        Split the indices of the dataset, keeping the proportions of each stratum in every split.
+
+        Returns:
+            tuple: Train, validation and test indices (sorted).
+        """
+        rng = np.random.default_rng(self.seed)
+
+        if stratify_by is None:
+            strata = np.zeros(len(self.dataset), dtype=np.int64)
+        else:
+            values = self.dataset.column(stratify_by)
+            if n_bins is not None:
+                values = pd.qcut(values, q=n_bins, duplicates='drop')
+            # Missing values get their own stratum
+            strata = pd.factorize(values, use_na_sentinel=False)[0]
+
+        train_indices, val_indices, test_indices = [], [], []
+        for stratum in np.unique(strata):
+            indices = rng.permutation(np.flatnonzero(strata == stratum))
+            n_test = int(round(len(indices) * test_size))
+            n_val = int(round(len(indices) * val_size))
+            test_indices.append(indices[:n_test])
+            val_indices.append(indices[n_test:n_test + n_val])
+            train_indices.append(indices[n_test + n_val:])
+
+        return tuple(np.sort(np.concatenate(split)) for split in (train_indices, val_indices, test_indices))
+
+    def _dataloader(self, subset, shuffle):
+        generator = torch.Generator()
+        generator.manual_seed(self.seed)
+        return DataLoader(
+            subset,
+            batch_size=self.batch_size,
+            shuffle=shuffle,
+            generator=generator,
+            collate_fn=collate_batch,
+            num_workers=self.num_workers,
+            persistent_workers=self.num_workers > 0,
+        )
+
+    def train_dataloader(self):
+        """Shuffled batches of the training split."""
+        return self._dataloader(self.train_set, shuffle=True)
+
+    def val_dataloader(self):
+        """Batches of the validation split, in order."""
+        return self._dataloader(self.val_set, shuffle=False)
+
+    def test_dataloader(self):
+        """Batches of the test split, in order."""
+        return self._dataloader(self.test_set, shuffle=False)
@@ -0,0 +1,167 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+TVTROPES_FILENAME = 'tvtropes.clusters.txt'
+NAME_CLUSTERS_FILENAME = 'name.clusters.txt'
+
+TVTROPES_COLUMNS = ['trope', 'character_name', 'movie_name', 'freebase_character_actor_id', 'actor_name']
+NAME_CLUSTERS_COLUMNS = ['cluster_name', 'freebase_character_actor_id']
+
+PERSONA_FEATURES = ['num_trope_characters', 'num_tropes', 'num_cluster_characters', 'num_name_clusters']
+
+
+def load_tvtropes(file_path):
+    """
+    Parses tvtropes.clusters.txt ('trope<TAB>{"char": ..., "movie": ..., "id": ..., "actor": ...}' lines) in one pass:
+    the JSON objects of all the lines are decoded by a single json.loads call.
+
+    Args:
+        file_path (str): Path of tvtropes.clusters.txt.
+
+    Returns:
+        pd.DataFrame: TVTROPES_COLUMNS, with categorical tropes.
+    """
+    tropes, objects = [], []
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line:
+                continue
+            trope, _, obj = line.partition('\t')
+            tropes.append(trope)
+            objects.append(obj)
+
+    records = json.loads('[' + ','.join(objects) + ']')
+    return pd.DataFrame({
+        'trope': pd.Categorical(tropes),
+        'character_name': [record.get('char') for record in records],
+        'movie_name': [record.get('movie') for record in records],
+        'freebase_character_actor_id': [record.get('id') for record in records],
+        'actor_name': [record.get('actor') for record in records],
+    }, columns=TVTROPES_COLUMNS)
+
+
+def load_name_clusters(file_path):
+    """
+    Parses name.clusters.txt ('character name<TAB>freebase character/actor id' lines).
+
+    Args:
+        file_path (str): Path of name.clusters.txt.
+
+    Returns:
+        pd.DataFrame: NAME_CLUSTERS_COLUMNS, with categorical cluster names.
+    """
+    df = pd.read_csv(file_path, sep='\t', header=None, names=NAME_CLUSTERS_COLUMNS, dtype=str,
+                     quoting=3, keep_default_na=False)
+    df['cluster_name'] = df['cluster_name'].astype('category')
+    return df
+
+
+class PersonaClusters:
+    """
+    The tvtropes and name clusters of the CMU corpus, with hash indexes on 'freebase_character_actor_id'
+    (the character/actor map id of character.metadata.tsv).
+    """
+
+    def __init__(self, data_dir):
+        """
+        Args:
+            data_dir (str): Directory containing the 'plain' folder, with tvtropes.clusters.txt and name.clusters.txt.
+        """
+        plain_dir = os.path.join(data_dir, 'plain')
+        for filename in (TVTROPES_FILENAME, NAME_CLUSTERS_FILENAME):
+            if not os.path.isfile(os.path.join(plain_dir, filename)):
+                raise ValueError(f"File {filename} does not exist in {plain_dir}")
+
+        self.tvtropes = load_tvtropes(os.path.join(plain_dir, TVTROPES_FILENAME))
+        self.name_clusters = load_name_clusters(os.path.join(plain_dir, NAME_CLUSTERS_FILENAME))
+
+        # Hash indexes: character/actor id -> positions of its rows
+        self.trope_index = pd.Index(self.tvtropes['freebase_character_actor_id'])
+        self.cluster_index = pd.Index(self.name_clusters['freebase_character_actor_id'])
+
+    def tropes_of(self, freebase_character_actor_ids):
+        """
+        Args:
+            freebase_character_actor_ids (list): Character/actor ids.
+
+        Returns:
+            pd.DataFrame: 'freebase_character_actor_id' and 'trope' of the ids having a trope.
+        """
+        positions, _ = self.trope_index.get_indexer_non_unique(pd.Index(freebase_character_actor_ids))
+        return self.tvtropes.iloc[positions[positions >= 0]][['freebase_character_actor_id', 'trope']].reset_index(drop=True)
+
+    def clusters_of(self, freebase_character_actor_ids):
+        """
+        Args:
+            freebase_character_actor_ids (list): Character/actor ids.
+
+        Returns:
+            pd.DataFrame: 'freebase_character_actor_id' and 'cluster_name' of the ids in a name cluster.
+        """
+        positions, _ = self.cluster_index.get_indexer_non_unique(pd.Index(freebase_character_actor_ids))
+        return self.name_clusters.iloc[positions[positions >= 0]].reset_index(drop=True)
+
+    def join(self, df_characters):
+        """
+        Adds the tropes and name clusters of each character (hash joins on 'freebase_character_actor_id').
+        A character with several tropes gets one row per trope, and all its name clusters are kept in a list.
+
+        Args:
+            df_characters (pd.DataFrame): Characters with 'freebase_character_actor_id'.
+
+        Returns:
+            pd.DataFrame: The characters with a 'trope' column and a 'cluster_names' column (sorted list of
+            the name clusters of the character), NaN when unknown.
+        """
+        tropes = self.tvtropes[['freebase_character_actor_id', 'trope']]
+        clusters = (self.name_clusters.groupby('freebase_character_actor_id', sort=False)['cluster_name']
+                    .agg(lambda names: sorted(set(names))).rename('cluster_names').reset_index())
+        return (df_characters.merge(tropes, on='freebase_character_actor_id', how='left')
+                .merge(clusters, on='freebase_character_actor_id', how='left'))
+
+    def movie_features(self, df_characters):
+        """
+        Per-movie persona features: number of characters with a trope, of distinct tropes, of characters
+        in a name cluster and of distinct name clusters.
+
+        Args:
+            df_characters (pd.DataFrame): Characters with 'wikipedia_movie_id' and 'freebase_character_actor_id'.
+
+        Returns:
+            pd.DataFrame: PERSONA_FEATURES indexed by 'wikipedia_movie_id' (0 for the movies without any).
+        """
+        joined = self.join(df_characters[['wikipedia_movie_id', 'freebase_character_actor_id']])
+        with_trope = joined.dropna(subset=['trope'])
+        with_cluster = joined.dropna(subset=['cluster_names']).drop_duplicates(subset=['wikipedia_movie_id', 'freebase_character_actor_id'])
+        cluster_names = with_cluster[['wikipedia_movie_id', 'cluster_names']].explode('cluster_names')
+
+        features = pd.DataFrame({
+            'num_trope_characters': with_trope.groupby('wikipedia_movie_id')['freebase_character_actor_id'].nunique(),
+            'num_tropes': with_trope.groupby('wikipedia_movie_id', observed=True)['trope'].nunique(),
+            'num_cluster_characters': with_cluster.groupby('wikipedia_movie_id').size(),
+            'num_name_clusters': cluster_names.groupby('wikipedia_movie_id')['cluster_names'].nunique(),
+        }).reindex(pd.Index(df_characters['wikipedia_movie_id'].unique(), name='wikipedia_movie_id'))
+        return features.fillna(0).astype(np.int64)[PERSONA_FEATURES].sort_index()
+
+    def trope_matrix(self, df_characters):
+        """
+        Counts of each trope among the characters of each movie, as a sparse matrix (e.g. model features).
+
+        Args:
+            df_characters (pd.DataFrame): Characters with 'wikipedia_movie_id' and 'freebase_character_actor_id'.
+
+        Returns:
+            tuple: The CSR matrix (movies x tropes), the movie ids (rows) and the tropes (columns).
+        """
+        joined = self.join(df_characters[['wikipedia_movie_id', 'freebase_character_actor_id']]).dropna(subset=['trope'])
+        movie_codes, movie_ids = pd.factorize(joined['wikipedia_movie_id'], sort=True)
+        trope_codes = joined['trope'].cat.codes.to_numpy()
+        matrix = sparse.csr_matrix(
+            (np.ones(len(joined), dtype=np.float32), (movie_codes, trope_codes)),
+            shape=(len(movie_ids), len(self.tvtropes['trope'].cat.categories))
+        )
+        return matrix, np.asarray(movie_ids), list(self.tvtropes['trope'].cat.categories)
@@ -0,0 +1,193 @@
+import os
+import abc
+import joblib
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import StandardScaler
+from sklearn.metrics import mean_absolute_error, mean_squared_error, precision_score, recall_score, f1_score, accuracy_score
+
+
+def regression_metrics(y_true, y_pred):
+    """
+    Computes MAE, MSE and RMSE.
+
+    Args:
+        y_true: True values.
+        y_pred: Predicted values.
+
+    Returns:
+        dict: Evaluation metrics (MAE, MSE, RMSE).
+    """
+    mae = mean_absolute_error(y_true, y_pred)
+    mse = mean_squared_error(y_true, y_pred)
+    return {"MAE": mae, "MSE": mse, "RMSE": np.sqrt(mse)}
+
+
+def classification_metrics(y_true, y_pred):
+    """
+    Computes accuracy and weighted precision, recall and F1 score.
+
+    Args:
+        y_true: True class labels.
+        y_pred: Predicted class labels.
+
+    Returns:
+        dict: Evaluation metrics (Accuracy, Precision, Recall, F1 Score).
+    """
+    return {
+        "Accuracy": accuracy_score(y_true, y_pred),
+        "Precision": precision_score(y_true, y_pred, average='weighted', zero_division=0),
+        "Recall": recall_score(y_true, y_pred, average='weighted', zero_division=0),
+        "F1 Score": f1_score(y_true, y_pred, average='weighted', zero_division=0),
+    }
+
+
+class BaseModel(abc.ABC):
+    """
+    Common interface of the models of src.models.
+
+    - `train(X, y)` / `predict(X)` work on already prepared (scaled) features, as in the notebook.
+    - `train_raw(X, y)` fits a StandardScaler on raw features (e.g. a DataFrame of the model features) before training,
+      and `predict_batch(X)` applies the same column selection and scaling to raw features, by batches.
+    - `score(X, y)` returns the evaluation metrics without printing, with the same argument order for every model.
+    - `save(path)` / `load(path)` store the fitted model and scaler as a single artifact, whose arrays are
+      memory-mapped on load.
+    """
+
+    task = 'regression'
+    # False for models whose fitted arrays must be writable (libsvm), which are then loaded in memory
+    mmap_safe = True
+
+    def __init__(self, verbose=True):
+        """
+        Args:
+            verbose: Print the evaluation reports.
+        """
+        self.verbose = verbose
+        self.scaler = None
+        self.feature_names = None
+
+    def log(self, message=""):
+        """Prints a message, unless the model is quiet."""
+        if self.verbose:
+            print(message)
+
+    @abc.abstractmethod
+    def train(self, X_train, y_train):
+        """
+        Trains the model on prepared features.
+
+        Args:
+            X_train: Training feature data.
+            y_train: Target variable for training.
+        """
+
+    @abc.abstractmethod
+    def predict(self, X):
+        """
+        Args:
+            X: Feature data (prepared as for `train`).
+
+        Returns:
+            The predictions.
+        """
+
+    def _predict_prepared(self, X):
+        """Predicts from features prepared by `prepare_features`."""
+        return self.predict(X)
+
+    def train_raw(self, X_train, y_train, scale=True):
+        """
+        Fits a StandardScaler on raw features, then trains the model on the scaled features.
+
+        Args:
+            X_train: Raw training features (a DataFrame keeps track of the feature names), or a scipy sparse matrix
+                (e.g. multi-hot genres), which is only scaled, not centered, to stay sparse.
+            y_train: Target variable for training.
+            scale: Standardize the features.
+
+        Returns:
+            The trained model.
+        """
+        self.feature_names = list(X_train.columns) if hasattr(X_train, 'columns') else None
+        is_sparse = sparse.issparse(X_train)
+        X_train = sparse.csr_matrix(X_train, dtype=float) if is_sparse else np.asarray(X_train, dtype=float)
+        self.scaler = StandardScaler(with_mean=not is_sparse).fit(X_train) if scale else None
+        self.train(self.scaler.transform(X_train) if scale else X_train, y_train)
+        return self
+
+    def prepare_features(self, X):
+        """
+        Selects the training features (if known) and applies the fitted scaler (if any) to raw features.
+
+        Args:
+            X: Raw features.
+
+        Returns:
+            np.ndarray: Features ready for `predict`.
+        """
+        if self.feature_names is not None and hasattr(X, 'columns'):
+            X = X[self.feature_names]
+        X = sparse.csr_matrix(X, dtype=float) if sparse.issparse(X) else np.asarray(X, dtype=float)
+        return self.scaler.transform(X) if self.scaler is not None else X
+
+    def predict_batch(self, X, batch_size=65536):
+        """
+        Predicts from raw features, e.g. thousands of candidate titles, without refitting or re-scaling by hand.
+
+        Args:
+            X: Raw features (same columns as in `train_raw`).
+            batch_size: Number of rows prepared and predicted at once.
+
+        Returns:
+            np.ndarray: The predictions.
+        """
+        predictions = [
+            np.asarray(self._predict_prepared(self.prepare_features(X[start:start + batch_size]))).ravel()
+            for start in range(0, X.shape[0], batch_size)
+        ]
+        return np.concatenate(predictions) if predictions else np.empty(0)
+
+    def score(self, X, y):
+        """
+        Computes the evaluation metrics without printing them.
+
+        Args:
+            X: Feature data (prepared as for `predict`).
+            y: True values.
+
+        Returns:
+            dict: Regression or classification metrics, depending on the model.
+        """
+        y_pred = np.asarray(self.predict(X)).ravel()
+        if self.task == 'classification':
+            return classification_metrics(y, y_pred)
+        return regression_metrics(y, y_pred)
+
+    def save(self, path):
+        """
+        Saves the fitted model, with its scaler and feature names, as a single uncompressed artifact.
+
+        Args:
+            path: Path of the artifact.
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        joblib.dump(self, path)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """
+        Loads a model saved with `save`.
+
+        Args:
+            path: Path of the artifact.
+            mmap_mode: Memory-map the arrays of the artifact ('r'), or None to load them in memory
+                (always None for the models that are not `mmap_safe`).
+
+        Returns:
+            The loaded model.
+        """
+        model = joblib.load(path, mmap_mode=mmap_mode if cls.mmap_safe else None)
+        if not isinstance(model, cls):
+            raise TypeError(f"{path} contains a {type(model).__name__}, not a {cls.__name__}.")
+        return model
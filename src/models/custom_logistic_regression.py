@@ -1,62 +1,207 @@
 import numpy as np
-from sklearn.metrics import precision_score, recall_score, f1_score, accuracy_score
+from scipy import sparse
+from src.models.base_model import BaseModel, classification_metrics
 
-class CustomLogisticRegression:
-    def __init__(self, gamma=0.1, lambda_=0.01, max_iters=150, convergence_threshold=1e-8, threshold=0.5):
+
+def batch_iter(y, tx, batch_size, shuffle=True, rng=None):
+    """
+    Generates mini-batches of a dataset, epoch after epoch.
+
+    Args:
+        y: Target values.
+        tx: Feature matrix.
+        batch_size: Number of samples per batch.
+        shuffle: Shuffle the samples at each epoch.
+        rng: NumPy random generator used for shuffling.
+
+    Yields:
+        Tuples (y_batch, tx_batch).
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    n_samples = y.shape[0]
+    while True:
+        indices = rng.permutation(n_samples) if shuffle else np.arange(n_samples)
+        for start in range(0, n_samples, batch_size):
+            batch_indices = indices[start:start + batch_size]
+            yield y[batch_indices], tx[batch_indices]
+
+
+def add_bias(x):
+    """
+    Prepends the bias column to a feature matrix, keeping scipy sparse matrices (e.g. text features) sparse.
+
+    Args:
+        x: Feature matrix, dense or sparse.
+
+    Returns:
+        Feature matrix with bias term (CSR if x is sparse).
+    """
+    if sparse.issparse(x):
+        return sparse.hstack([np.ones((x.shape[0], 1)), x], format='csr')
+    return np.c_[np.ones((x.shape[0], 1)), x]
+
+
+def weighted_f1(y_true, y_pred):
+    """
+    Weighted F1 score of binary predictions, computed for every column of y_pred at once
+    (same value as sklearn's f1_score(average='weighted'), without its per-call overhead).
+
+    Args:
+        y_true: True labels, shape (N, 1) or (N, K).
+        y_pred: Predicted labels, shape (N, K).
+
+    Returns:
+        Array of K F1 scores.
+    """
+    y_true = np.broadcast_to(y_true, y_pred.shape).astype(bool)
+    y_pred = y_pred.astype(bool)
+
+    true_positives = np.sum(y_true & y_pred, axis=0)
+    true_negatives = np.sum(~y_true & ~y_pred, axis=0)
+    n_positives, n_predicted_positives = y_true.sum(axis=0), y_pred.sum(axis=0)
+    n_negatives, n_predicted_negatives = y_true.shape[0] - n_positives, y_pred.shape[0] - n_predicted_positives
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # F1 = 2 TP / (2 TP + FP + FN) = 2 TP / (true count + predicted count), 0 when undefined
+        f1_positive = np.nan_to_num(2 * true_positives / (n_positives + n_predicted_positives))
+        f1_negative = np.nan_to_num(2 * true_negatives / (n_negatives + n_predicted_negatives))
+
+    return (n_positives * f1_positive + n_negatives * f1_negative) / y_true.shape[0]
+
+
+class CustomLogisticRegression(BaseModel):
+    task = 'classification'
+
+    def __init__(self, gamma=0.1, lambda_=0.01, max_iters=150, convergence_threshold=1e-8, threshold=0.5,
+                 batch_size=None, eval_every=1, warm_start=False, seed=42, verbose=True):
         """
         Initializes the Custom Logistic Regression model with gradient descent.
 
         Args:
             gamma: Learning rate for gradient descent.
-            lambda_: Regularization strength.
-            max_iters: Maximum number of iterations for gradient descent.
+            lambda_: Regularization strength, or a list of strengths to fit at once (one weight column each).
+            max_iters: Maximum number of iterations (gradient steps) for gradient descent.
             convergence_threshold: Threshold for convergence.
             threshold: Probability threshold for binary classification.
+            batch_size: Number of samples per gradient step (mini-batch SGD). None for full-batch gradient descent.
+            eval_every: Number of iterations between two evaluations on the validation set.
+            warm_start: Start from the weights of the previous fit instead of zeros.
+            seed: Seed for the shuffling of the mini-batches.
+            verbose: Print the best validation F1 score and the evaluation reports.
         """
+        super().__init__(verbose)
         self.gamma = gamma
         self.lambda_ = lambda_
         self.max_iters = max_iters
         self.convergence_threshold = convergence_threshold
         self.threshold = threshold
+        self.batch_size = batch_size
+        self.eval_every = eval_every
+        self.warm_start = warm_start
+        self.seed = seed
         self.w = None
 
+    @property
+    def lambdas(self):
+        """Regularization strengths as a (1, K) row, one per weight column."""
+        return np.atleast_1d(np.asarray(self.lambda_, dtype=float)).reshape(1, -1)
+
     def sigmoid(self, t):
         """Applies the sigmoid function element-wise."""
         return 1 / (1 + np.exp(-t))
 
-    def calculate_gradient(self, y, tx):
+    def calculate_gradient(self, y, tx, pred=None):
         """
         Calculates the gradient for logistic regression with L2 regularization.
-        
+
         Args:
             y: Target values.
             tx: Feature matrix with bias term.
+            pred: Predicted probabilities for tx, if already computed.
 
         Returns:
-            Computed gradient vector.
+            Computed gradient matrix, one column per weight column.
         """
-        pred = self.sigmoid(tx.dot(self.w))
+        if pred is None:
+            pred = self.sigmoid(tx.dot(self.w))
         grad = tx.T.dot(pred - y) / y.shape[0]
-        grad[1:] += self.lambda_ * self.w[1:]  # Exclude bias term from regularization
+        grad[1:] += self.lambdas * self.w[1:]  # Exclude bias term from regularization
         return grad
 
-    def calculate_loss(self, y, tx):
+    def calculate_loss(self, y, tx, pred=None):
         """
         Computes the logistic loss with L2 regularization.
-        
+
         Args:
             y: Target values.
             tx: Feature matrix with bias term.
+            pred: Predicted probabilities for tx, if already computed.
+
+        Returns:
+            Computed loss value (an array if several weight columns are fitted).
+        """
+        if pred is None:
+            pred = self.sigmoid(tx.dot(self.w))
+        regularization = (self.lambdas.ravel() / 2) * np.sum(self.w[1:] ** 2, axis=0)
+        loss = -np.mean(y * np.log(pred + 1e-15) + (1 - y) * np.log(1 - pred + 1e-15), axis=0) + regularization
+        return loss[0] if loss.shape[0] == 1 else loss
+
+    def _init_weights(self, n_features, n_columns, initial_w=None):
+        if initial_w is not None:
+            w = np.asarray(initial_w, dtype=float).reshape(n_features, -1)
+            return np.repeat(w, n_columns, axis=1) if w.shape[1] == 1 and n_columns > 1 else w.copy()
+        if self.warm_start and self.w is not None and self.w.shape == (n_features, n_columns):
+            # Copy: the weights of a loaded model may be a read-only memory map
+            return np.array(self.w)
+        return np.zeros((n_features, n_columns))
+
+    def _n_columns(self, y):
+        n_lambdas, n_targets = self.lambdas.shape[1], y.shape[1]
+        if n_lambdas > 1 and n_targets > 1 and n_lambdas != n_targets:
+            raise ValueError(f"Got {n_lambdas} regularization strengths for {n_targets} targets.")
+        return max(n_lambdas, n_targets)
+
+    def step(self, y, tx):
+        """
+        One gradient step on a batch, with a single forward pass.
+
+        Args:
+            y: Target values of the batch, shape (N, 1) or (N, K).
+            tx: Feature matrix of the batch with bias term.
 
         Returns:
-            Computed loss value.
+            Norm of the gradient of each weight column.
         """
-        pred = self.sigmoid(tx.dot(self.w))
-        regularization = (self.lambda_ / 2) * np.sum(self.w[1:] ** 2)
-        loss = -np.mean(y * np.log(pred + 1e-15) + (1 - y) * np.log(1 - pred + 1e-15)) + regularization
-        return loss
+        grad = self.calculate_gradient(y, tx, pred=self.sigmoid(tx.dot(self.w)))
+        if not self.w.flags.writeable:
+            # Weights memory-mapped by BaseModel.load are read-only: keep training on an in-memory copy
+            self.w = np.array(self.w)
+        self.w -= self.gamma * grad
+        return np.linalg.norm(grad, axis=0)
 
-    def fit(self, y_train, x_train, y_val, x_val):
+    def partial_fit(self, y_batch, x_batch):
+        """
+        Performs one gradient step on a batch, e.g. from a stream of data that does not fit in memory.
+
+        Args:
+            y_batch: Target values of the batch.
+            x_batch: Feature matrix of the batch (without bias term).
+
+        Returns:
+            Norm of the gradient of each weight column.
+        """
+        y_batch = self._as_column(y_batch)
+        tx_batch = add_bias(x_batch)
+        if self.w is None:
+            self.w = self._init_weights(tx_batch.shape[1], self._n_columns(y_batch))
+        return self.step(y_batch, tx_batch)
+
+    @staticmethod
+    def _as_column(y):
+        y = np.asarray(y, dtype=float)
+        return y.reshape(-1, 1) if y.ndim == 1 else y
+
+    def fit(self, y_train, x_train, y_val, x_val, initial_w=None, batches=None):
         """
         Trains logistic regression using gradient descent and tracks best F1 score on validation set.
 
@@ -65,36 +210,79 @@ class CustomLogisticRegression:
             x_train: Training feature matrix.
             y_val: Validation target values.
             x_val: Validation feature matrix.
+            initial_w: Initial weights (with bias), e.g. from a previous fit.
+            batches: Iterator of (y_batch, x_batch) to train on instead of batches of the training set.
 
         Returns:
-            Best F1 score obtained during training.
+            Best F1 score obtained during training (an array if several weight columns are fitted).
         """
-        tx_train = np.c_[np.ones((x_train.shape[0], 1)), x_train]
-        tx_val = np.c_[np.ones((x_val.shape[0], 1)), x_val]
-        self.w = np.zeros((tx_train.shape[1], 1))
-        f1_best = 0
+        y_train, y_val = self._as_column(y_train), self._as_column(y_val)
+        tx_train = add_bias(x_train)
+        tx_val = add_bias(x_val)
+
+        n_columns = self._n_columns(y_train)
+        self.w = self._init_weights(tx_train.shape[1], n_columns, initial_w)
+        f1_best = np.zeros(n_columns)
         best_weights = self.w.copy()
-        
-        for _ in range(self.max_iters):
-            loss = self.calculate_loss(y_train, tx_train)
-            grad = self.calculate_gradient(y_train, tx_train)
-            self.w -= self.gamma * grad
 
+        if batches is not None:
+            batches = ((self._as_column(y_batch), add_bias(x_batch)) for y_batch, x_batch in batches)
+        elif self.batch_size is not None:
+            batches = batch_iter(y_train, tx_train, self.batch_size, rng=np.random.default_rng(self.seed))
+
+        for iteration in range(self.max_iters):
+            y_batch, tx_batch = (y_train, tx_train) if batches is None else next(batches, (None, None))
+            if y_batch is None:
+                break
+            grad_norm = self.step(y_batch, tx_batch)
+
+            converged = np.all(grad_norm < self.convergence_threshold)
             # Validation performance
-            y_val_pred = self.predict(tx_val)
-            f1_score_val = f1_score(y_val, y_val_pred, average='weighted')
-            if f1_score_val > f1_best:
-                best_weights = self.w.copy()
-                f1_best = f1_score_val
+            if (iteration + 1) % self.eval_every == 0 or converged or iteration == self.max_iters - 1:
+                f1_score_val = weighted_f1(y_val, self.predict(tx_val))
+                improved = f1_score_val > f1_best
+                best_weights[:, improved] = self.w[:, improved]
+                f1_best[improved] = f1_score_val[improved]
 
             # Check for convergence
-            if np.linalg.norm(grad) < self.convergence_threshold:
+            if converged:
                 break
-        
+
         self.w = best_weights  # Store best weights
-        print(f"Best F1-score on validation set: {f1_best:.2f}")
+        if n_columns == 1:
+            self.log(f"Best F1-score on validation set: {f1_best[0]:.2f}")
+            return f1_best[0]
+
+        self.log(f"Best F1-scores on validation set: {np.array2string(f1_best, precision=2)}")
         return f1_best
 
+    def train(self, X_train, y_train):
+        """
+        Fits the model on features without bias term, selecting the weights on the training set itself
+        (use `fit` to select them on a validation set).
+
+        Args:
+            X_train: Training feature data.
+            y_train: Target variable for training.
+        """
+        self.fit(y_train, X_train, y_train, X_train)
+
+    def _predict_prepared(self, X):
+        return self.predict(add_bias(X))
+
+    def score(self, X, y):
+        """
+        Computes the evaluation metrics without printing them.
+
+        Args:
+            X: Feature data without bias term.
+            y: True class labels.
+
+        Returns:
+            dict: Classification metrics.
+        """
+        return classification_metrics(y, self._predict_prepared(X if sparse.issparse(X) else np.asarray(X, dtype=float)).ravel())
+
     def predict(self, tx):
         """
         Predicts binary labels based on the set probability threshold.
@@ -103,7 +291,7 @@ class CustomLogisticRegression:
             tx: Feature matrix for predictions with bias term.
 
         Returns:
-            Predicted binary class labels.
+            Predicted binary class labels (one column per weight column).
         """
         pred_prob = self.sigmoid(tx.dot(self.w))
         return (pred_prob >= self.threshold).astype(int)
@@ -111,7 +299,7 @@ class CustomLogisticRegression:
     def evaluate(self, y_true, tx):
         """
         Evaluates the model's performance with accuracy, precision, recall, and F1 score.
-        
+
         Args:
             y_true: True target values.
             tx: Feature matrix for evaluation.
@@ -119,15 +307,11 @@ class CustomLogisticRegression:
         Returns:
             dict: Evaluation metrics.
         """
-        y_pred = self.predict(tx)
-        accuracy = accuracy_score(y_true, y_pred)
-        precision = precision_score(y_true, y_pred, average='weighted')
-        recall = recall_score(y_true, y_pred, average='weighted')
-        f1 = f1_score(y_true, y_pred, average='weighted')
+        metrics = classification_metrics(y_true, self.predict(tx))
 
-        print(f"Accuracy: {accuracy:.2f}")
-        print(f"Precision: {precision:.2f}")
-        print(f"Recall: {recall:.2f}")
-        print(f"F1 Score: {f1:.2f}")
+        self.log(f"Accuracy: {metrics['Accuracy']:.2f}")
+        self.log(f"Precision: {metrics['Precision']:.2f}")
+        self.log(f"Recall: {metrics['Recall']:.2f}")
+        self.log(f"F1 Score: {metrics['F1 Score']:.2f}")
 
-        return {"Accuracy": accuracy, "Precision": precision, "Recall": recall, "F1 Score": f1}
\ No newline at end of file
+        return metrics
@@ -1,9 +1,8 @@
 import xgboost as xgb
-from sklearn.metrics import mean_absolute_error, mean_squared_error
-import numpy as np
+from src.models.base_model import BaseModel, regression_metrics
 
-class GradientBoostingRegressorModel:
-    def __init__(self, learning_rate=0.1, n_estimators=100, max_depth=3, random_state=42, objective="reg:squarederror"):
+class GradientBoostingRegressorModel(BaseModel):
+    def __init__(self, learning_rate=0.1, n_estimators=100, max_depth=3, random_state=42, objective="reg:squarederror", verbose=True):
         """
         Initializes the Gradient Boosting Regressor (XGBoost) with common hyperparameters.
         
@@ -13,7 +12,9 @@ class GradientBoostingRegressorModel:
             max_depth: Maximum depth of a tree.
             random_state: Seed for random number generation.
             objective: Learning objective.
+            verbose: Print the evaluation reports.
         """
+        super().__init__(verbose)
         self.model = xgb.XGBRegressor(
             learning_rate=learning_rate,
             n_estimators=n_estimators,
@@ -55,13 +56,10 @@ class GradientBoostingRegressorModel:
         Returns:
             dict: Evaluation metrics (MAE, MSE, RMSE).
         """
-        y_pred = self.predict(X_test)
-        mae = mean_absolute_error(y_test, y_pred)
-        mse = mean_squared_error(y_test, y_pred)
-        rmse = np.sqrt(mse)
+        metrics = regression_metrics(y_test, self.predict(X_test))
         
-        print(f"Mean Absolute Error (MAE): {mae:.2f}")
-        print(f"Mean Squared Error (MSE): {mse:.2f}")
-        print(f"Root Mean Squared Error (RMSE): {rmse:.2f}")
+        self.log(f"Mean Absolute Error (MAE): {metrics['MAE']:.2f}")
+        self.log(f"Mean Squared Error (MSE): {metrics['MSE']:.2f}")
+        self.log(f"Root Mean Squared Error (RMSE): {metrics['RMSE']:.2f}")
         
-        return {"MAE": mae, "MSE": mse, "RMSE": rmse}
\ No newline at end of file
+        return metrics
\ No newline at end of file
@@ -0,0 +1,280 @@
+import os
+import json
+import math
+import time
+import hashlib
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import KFold, StratifiedKFold
+from sklearn.preprocessing import StandardScaler
+
+DEFAULT_CACHE_DIR = 'data/cache/search'
+
+
+def grid_candidates(param_grid):
+    """
+    All the combinations of a parameter grid.
+
+    Args:
+        param_grid (dict): Parameter name -> list of values.
+
+    Returns:
+        list: One dict of parameters per combination.
+    """
+    names = sorted(param_grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(param_grid[name] for name in names))]
+
+
+def random_candidates(param_distributions, n_iter, seed=42):
+    """
+    Random combinations of parameters.
+
+    Args:
+        param_distributions (dict): Parameter name -> list of values (sampled uniformly)
+            or distribution with an `rvs` method (e.g. scipy.stats.loguniform(1e-3, 1e2)).
+        n_iter (int): Number of combinations.
+        seed (int): Seed of the sampling.
+
+    Returns:
+        list: One dict of parameters per combination (duplicates are removed).
+    """
+    rng = np.random.default_rng(seed)
+    candidates = {}
+    for _ in range(n_iter):
+        params = {}
+        for name in sorted(param_distributions):
+            distribution = param_distributions[name]
+            if hasattr(distribution, 'rvs'):
+                value = distribution.rvs(random_state=rng)
+            else:
+                value = distribution[rng.integers(len(distribution))]
+            params[name] = value.item() if isinstance(value, np.generic) else value
+        candidates[_params_key(params)] = params
+    return list(candidates.values())
+
+
+def _params_key(params):
+    return json.dumps(params, sort_keys=True, default=str)
+
+
+def _fit_and_score(model_class, params, task, X_train, y_train, X_val, y_val):
+    """
+    Fits one of the src.models wrappers (quietly) and scores it on the validation fold.
+
+    Returns:
+        float: Weighted F1 score for classification, negative RMSE for regression (higher is better).
+    """
+    model = model_class(**params, verbose=False)
+    model.train(X_train, y_train)
+    metrics = model.score(X_val, y_val)
+    return float(metrics['F1 Score']) if task == 'classification' else -float(metrics['RMSE'])
+
+
+def _run_task(model_class, params, task, fold_paths, resource):
+    """Worker: memory-maps a cached fold, fits on the first `resource` training samples and scores."""
+    arrays = {name: np.load(file_path, mmap_mode='r') for name, file_path in fold_paths.items()}
+    n_train = arrays['X_train'].shape[0] if resource is None else resource
+
+    start = time.time()
+    try:
+        score = _fit_and_score(model_class, params, task,
+                               np.asarray(arrays['X_train'][:n_train]), np.asarray(arrays['y_train'][:n_train]),
+                               np.asarray(arrays['X_val']), np.asarray(arrays['y_val']))
+        error = None
+    except Exception as e:
+        score, error = float('nan'), f"{type(e).__name__}: {e}"
+    return score, time.time() - start, error
+
+
+class HyperparameterSearch:
+    """
+    Cross-validated hyperparameter search over the model wrappers of src.models
+    (RandomForestModel, GradientBoostingRegressorModel, KNNRegressionModel, PredLogisticRegression, SVMModel,
+    CustomLogisticRegression).
+
+    - The k-fold splits and the scaled matrices are computed once and cached as .npy files,
+      which the worker processes memory-map instead of recomputing them.
+    - Every (parameters, fold, resource) evaluation is appended to a JSON lines log as soon as it finishes,
+      so an interrupted search resumes where it stopped.
+    """
+
+    def __init__(self, model_class, task='regression', n_splits=5, scale=True, n_jobs=None,
+                 log_path=None, cache_dir=DEFAULT_CACHE_DIR, seed=42):
+        """
+        Args:
+            model_class (type): Model wrapper, instantiated with the searched parameters as keyword arguments.
+            task (str): 'regression' (scored with -RMSE) or 'classification' (scored with weighted F1, stratified folds).
+            n_splits (int): Number of cross-validation folds.
+            scale (bool): Standardize the features (scaler fitted on each training fold).
+            n_jobs (int): Number of processes, None for all cores.
+            log_path (str): Path of the results log. Defaults to '<cache_dir>/<model>.jsonl'.
+            cache_dir (str): Directory of the cached folds.
+            seed (int): Seed of the folds and of the subsampling.
+        """
+        if task not in ('regression', 'classification'):
+            raise ValueError(f"Unknown task {task}, expected 'regression' or 'classification'.")
+
+        self.model_class = model_class
+        self.task = task
+        self.n_splits = n_splits
+        self.scale = scale
+        self.n_jobs = n_jobs or os.cpu_count() or 1
+        self.cache_dir = cache_dir
+        self.log_path = log_path or os.path.join(cache_dir, f"{model_class.__name__}.jsonl")
+        self.seed = seed
+        self.data_key = None
+        self.fold_paths = None
+
+    def prepare(self, X, y):
+        """
+        Splits the data into folds, scales them and caches them on disk (skipped if already cached).
+
+        Args:
+            X: Feature matrix (DataFrame or array).
+            y: Target values.
+        """
+        X = np.ascontiguousarray(np.asarray(X, dtype=float))
+        y = np.ascontiguousarray(np.asarray(y).ravel())
+
+        digest = hashlib.sha256()
+        for part in (X.tobytes(), y.tobytes(), str(X.shape).encode(), str(y.dtype).encode(),
+                     f"{self.task}-{self.n_splits}-{self.scale}-{self.seed}".encode()):
+            digest.update(part)
+        self.data_key = digest.hexdigest()[:16]
+
+        fold_dir = os.path.join(self.cache_dir, self.data_key)
+        self.fold_paths = [
+            {name: os.path.join(fold_dir, f"fold{fold}_{name}.npy") for name in ('X_train', 'y_train', 'X_val', 'y_val')}
+            for fold in range(self.n_splits)
+        ]
+        if all(os.path.isfile(file_path) for paths in self.fold_paths for file_path in paths.values()):
+            return
+
+        os.makedirs(fold_dir, exist_ok=True)
+        splitter = (StratifiedKFold if self.task == 'classification' else KFold)(
+            n_splits=self.n_splits, shuffle=True, random_state=self.seed
+        )
+        rng = np.random.default_rng(self.seed)
+        for paths, (train_indices, val_indices) in zip(self.fold_paths, splitter.split(X, y)):
+            # Shuffled once, so that the first n samples of a fold are a random subsample (successive halving)
+            train_indices = rng.permutation(train_indices)
+            X_train, X_val = X[train_indices], X[val_indices]
+            if self.scale:
+                scaler = StandardScaler().fit(X_train)
+                X_train, X_val = scaler.transform(X_train), scaler.transform(X_val)
+
+            for name, array in (('X_train', X_train), ('y_train', y[train_indices]), ('X_val', X_val), ('y_val', y[val_indices])):
+                np.save(paths[name] + '.tmp.npy', array)
+                os.replace(paths[name] + '.tmp.npy', paths[name])
+
+    def _load_log(self):
+        """Scores already computed on this data: (params key, fold, resource) -> record."""
+        done = {}
+        if not os.path.isfile(self.log_path):
+            return done
+        with open(self.log_path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Line truncated by an interruption
+                if record.get('data') == self.data_key:
+                    done[(record['config'], record['fold'], record['resource'])] = record
+        return done
+
+    def evaluate(self, candidates, resource=None):
+        """
+        Cross-validates candidate parameters, in parallel, skipping the evaluations already in the log.
+
+        Args:
+            candidates (list): Dicts of parameters.
+            resource (int): Number of training samples per fold, None for all of them.
+
+        Returns:
+            pd.DataFrame: One row per candidate with 'params', 'mean_score', 'std_score', 'fit_time' and
+            'n_errors', sorted from best to worst.
+        """
+        if self.fold_paths is None:
+            raise ValueError("Call prepare(X, y) before evaluating candidates.")
+
+        done = self._load_log()
+        tasks = [(candidate, fold) for candidate in candidates for fold in range(self.n_splits)
+                 if (_params_key(candidate), fold, resource) not in done]
+
+        if tasks:
+            os.makedirs(os.path.dirname(self.log_path) or '.', exist_ok=True)
+            with open(self.log_path, 'a') as log, ProcessPoolExecutor(max_workers=min(self.n_jobs, len(tasks))) as executor:
+                futures = {
+                    executor.submit(_run_task, self.model_class, params, self.task, self.fold_paths[fold], resource): (params, fold)
+                    for params, fold in tasks
+                }
+                for future in as_completed(futures):
+                    params, fold = futures[future]
+                    score, fit_time, error = future.result()
+                    record = {'data': self.data_key, 'config': _params_key(params), 'params': params, 'fold': fold,
+                              'resource': resource, 'score': score, 'fit_time': fit_time, 'error': error}
+                    log.write(json.dumps(record, default=str) + '\n')
+                    log.flush()
+                    done[(record['config'], fold, resource)] = record
+
+        rows = []
+        for params in candidates:
+            records = [done[(_params_key(params), fold, resource)] for fold in range(self.n_splits)]
+            scores = np.array([record['score'] for record in records], dtype=float)
+            rows.append({
+                'params': params,
+                'mean_score': np.nanmean(scores) if not np.isnan(scores).all() else np.nan,
+                'std_score': np.nanstd(scores) if not np.isnan(scores).all() else np.nan,
+                'fit_time': float(np.mean([record['fit_time'] for record in records])),
+                'n_errors': int(sum(record['error'] is not None for record in records)),
+                'resource': resource,
+            })
+
+        return pd.DataFrame(rows).sort_values('mean_score', ascending=False, na_position='last').reset_index(drop=True)
+
+    def grid_search(self, param_grid):
+        """Cross-validates every combination of `param_grid`, see grid_candidates."""
+        return self.evaluate(grid_candidates(param_grid))
+
+    def random_search(self, param_distributions, n_iter=20):
+        """Cross-validates `n_iter` random combinations, see random_candidates."""
+        return self.evaluate(random_candidates(param_distributions, n_iter, seed=self.seed))
+
+    def successive_halving(self, candidates, eta=3, min_resource=None):
+        """
+        Successive halving: all the candidates are evaluated on a small subsample of each training fold,
+        and only the best 1/eta are evaluated again on eta times more samples, until one candidate
+        remains or the full training folds are used.
+
+        Args:
+            candidates (list or dict): Dicts of parameters, or a parameter grid.
+            eta (int): Reduction factor between two rounds.
+            min_resource (int): Number of training samples of the first round.
+
+        Returns:
+            pd.DataFrame: The results of all the rounds, the last round first.
+        """
+        if self.fold_paths is None:
+            raise ValueError("Call prepare(X, y) before evaluating candidates.")
+        if isinstance(candidates, dict):
+            candidates = grid_candidates(candidates)
+
+        max_resource = min(np.load(paths['y_train'], mmap_mode='r').shape[0] for paths in self.fold_paths)
+        n_rounds = max(int(math.floor(math.log(len(candidates), eta))), 0) if candidates else 0
+        resource = min_resource or max(max_resource // eta ** n_rounds, 2 * self.n_splits)
+
+        rounds = []
+        while True:
+            resource = min(resource, max_resource)
+            results = self.evaluate(candidates, resource=None if resource == max_resource else resource)
+            results['round'] = len(rounds)
+            rounds.append(results)
+
+            if len(candidates) <= 1 or resource == max_resource:
+                break
+            candidates = results['params'].head(math.ceil(len(candidates) / eta)).tolist()
+            resource *= eta
+
+        return pd.concat(rounds[::-1], ignore_index=True)
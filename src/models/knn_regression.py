@@ -0,0 +1,107 @@
+import numpy as np
+from scipy import sparse
+from src.models.base_model import BaseModel, regression_metrics
+from src.utils.similarity_index import NeighborIndex
+
+
+class KNNRegressionModel(BaseModel):
+    def __init__(self, n_neighbors=10, weights='distance', log_target=True, method='exact', n_lists=None, n_probe=8,
+                 verbose=True):
+        """
+        Initializes a comparable-based regressor: the prediction for a movie is the (weighted) mean target of its
+        nearest training movies, searched with a NeighborIndex.
+
+        Args:
+            n_neighbors: Number of comparables per prediction.
+            weights: 'uniform', or 'distance' to weight the comparables by the inverse of their distance.
+            log_target: Average log(1 + y) instead of y (box office revenues are heavy-tailed).
+            method: Search method of the index ('exact' or 'ivf', see NeighborIndex).
+            n_lists: Number of inverted lists of the 'ivf' index, None for about sqrt(number of training rows).
+            n_probe: Number of lists scanned per query by the 'ivf' index.
+            verbose: Print the evaluation reports.
+        """
+        super().__init__(verbose)
+        if weights not in ('uniform', 'distance'):
+            raise ValueError(f"Unknown weights {weights}, expected 'uniform' or 'distance'.")
+        self.n_neighbors = n_neighbors
+        self.weights = weights
+        self.log_target = log_target
+        self.index = NeighborIndex(method=method, n_lists=n_lists, n_probe=n_probe)
+        self.targets = None
+        self.fallback = None
+
+    @staticmethod
+    def _dense(X):
+        return X.toarray() if sparse.issparse(X) else np.asarray(X)
+
+    def train(self, X_train, y_train):
+        """
+        Indexes the training data (rows with a missing target are ignored), keyed by their position in X_train.
+
+        Args:
+            X_train: Training feature data (e.g. MovieVectorizer vectors, or scaled model features).
+            y_train: Target variable for training.
+        """
+        X_train, y_train = self._dense(X_train), np.asarray(y_train, dtype=float)
+        known = np.isfinite(y_train)
+        self.targets = np.log1p(y_train) if self.log_target else y_train
+        # Mean target, predicted for the rows without any comparable
+        self.fallback = self.targets[known].mean() if known.any() else np.nan
+        self.index.build(X_train[known], ids=np.flatnonzero(known))
+
+    def neighbors(self, X, exclude=None):
+        """
+        Args:
+            X: Feature data.
+            exclude: Position of a training row to ignore for each row of X (e.g. leave-one-out predictions on the
+                training data), or None.
+
+        Returns:
+            tuple: Positions (rows of X_train) and squared distances of the comparables, of shape (len(X), n_neighbors),
+            -1 and inf for missing ones.
+        """
+        return self.index.search(self._dense(X), k=self.n_neighbors, exclude_ids=exclude)
+
+    def predict(self, X, exclude=None):
+        """
+        Predicts continuous values from the comparables of each row.
+
+        Args:
+            X: Feature data for predictions.
+            exclude: Position of a training row to ignore for each row of X, or None (see `neighbors`).
+
+        Returns:
+            Predicted values (the mean training target for rows without any comparable).
+        """
+        positions, distances = self.neighbors(X, exclude)
+        found = positions >= 0
+        if self.weights == 'distance':
+            weights = np.where(found, 1.0 / (np.sqrt(distances) + 1e-6), 0.0)
+        else:
+            weights = found.astype(float)
+        values = np.zeros(positions.shape)
+        values[found] = self.targets[positions[found]]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            predictions = (weights * values).sum(axis=1) / weights.sum(axis=1)
+        predictions = np.where(found.any(axis=1), predictions, self.fallback)
+        return np.expm1(predictions) if self.log_target else predictions
+
+    def evaluate(self, X_test, y_test):
+        """
+        Evaluates the model using MAE, MSE, and RMSE metrics.
+
+        Args:
+            X_test: Test feature data.
+            y_test: True values for the test set.
+
+        Returns:
+            dict: Evaluation metrics (MAE, MSE, RMSE).
+        """
+        metrics = regression_metrics(y_test, self.predict(X_test))
+
+        self.log(f"Mean Absolute Error (MAE): {metrics['MAE']:.2f}")
+        self.log(f"Mean Squared Error (MSE): {metrics['MSE']:.2f}")
+        self.log(f"Root Mean Squared Error (RMSE): {metrics['RMSE']:.2f}")
+
+        return metrics
@@ -1,9 +1,11 @@
 from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import precision_score, recall_score, f1_score, accuracy_score
+from src.models.base_model import BaseModel, classification_metrics
 
 
-class PredLogisticRegression:
-    def __init__(self, C=1.0, max_iter=150, solver='lbfgs', threshold=0.5):
+class PredLogisticRegression(BaseModel):
+    task = 'classification'
+
+    def __init__(self, C=1.0, max_iter=150, solver='lbfgs', threshold=0.5, verbose=True):
         """
         Initializes the Logistic Regression model.
 
@@ -12,7 +14,9 @@ class PredLogisticRegression:
             max_iter: Maximum number of iterations for the solver.
             solver: Algorithm to use in the optimization problem.
             threshold: Probability threshold for binary classification.
+            verbose: Print the evaluation reports.
         """
+        super().__init__(verbose)
         self.model = LogisticRegression(
             C=C,
             max_iter=max_iter,
@@ -57,16 +61,12 @@ class PredLogisticRegression:
         Returns:
             dict: Evaluation metrics (Accuracy, Precision, Recall, F1 Score).
         """
-        y_pred = self.predict(X)
-        precision = precision_score(y_true, y_pred, average='weighted', zero_division=0)
-        recall = recall_score(y_true, y_pred, average='weighted', zero_division=0)
-        f1 = f1_score(y_true, y_pred, average='weighted', zero_division=0)
-        accuracy = accuracy_score(y_true, y_pred)
+        metrics = classification_metrics(y_true, self.predict(X))
 
-        print("Evaluation Metrics:")
-        print(f"  Accuracy: {accuracy:.2f}")
-        print(f"  Precision: {precision:.2f}")
-        print(f"  Recall: {recall:.2f}")
-        print(f"  F1 Score: {f1:.2f}")
+        self.log("Evaluation Metrics:")
+        self.log(f"  Accuracy: {metrics['Accuracy']:.2f}")
+        self.log(f"  Precision: {metrics['Precision']:.2f}")
+        self.log(f"  Recall: {metrics['Recall']:.2f}")
+        self.log(f"  F1 Score: {metrics['F1 Score']:.2f}")
 
-        return {"Accuracy": accuracy, "Precision": precision, "Recall": recall, "F1 Score": f1}
\ No newline at end of file
+        return metrics
\ No newline at end of file
@@ -1,9 +1,8 @@
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.metrics import mean_absolute_error, mean_squared_error
-import numpy as np
+from src.models.base_model import BaseModel, regression_metrics
 
-class RandomForestModel:
-    def __init__(self, n_estimators=100, max_depth=None, random_state=42):
+class RandomForestModel(BaseModel):
+    def __init__(self, n_estimators=100, max_depth=None, random_state=42, verbose=True):
         """
         Initializes the Random Forest Regressor with specified hyperparameters.
         
@@ -11,7 +10,9 @@ class RandomForestModel:
             n_estimators: Number of trees in the forest.
             max_depth: Maximum depth of the trees. If None, nodes are expanded until all leaves are pure.
             random_state: Seed for random number generation.
+            verbose: Print the evaluation reports.
         """
+        super().__init__(verbose)
         self.model = RandomForestRegressor(
             n_estimators=n_estimators,
             max_depth=max_depth,
@@ -51,13 +52,10 @@ class RandomForestModel:
         Returns:
             dict: Evaluation metrics (MAE, MSE, RMSE).
         """
-        y_pred = self.predict(X_test)
-        mae = mean_absolute_error(y_test, y_pred)
-        mse = mean_squared_error(y_test, y_pred)
-        rmse = np.sqrt(mse)
+        metrics = regression_metrics(y_test, self.predict(X_test))
         
-        print(f"Mean Absolute Error (MAE): {mae:.2f}")
-        print(f"Mean Squared Error (MSE): {mse:.2f}")
-        print(f"Root Mean Squared Error (RMSE): {rmse:.2f}")
+        self.log(f"Mean Absolute Error (MAE): {metrics['MAE']:.2f}")
+        self.log(f"Mean Squared Error (MSE): {metrics['MSE']:.2f}")
+        self.log(f"Root Mean Squared Error (RMSE): {metrics['RMSE']:.2f}")
         
-        return {"MAE": mae, "MSE": mse, "RMSE": rmse}
\ No newline at end of file
+        return metrics
\ No newline at end of file
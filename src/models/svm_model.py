@@ -1,8 +1,22 @@
-from sklearn.svm import SVC
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, classification_report, confusion_matrix
+import numpy as np
+from scipy import sparse
+from sklearn.svm import SVC, LinearSVC
+from sklearn.kernel_approximation import Nystroem
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import make_pipeline
+from sklearn.metrics import classification_report, confusion_matrix
+from src.models.base_model import BaseModel, classification_metrics
 
-class SVMModel:
-    def __init__(self, kernel='rbf', C=1.0, gamma='scale', threshold=0.5):
+CALIBRATIONS = ('cv', 'sigmoid', 'margin')
+BACKENDS = ('auto', 'kernel', 'linear', 'nystroem')
+
+class SVMModel(BaseModel):
+    task = 'classification'
+    mmap_safe = False
+
+    def __init__(self, kernel='rbf', C=1.0, gamma='scale', threshold=0.5, calibration='cv', calibration_size=0.1,
+                 margin=0.0, backend='auto', max_kernel_samples=20000, n_components=500, verbose=True):
         """
         Initializes the SVM model for classification.
         
@@ -11,20 +25,124 @@ class SVMModel:
             C: Regularization parameter.
             gamma: Kernel coefficient for 'rbf', 'poly', and 'sigmoid'.
             threshold: Probability threshold for binary classification.
+            calibration: How the decision values are turned into probabilities:
+                'cv' for SVC's internal 5-fold Platt scaling (slowest, kernel backend only: 'sigmoid' is used instead
+                when the 'auto' backend picks an approximate one),
+                'sigmoid' for a logistic calibrator fitted once on a held-out part of the training set,
+                'margin' for no probabilities at all, predicting from the sign of `decision_function - margin`.
+            calibration_size: Fraction of the training set held out for the 'sigmoid' calibrator.
+            margin: Decision value threshold of the 'margin' calibration.
+            backend: 'kernel' (exact SVC), 'linear' (LinearSVC), 'nystroem' (LinearSVC on Nystroem
+                approximate kernel features), or 'auto' for 'kernel' up to `max_kernel_samples` training
+                samples and 'linear' / 'nystroem' (depending on the kernel) above.
+            max_kernel_samples: Largest training set fitted with the exact kernel SVC in 'auto' mode.
+            n_components: Number of Nystroem features.
+            verbose: Print the evaluation reports.
         """
-        self.model = SVC(kernel=kernel, C=C, gamma=gamma, probability=True, random_state=42)
+        if calibration not in CALIBRATIONS:
+            raise ValueError(f"Unknown calibration {calibration}, expected one of {CALIBRATIONS}.")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend}, expected one of {BACKENDS}.")
+
+        super().__init__(verbose)
+        self.kernel = kernel
+        self.C = C
+        self.gamma = gamma
         self.threshold = threshold
+        self.calibration = calibration
+        self.calibration_size = calibration_size
+        self.margin = margin
+        self.backend = backend
+        self.max_kernel_samples = max_kernel_samples
+        self.n_components = n_components
+        self.model = None
+        self.calibrator = None
+        self.fitted_backend = None
+        self.fitted_calibration = None
+
+    def _resolve_backend(self, n_samples):
+        if self.backend != 'auto':
+            return self.backend
+        if n_samples <= self.max_kernel_samples:
+            return 'kernel'
+        return 'linear' if self.kernel == 'linear' else 'nystroem'
+
+    def _build_estimator(self, backend, X):
+        if backend == 'kernel':
+            return SVC(kernel=self.kernel, C=self.C, gamma=self.gamma, probability=self.fitted_calibration == 'cv', random_state=42)
+        if backend == 'linear':
+            return LinearSVC(C=self.C, random_state=42)
+
+        gamma = self.gamma
+        if gamma == 'scale':
+            # Same value as SVC's gamma='scale'
+            variance = X.multiply(X).mean() - X.mean() ** 2 if sparse.issparse(X) else X.var()
+            gamma = 1.0 / (X.shape[1] * variance) if variance > 0 else 1.0
+        elif gamma == 'auto':
+            gamma = 1.0 / X.shape[1]
+        nystroem = Nystroem(kernel=self.kernel, gamma=gamma, n_components=min(self.n_components, X.shape[0]), random_state=42)
+        return make_pipeline(nystroem, LinearSVC(C=self.C, random_state=42))
 
     def train(self, X_train, y_train):
         """
         Trains the SVM model.
         
         Args:
-            X_train: Training feature data.
+            X_train: Training feature data, dense or scipy sparse (e.g. multi-hot genres, kept sparse by every backend).
             y_train: Training target labels.
         """
+        X_train = sparse.csr_matrix(X_train, dtype=float) if sparse.issparse(X_train) else np.asarray(X_train, dtype=float)
+        y_train = np.asarray(y_train).ravel()
+        self.fitted_backend = self._resolve_backend(X_train.shape[0])
+        self.fitted_calibration = self.calibration
+        if self.calibration == 'cv' and self.fitted_backend != 'kernel':
+            if self.backend != 'auto':
+                raise ValueError(f"calibration='cv' needs the kernel backend, use 'sigmoid' or 'margin' with the {self.fitted_backend} backend.")
+            # Too many samples for the exact SVC: calibrate the approximate backend on a held-out split instead
+            self.log(f"{X_train.shape[0]} samples, using the {self.fitted_backend} backend with calibration='sigmoid'.")
+            self.fitted_calibration = 'sigmoid'
+
+        X_calibration = y_calibration = None
+        if self.fitted_calibration == 'sigmoid':
+            X_train, X_calibration, y_train, y_calibration = train_test_split(
+                X_train, y_train, test_size=self.calibration_size, stratify=y_train, random_state=42
+            )
+
+        self.model = self._build_estimator(self.fitted_backend, X_train)
         self.model.fit(X_train, y_train)
 
+        if self.fitted_calibration == 'sigmoid':
+            # Platt scaling: a single 1-D logistic regression on the held-out decision values
+            self.calibrator = LogisticRegression().fit(self.decision_function(X_calibration).reshape(-1, 1), y_calibration)
+
+    def decision_function(self, X):
+        """
+        Signed distances to the separating hyperplane.
+
+        Args:
+            X: Feature data.
+
+        Returns:
+            np.ndarray: One decision value per sample.
+        """
+        return self.model.decision_function(X)
+
+    def predict_proba(self, X):
+        """
+        Probabilities of the positive class.
+
+        Args:
+            X: Feature data.
+
+        Returns:
+            np.ndarray: One probability per sample.
+        """
+        if self.fitted_calibration == 'cv':
+            return self.model.predict_proba(X)[:, 1]
+        if self.fitted_calibration == 'sigmoid':
+            return self.calibrator.predict_proba(self.decision_function(X).reshape(-1, 1))[:, 1]
+        raise ValueError("calibration='margin' does not estimate probabilities, use decision_function.")
+
     def predict(self, X):
         """
         Predicts binary labels for given feature data.
@@ -35,8 +153,9 @@ class SVMModel:
         Returns:
             Predicted binary labels.
         """
-        pred_probs = self.model.predict_proba(X)[:, 1]
-        return (pred_probs >= self.threshold).astype(int)
+        if self.fitted_calibration == 'margin':
+            return (self.decision_function(X) >= self.margin).astype(int)
+        return (self.predict_proba(X) >= self.threshold).astype(int)
 
     def evaluate(self, y_true, X):
         """
@@ -52,22 +171,20 @@ class SVMModel:
         y_pred = self.predict(X)
 
         # Calculate metrics
-        accuracy = accuracy_score(y_true, y_pred)
-        precision = precision_score(y_true, y_pred, average='weighted')
-        recall = recall_score(y_true, y_pred, average='weighted')
-        f1 = f1_score(y_true, y_pred, average='weighted')
+        metrics = classification_metrics(y_true, y_pred)
 
         # Print metrics
-        print("Evaluation Metrics:")
-        print(f"  Accuracy: {accuracy:.2f}")
-        print(f"  Precision: {precision:.2f}")
-        print(f"  Recall: {recall:.2f}")
-        print(f"  F1 Score: {f1:.2f}")
+        self.log("Evaluation Metrics:")
+        self.log(f"  Accuracy: {metrics['Accuracy']:.2f}")
+        self.log(f"  Precision: {metrics['Precision']:.2f}")
+        self.log(f"  Recall: {metrics['Recall']:.2f}")
+        self.log(f"  F1 Score: {metrics['F1 Score']:.2f}")
 
         # Confusion Matrix and Classification Report
-        print("\nConfusion Matrix:")
-        print(confusion_matrix(y_true, y_pred))
-        print("\nClassification Report:")
-        print(classification_report(y_true, y_pred))
+        if self.verbose:
+            print("\nConfusion Matrix:")
+            print(confusion_matrix(y_true, y_pred))
+            print("\nClassification Report:")
+            print(classification_report(y_true, y_pred))
 
-        return {"Accuracy": accuracy, "Precision": precision, "Recall": recall, "F1 Score": f1}
\ No newline at end of file
+        return metrics
\ No newline at end of file
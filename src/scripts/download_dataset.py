@@ -1,33 +1,319 @@
 import os
+import json
+import shutil
+import hashlib
 import tarfile
-import subprocess
+import argparse
+import urllib.error
+import urllib.request
+
+CMU_DATASET_URL = 'http://www.cs.cmu.edu/~ark/personas/data/MovieSummaries.tar.gz'
+CHUNK_SIZE = 1 << 20
+MANIFEST_FILENAME = '.extracted.json'
+
+
+def sha256_file(path, chunk_size=CHUNK_SIZE):
+    """
+    Args:
+        path (str): Path of the file.
+        chunk_size (int): Number of bytes read at once.
+
+    Returns:
+        str: Hex SHA-256 digest of the file.
+    """
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _check_sha256(actual, expected, source):
+    if expected is not None and actual != expected.lower():
+        raise ValueError(f"SHA-256 mismatch for {source}: expected {expected}, got {actual}.")
+
+
+def download(url, save_path, sha256=None, chunk_size=CHUNK_SIZE, timeout=60):
+    """
+    Downloads a file to `save_path + '.part'`, renamed to save_path once complete (and verified).
+    An interrupted download is resumed with an HTTP Range request, and restarted from scratch if the server
+    ignores it, answers with another range, or reports a size that does not match the partial file.
+    An existing save_path is kept if it matches the checksum (or if no checksum is given).
+
+    Args:
+        url (str): URL of the file.
+        save_path (str): Path of the downloaded file.
+        sha256 (str): Expected hex SHA-256 digest, None to skip the verification.
+        chunk_size (int): Number of bytes read at once.
+        timeout (float): Timeout of the connection, in seconds.
+
+    Returns:
+        str: save_path.
+    """
+    if os.path.isfile(save_path):
+        if sha256 is None or sha256_file(save_path, chunk_size) == sha256.lower():
+            print(f"{os.path.basename(save_path)} already exists.")
+            return save_path
+        print(f"{os.path.basename(save_path)} does not match its checksum, downloading it again.")
+        os.remove(save_path)
+
+    os.makedirs(os.path.dirname(save_path) or '.', exist_ok=True)
+    tmp_path = f"{save_path}.part"
+    while True:
+        offset = os.path.getsize(tmp_path) if os.path.isfile(tmp_path) else 0
+        request = urllib.request.Request(url, headers={'Range': f'bytes={offset}-'} if offset else {})
+        try:
+            response = urllib.request.urlopen(request, timeout=timeout)
+        except urllib.error.HTTPError as e:
+            if e.code != 416 or offset == 0:
+                raise
+            # Range not satisfiable: the partial file is complete only if it has exactly the size of the file
+            if e.headers.get('Content-Range', '') == f'bytes */{offset}':
+                break
+            print(f"The partial {os.path.basename(save_path)} does not match the remote file, restarting the download.")
+            os.remove(tmp_path)
+            continue
+
+        with response:
+            resumed = offset > 0 and response.status == 206
+            if resumed and not response.headers.get('Content-Range', '').startswith(f'bytes {offset}-'):
+                # A range starting elsewhere cannot be appended to the partial file
+                print(f"Unexpected range for {os.path.basename(save_path)}, restarting the download.")
+                os.remove(tmp_path)
+                continue
+            print(f"{'Resuming' if resumed else 'Downloading'} {os.path.basename(save_path)}"
+                  f"{f' from byte {offset}' if resumed else ''}...")
+            with open(tmp_path, 'ab' if resumed else 'wb') as f:
+                shutil.copyfileobj(response, f, chunk_size)
+                f.flush()
+                os.fsync(f.fileno())
+        break
+
+    if sha256 is not None:
+        actual = sha256_file(tmp_path, chunk_size)
+        if actual != sha256.lower():
+            # A corrupted partial file would be resumed forever
+            os.remove(tmp_path)
+            _check_sha256(actual, sha256, url)
+    os.replace(tmp_path, save_path)
+    return save_path
+
+
+class _HashingReader:
+    """File-like wrapper computing the SHA-256 of everything read from a stream."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.sha = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self.sha.update(data)
+        return data
+
+    def drain(self, chunk_size=CHUNK_SIZE):
+        """Reads (and hashes) the rest of the stream."""
+        while self.read(chunk_size):
+            pass
+        return self.sha.hexdigest()
+
+
+def _is_wanted(name, members):
+    return members is None or name in members or os.path.basename(name) in members
+
+
+def _member_path(extract_path, name):
+    path = os.path.normpath(name)
+    if os.path.isabs(path) or path == '..' or path.startswith('..' + os.sep):
+        raise ValueError(f"Unsafe member path {name} in the archive.")
+    return os.path.join(extract_path, path)
+
+
+def _extract_stream(fileobj, extract_path, members=None, stop_early=True, chunk_size=CHUNK_SIZE):
+    """
+    Extracts the regular files of a gzipped tar stream (read sequentially, without seeking) to `.part` files.
+
+    Returns:
+        dict: Member name -> (path of the .part file, mtime of the member), to be committed by _commit.
+    """
+    extracted = {}
+    with tarfile.open(fileobj=fileobj, mode='r|gz') as tar:
+        for member in tar:
+            if not member.isfile() or not _is_wanted(member.name, members):
+                continue
+            target = _member_path(extract_path, member.name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with tar.extractfile(member) as source, open(f"{target}.part", 'wb') as f:
+                shutil.copyfileobj(source, f, chunk_size)
+            extracted[member.name] = (f"{target}.part", member.mtime)
+            # Every requested member is found, the rest of the archive is not needed
+            if stop_early and members is not None and all(
+                    any(_is_wanted(name, [requested]) for name in extracted) for requested in members):
+                break
+
+    if members is not None:
+        missing = [requested for requested in members if not any(_is_wanted(name, [requested]) for name in extracted)]
+        if missing:
+            for tmp_path, _ in extracted.values():
+                os.remove(tmp_path)
+            raise ValueError(f"Members {missing} not found in the archive.")
+    return extracted
 
-# Download and extract the dataset
-def download_and_extract(url, extract_path):    
-    # Get the file name from the URL
-    file_name = url.split('/')[-1]
 
-    save_path = os.path.join(extract_path, file_name)
-    
-    # Check if the file already exists
-    if not os.path.exists(save_path):
-        # Download the file
-        print(f"Downloading {file_name}...")
-        subprocess.run(["wget", url, "-O", save_path])
-
-        extract_data(extract_path, file_name)
-    
-    else:
-        print(f"{file_name} already exists.")
-        extract_data(extract_path, file_name)
-
-
-def extract_data(path, data_dir):
-    # Check if the path exists, if not create it
-    if not os.path.exists(path):
-        os.makedirs(path)
-    
-    # Extract the data
+def _load_manifest(extract_path):
+    manifest_path = os.path.join(extract_path, MANIFEST_FILENAME)
+    if not os.path.isfile(manifest_path):
+        return {'source': None, 'complete': False, 'files': {}}
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+
+def _commit(extract_path, extracted, source, complete):
+    """Renames the extracted .part files and records them (with their size and mtime) in the manifest."""
+    manifest = _load_manifest(extract_path)
+    if manifest['source'] != source:
+        manifest = {'source': source, 'complete': False, 'files': {}}
+    manifest['complete'] = manifest['complete'] or complete
+
+    for name, (tmp_path, mtime) in extracted.items():
+        target = tmp_path[:-len('.part')]
+        os.utime(tmp_path, (mtime, mtime))
+        os.replace(tmp_path, target)
+        stat = os.stat(target)
+        manifest['files'][name] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    manifest_path = os.path.join(extract_path, MANIFEST_FILENAME)
+    with open(f"{manifest_path}.part", 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(f"{manifest_path}.part", manifest_path)
+
+
+def is_up_to_date(extract_path, source, members=None):
+    """
+    Whether the requested members were extracted from the same source and not modified since.
+
+    Args:
+        extract_path (str): Extraction directory.
+        source (str): Description of the archive (URL and checksum, or path and stat of the tarball).
+        members (list): Requested member names or file names, None for all of them.
+
+    Returns:
+        bool: True if the extraction can be skipped.
+    """
+    manifest = _load_manifest(extract_path)
+    if manifest['source'] != source or (members is None and not manifest['complete']):
+        return False
+
+    names = list(manifest['files']) if members is None else [
+        next((name for name in manifest['files'] if _is_wanted(name, [requested])), None) for requested in members]
+    for name in names:
+        if name is None:
+            return False
+        target = _member_path(extract_path, name)
+        if not os.path.isfile(target):
+            return False
+        stat = os.stat(target)
+        if (stat.st_size, stat.st_mtime_ns) != (manifest['files'][name]['size'], manifest['files'][name]['mtime_ns']):
+            return False
+    return True
+
+
+def stream_extract(url, extract_path, members=None, sha256=None, chunk_size=CHUNK_SIZE, timeout=60):
+    """
+    Downloads a .tar.gz and extracts it on the fly (gunzip and untar of the HTTP stream), without writing the tarball.
+    The extracted files are only renamed into place once the archive is verified, so an interrupted run leaves
+    the previous files untouched.
+
+    Args:
+        url (str): URL of the .tar.gz archive.
+        extract_path (str): Extraction directory.
+        members (list): Member names or file names to extract (e.g. ['movie.metadata.tsv']), None for all of them.
+        sha256 (str): Expected hex SHA-256 digest of the archive, None to skip the verification (the download then
+            stops as soon as the requested members are extracted).
+        chunk_size (int): Number of bytes read at once.
+        timeout (float): Timeout of the connection, in seconds.
+
+    Returns:
+        list: Paths of the extracted files.
+    """
+    os.makedirs(extract_path, exist_ok=True)
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        reader = _HashingReader(response)
+        print(f"Streaming {url.split('/')[-1]}...")
+        extracted = _extract_stream(reader, extract_path, members, stop_early=sha256 is None, chunk_size=chunk_size)
+        if sha256 is not None:
+            try:
+                _check_sha256(reader.drain(chunk_size), sha256, url)
+            except ValueError:
+                for tmp_path, _ in extracted.values():
+                    os.remove(tmp_path)
+                raise
+
+    _commit(extract_path, extracted, json.dumps({'url': url, 'sha256': sha256}), complete=members is None)
+    return [_member_path(extract_path, name) for name in extracted]
+
+
+def extract_data(path, data_dir, members=None, chunk_size=CHUNK_SIZE):
+    """
+    Extracts a .tar.gz archive (sequentially), skipped if the requested members are already up to date.
+
+    Args:
+        path (str): Directory of the archive, and extraction directory.
+        data_dir (str): File name of the archive.
+        members (list): Member names or file names to extract, None for all of them.
+        chunk_size (int): Number of bytes read at once.
+
+    Returns:
+        list: Paths of the extracted files (empty if they were up to date).
+    """
+    os.makedirs(path, exist_ok=True)
+    archive_path = os.path.join(path, data_dir)
+    stat = os.stat(archive_path)
+    source = json.dumps({'path': os.path.abspath(archive_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
+    if is_up_to_date(path, source, members):
+        print(f"{data_dir} is already extracted.")
+        return []
+
     print(f"Extracting {data_dir}...")
-    with tarfile.open(os.path.join(path, data_dir), "r:gz") as tar:
-        tar.extractall(path)
+    with open(archive_path, 'rb') as f:
+        extracted = _extract_stream(f, path, members, chunk_size=chunk_size)
+    _commit(path, extracted, source, complete=members is None)
+    return [_member_path(path, name) for name in extracted]
+
+
+def download_and_extract(url=CMU_DATASET_URL, extract_path='data', members=None, sha256=None, keep_archive=False,
+                         chunk_size=CHUNK_SIZE):
+    """
+    Downloads and extracts the dataset, skipped if the requested members are already up to date.
+
+    Args:
+        url (str): URL of the .tar.gz archive.
+        extract_path (str): Extraction directory.
+        members (list): Member names or file names to extract (e.g. ['movie.metadata.tsv']), None for all of them.
+        sha256 (str): Expected hex SHA-256 digest of the archive, None to skip the verification.
+        keep_archive (bool): Download the tarball to extract_path (resumable), instead of streaming it.
+        chunk_size (int): Number of bytes read at once.
+
+    Returns:
+        list: Paths of the extracted files (empty if they were up to date).
+    """
+    if not keep_archive:
+        if is_up_to_date(extract_path, json.dumps({'url': url, 'sha256': sha256}), members):
+            print(f"{url.split('/')[-1]} is already extracted.")
+            return []
+        return stream_extract(url, extract_path, members, sha256, chunk_size)
+
+    file_name = url.split('/')[-1]
+    download(url, os.path.join(extract_path, file_name), sha256, chunk_size)
+    return extract_data(extract_path, file_name, members, chunk_size)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Download and extract the CMU Movie Summary Corpus.")
+    parser.add_argument('--url', default=CMU_DATASET_URL)
+    parser.add_argument('--extract-path', default='data')
+    parser.add_argument('--members', nargs='*', help="Member names or file names to extract (default: all).")
+    parser.add_argument('--sha256', help="Expected SHA-256 of the archive.")
+    parser.add_argument('--keep-archive', action='store_true', help="Download the tarball (resumable) instead of streaming it.")
+    args = parser.parse_args()
+    download_and_extract(args.url, args.extract_path, args.members or None, args.sha256, args.keep_archive)
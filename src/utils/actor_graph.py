@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+STAR_POWER_FEATURES = ['cast_prior_films', 'num_experienced_actors', 'cast_star_power', 'cast_max_star_power']
+
+
+class ActorGraph:
+    """
+    Actor-movie incidence matrix and actor-actor co-appearance graph, keyed by 'freebase_actor_id'
+    (actor names are not unique), with per-actor revenue statistics and leakage-free "star power" features.
+
+    - `incidence`: sparse actors x movies matrix, 1 if the actor plays in the movie.
+    - `adjacency`: sparse actors x actors matrix, number of movies two actors played in together.
+    """
+
+    def __init__(self, df_characters, df_movies, time_column='release_year'):
+        """
+        Args:
+            df_characters (pd.DataFrame): Characters with 'freebase_actor_id', 'wikipedia_movie_id' and 'actor_name'
+                (e.g. the raw character.metadata.tsv).
+            df_movies (pd.DataFrame): Movies with 'wikipedia_movie_id', 'box_office_revenue' and `time_column`.
+            time_column (str): Release time of the movies: the star power of a movie only uses movies released
+                strictly before.
+        """
+        pairs = df_characters[['freebase_actor_id', 'wikipedia_movie_id', 'actor_name']].dropna(subset=['freebase_actor_id'])
+        pairs = pairs.drop_duplicates(subset=['freebase_actor_id', 'wikipedia_movie_id'])
+
+        actor_codes, self.actor_ids = pd.factorize(pairs['freebase_actor_id'], sort=True)
+        movie_codes, self.movie_ids = pd.factorize(pd.to_numeric(pairs['wikipedia_movie_id']).astype(np.int64), sort=True)
+        self.actor_names = pairs['actor_name'].groupby(actor_codes).first().reindex(np.arange(len(self.actor_ids))).to_numpy()
+
+        movies = df_movies.drop_duplicates(subset=['wikipedia_movie_id']).set_index('wikipedia_movie_id').reindex(self.movie_ids)
+        self.revenue = pd.to_numeric(movies['box_office_revenue'], errors='coerce').to_numpy(dtype=float)
+        self.time = pd.to_numeric(movies[time_column], errors='coerce').to_numpy(dtype=float)
+
+        self.pair_actors, self.pair_movies = actor_codes.astype(np.int64), movie_codes.astype(np.int64)
+        self.incidence = sparse.csr_matrix(
+            (np.ones(len(pairs), dtype=np.float64), (self.pair_actors, self.pair_movies)),
+            shape=(len(self.actor_ids), len(self.movie_ids))
+        )
+        self._adjacency = None
+
+    @property
+    def adjacency(self):
+        """Co-appearance counts (actors x actors, zero diagonal), computed on first use."""
+        if self._adjacency is None:
+            adjacency = (self.incidence @ self.incidence.T).tocsr()
+            adjacency.setdiag(0)
+            adjacency.eliminate_zeros()
+            self._adjacency = adjacency
+        return self._adjacency
+
+    def actor_stats(self, min_movies=1):
+        """
+        Per-actor statistics, with sparse matrix-vector products over the incidence matrix.
+
+        Args:
+            min_movies (int): Minimum number of movies of an actor (the notebook uses 20).
+
+        Returns:
+            pd.DataFrame: 'actor_name', 'num_movies', 'num_movies_with_revenue', 'total_revenue',
+            'mean_revenue' and 'num_coactors', indexed by 'freebase_actor_id'.
+        """
+        has_revenue = ~np.isnan(self.revenue)
+        num_movies = np.asarray(self.incidence.sum(axis=1)).ravel()
+        num_with_revenue = self.incidence @ has_revenue.astype(float)
+        total_revenue = self.incidence @ np.where(has_revenue, self.revenue, 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean_revenue = np.where(num_with_revenue > 0, total_revenue / num_with_revenue, np.nan)
+
+        stats = pd.DataFrame({
+            'actor_name': self.actor_names,
+            'num_movies': num_movies.astype(np.int64),
+            'num_movies_with_revenue': num_with_revenue.astype(np.int64),
+            'total_revenue': total_revenue,
+            'mean_revenue': mean_revenue,
+            'num_coactors': np.diff(self.adjacency.indptr),
+        }, index=pd.Index(self.actor_ids, name='freebase_actor_id'))
+        return stats[stats['num_movies'] >= min_movies]
+
+    def coactors(self, actor_id, top=10):
+        """
+        Args:
+            actor_id (str): Freebase id of the actor.
+            top (int): Number of co-actors.
+
+        Returns:
+            pd.DataFrame: The co-actors who played with the actor the most, with 'actor_name' and 'num_movies'.
+        """
+        position = self.actor_ids.get_loc(actor_id)
+        start, end = self.adjacency.indptr[position], self.adjacency.indptr[position + 1]
+        neighbors, counts = self.adjacency.indices[start:end], self.adjacency.data[start:end]
+        order = np.argsort(-counts, kind='stable')[:top]
+        return pd.DataFrame({
+            'actor_name': self.actor_names[neighbors[order]],
+            'num_movies': counts[order].astype(np.int64),
+        }, index=pd.Index(self.actor_ids[neighbors[order]], name='freebase_actor_id'))
+
+    def prior_revenue(self):
+        """
+        For each (actor, movie) pair, the films of the actor released strictly before the movie
+        (films of the same release time are excluded, so no revenue of the movie or of its contemporaries leaks).
+
+        Returns:
+            pd.DataFrame: 'freebase_actor_id', 'wikipedia_movie_id', 'prior_films', 'prior_films_with_revenue'
+            and 'prior_mean_revenue' (NaN without prior revenue or for movies of unknown release time).
+        """
+        revenue, time = self.revenue[self.pair_movies], self.time[self.pair_movies]
+        has_revenue = ~np.isnan(revenue)
+        long = pd.DataFrame({
+            'actor': self.pair_actors,
+            'time': time,
+            'film': 1.0,
+            'with_revenue': has_revenue.astype(float),
+            'revenue': np.where(has_revenue, revenue, 0.0),
+        })
+        known = long[~np.isnan(time)].sort_values(['actor', 'time'], kind='stable')
+
+        # Cumulative sums per actor, taken at the first film of each release time: only strictly earlier films count
+        increments = known[['film', 'with_revenue', 'revenue']]
+        prior = (increments.groupby(known['actor']).cumsum() - increments).groupby([known['actor'], known['time']]).transform('first')
+        prior = prior.reindex(long.index)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            prior_mean = np.where(prior['with_revenue'] > 0, prior['revenue'] / prior['with_revenue'], np.nan)
+
+        return pd.DataFrame({
+            'freebase_actor_id': self.actor_ids[self.pair_actors],
+            'wikipedia_movie_id': self.movie_ids[self.pair_movies],
+            'prior_films': prior['film'].astype('Int64'),
+            'prior_films_with_revenue': prior['with_revenue'].astype('Int64'),
+            'prior_mean_revenue': prior_mean,
+        })
+
+    def star_power(self):
+        """
+        Leakage-free cast-strength features of each movie, aggregated over its cast with sparse products:
+
+        - 'cast_prior_films': total number of earlier films of the cast.
+        - 'num_experienced_actors': actors with at least one earlier film with a known revenue.
+        - 'cast_star_power': mean over these actors of their mean revenue of earlier films.
+        - 'cast_max_star_power': max over these actors of their mean revenue of earlier films.
+
+        Returns:
+            pd.DataFrame: STAR_POWER_FEATURES indexed by 'wikipedia_movie_id'.
+        """
+        prior = self.prior_revenue()
+        prior_films = prior['prior_films'].to_numpy(dtype=float, na_value=0.0)
+        prior_mean = prior['prior_mean_revenue'].to_numpy()
+        experienced = ~np.isnan(prior_mean)
+
+        shape = (len(self.movie_ids), len(self.actor_ids))
+        films = sparse.csr_matrix((prior_films, (self.pair_movies, self.pair_actors)), shape=shape)
+        star = sparse.csr_matrix((prior_mean[experienced], (self.pair_movies[experienced], self.pair_actors[experienced])), shape=shape)
+        ones = np.ones(shape[1])
+
+        num_experienced = np.diff(star.indptr)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean_star = np.where(num_experienced > 0, (star @ ones) / num_experienced, np.nan)
+        max_star = np.where(num_experienced > 0, star.max(axis=1).toarray().ravel(), np.nan)
+
+        return pd.DataFrame({
+            'cast_prior_films': (films @ ones).astype(np.int64),
+            'num_experienced_actors': num_experienced.astype(np.int64),
+            'cast_star_power': mean_star,
+            'cast_max_star_power': max_star,
+        }, index=pd.Index(self.movie_ids, name='wikipedia_movie_id'))
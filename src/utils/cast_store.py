@@ -0,0 +1,160 @@
+import os
+import numpy as np
+import pandas as pd
+from src.utils.processings import (
+    read_tsv_chunks, resolve_ethnicities, CHARACTER_METADATA_CATEGORIES, DEFAULT_CHUNKSIZE, CMU_DATA_PREPROCESSED_PATH
+)
+from src.utils.features import cast_rows, cast_counts, CAST_COLUMNS
+from src.utils.freebase_resolver import FreebaseResolver
+
+DEFAULT_STORE_DIR = os.path.join(CMU_DATA_PREPROCESSED_PATH, 'cast_store')
+
+CAST_STORE_FEATURES = ['num_actors', 'num_male_actors', 'num_female_actors', 'male_share', 'female_share',
+                       'avg_actor_age', 'num_ethnicities', 'predominant_gender']
+
+# Gender predominance of the notebook: 'Balanced' if the male and female shares differ by less than this
+BALANCED_GENDER_MARGIN = 0.1
+
+
+def aggregate_cast(cast):
+    """
+    All the per-movie cast features: the counts of features.cast_counts, plus the gender shares,
+    the number of distinct ethnicities (names, over all the actors of the movie) and the predominant gender.
+
+    Args:
+        cast (pd.DataFrame): Rows returned by cast_rows.
+
+    Returns:
+        pd.DataFrame: CAST_STORE_FEATURES indexed by 'wikipedia_movie_id'.
+    """
+    features = cast_counts(cast)
+    labels = cast[['wikipedia_movie_id', 'actor_ethnicity']].explode('actor_ethnicity').dropna(subset=['actor_ethnicity'])
+    features['num_ethnicities'] = labels.groupby('wikipedia_movie_id')['actor_ethnicity'].nunique() \
+        .reindex(features.index, fill_value=0).astype(np.int64)
+
+    # Shares among the actors of known gender
+    num_gendered = features['num_male_actors'] + features['num_female_actors']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        features['male_share'] = features['num_male_actors'] / num_gendered.where(num_gendered > 0)
+        features['female_share'] = features['num_female_actors'] / num_gendered.where(num_gendered > 0)
+
+    # Vectorized version of the notebook's row-wise predominant gender
+    predominant = np.select(
+        [(features['male_share'] - features['female_share']).abs() < BALANCED_GENDER_MARGIN,
+         features['male_share'] > features['female_share'],
+         features['female_share'] > features['male_share']],
+        ['Balanced', 'Male', 'Female'], default=None
+    )
+    features['predominant_gender'] = pd.Categorical(predominant, categories=['Balanced', 'Female', 'Male'])
+
+    return features[CAST_STORE_FEATURES]
+
+
+class CastFeatureStore:
+    """
+    Materialized per-movie cast features, keyed by 'wikipedia_movie_id'.
+
+    The store keeps the deduplicated (movie, actor) rows next to the features, so that new character rows only
+    trigger the aggregation of the movies they touch. Both tables are stored as Parquet files in `store_dir`.
+    """
+
+    def __init__(self, store_dir=DEFAULT_STORE_DIR):
+        """
+        Args:
+            store_dir (str): Directory of the store, loaded if it exists.
+        """
+        self.store_dir = store_dir
+        self.cast_path = os.path.join(store_dir, 'cast.parquet')
+        self.features_path = os.path.join(store_dir, 'features.parquet')
+
+        if os.path.isfile(self.cast_path) and os.path.isfile(self.features_path):
+            self.cast = pd.read_parquet(self.cast_path)
+            self.features = pd.read_parquet(self.features_path)
+        else:
+            self.cast = pd.DataFrame({column: pd.Series(dtype=np.int64 if column == 'wikipedia_movie_id' else object)
+                                      for column in CAST_COLUMNS})
+            self.cast['actor_age'] = self.cast['actor_age'].astype(float)
+            self.features = aggregate_cast(self.cast)
+
+    def update(self, df_characters, save=True, ethnicities=None):
+        """
+        Adds character rows and re-aggregates the features of the movies they belong to.
+        Rows of (movie, actor) pairs already in the store only fill their missing values.
+
+        Args:
+            df_characters (pd.DataFrame): New characters (see cast_rows).
+            save (bool): Write the store to disk.
+            ethnicities (dict): Freebase id -> list of ethnicity names, required for raw characters with ethnicity ids.
+
+        Returns:
+            np.ndarray: Ids of the updated movies.
+        """
+        new_cast = cast_rows(df_characters, ethnicities)
+        movie_ids = new_cast['wikipedia_movie_id'].unique()
+        if len(movie_ids) == 0:
+            return movie_ids
+
+        touched = self.cast['wikipedia_movie_id'].isin(movie_ids)
+        # Existing rows first, so that their known values are kept
+        merged_cast = cast_rows(pd.concat([self.cast[touched], new_cast], ignore_index=True))
+
+        self.cast = pd.concat([self.cast[~touched], merged_cast], ignore_index=True)
+        self.features = pd.concat([
+            self.features[~self.features.index.isin(movie_ids)],
+            aggregate_cast(merged_cast),
+        ]).sort_index()
+
+        if save:
+            self.save()
+        return movie_ids
+
+    def build(self, file_path, chunksize=DEFAULT_CHUNKSIZE, resolver=None):
+        """
+        Rebuilds the store from character.metadata.tsv, read by chunks. The ethnicity ids of each chunk are resolved
+        to names (as in the preprocessed characters), and the features are aggregated once, after all the chunks
+        are deduplicated.
+
+        Args:
+            file_path (str): Path of character.metadata.tsv.
+            chunksize (int): Number of rows per chunk.
+            resolver (FreebaseResolver): Resolver of the ethnicity ids. Defaults to one with the persistent cache.
+
+        Returns:
+            pd.DataFrame: The features.
+        """
+        own_resolver = resolver is None
+        resolver = FreebaseResolver() if own_resolver else resolver
+
+        ethnicities, unresolved, chunks = {}, set(), []
+        try:
+            for df_characters in read_tsv_chunks(file_path, CHARACTER_METADATA_CATEGORIES, chunksize):
+                resolve_ethnicities(df_characters['actor_ethnicity'].unique(), ethnicities, unresolved, verbose=False, resolver=resolver)
+                chunks.append(cast_rows(df_characters, ethnicities))
+        finally:
+            if own_resolver:
+                resolver.close()
+        # An actor of a movie may appear in two chunks
+        self.cast = cast_rows(pd.concat(chunks, ignore_index=True)) if chunks else self.cast.iloc[0:0]
+        self.features = aggregate_cast(self.cast)
+        self.save()
+        return self.features
+
+    def save(self):
+        """Writes the cast rows and the features to the store directory."""
+        os.makedirs(self.store_dir, exist_ok=True)
+        for df, file_path in ((self.cast, self.cast_path), (self.features, self.features_path)):
+            tmp_path = f"{file_path}.part"
+            df.to_parquet(tmp_path)
+            os.replace(tmp_path, file_path)
+
+    def get(self, movie_ids=None, columns=None):
+        """
+        Args:
+            movie_ids (list): Ids of the movies, None for all of them (missing movies get NaN).
+            columns (list): Features to return, None for all of them.
+
+        Returns:
+            pd.DataFrame: The features indexed by 'wikipedia_movie_id'.
+        """
+        features = self.features if columns is None else self.features[columns]
+        return features if movie_ids is None else features.reindex(pd.Index(movie_ids, name='wikipedia_movie_id'))
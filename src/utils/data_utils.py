@@ -1,57 +1,156 @@
+import re
+import ast
 import json
+import numpy as np
+import pandas as pd
+from scipy import sparse
 from textblob import TextBlob
 from SPARQLWrapper import SPARQLWrapper, JSON
+from src.utils.normalization import GENRE_NORMALIZER, ETHNICITY_NORMALIZER
 
-def get_day(date_str):
+# 'YYYY', 'YYYY-MM' or 'YYYY-MM-DD' (the time part of some release dates is ignored)
+DATE_PATTERN = r'^\s*(?P<year>\d{1,4})(?:-(?P<month>\d{1,2})(?:-(?P<day>\d{1,2}))?)?'
+_DATE_REGEX = re.compile(DATE_PATTERN)
+
+def split_dates(dates):
     """
-    Get the day from a date string.
+    Decompose a column of date strings into year, month and day in a single vectorized pass.
     Args:
-        date_str (str): A date string in the format 'YYYY-MM-DD'.
+        dates (pd.Series): Date strings in the format 'YYYY', 'YYYY-MM' or 'YYYY-MM-DD'.
         
     Returns:
-        int: The day of the date.
+        pd.DataFrame: Columns 'year', 'month' and 'day' as nullable integers (<NA> when missing),
+        with the same index as `dates`.
     """
+    dates = pd.Series(dates).astype('string')
+    return dates.str.extract(DATE_PATTERN).astype('Int64')
+
+def _date_component(date_str, component):
     if not isinstance(date_str, str):
         return date_str
-    
-    date = date_str.split('-')
-    if len(date) < 3:
+
+    match = _DATE_REGEX.match(date_str)
+    if match is None or match[component] is None:
         return None
-    return int(date[2])
+    return int(match[component])
+
+def get_day(date_str):
+    """
+    Get the day from a date string. Use split_dates for a whole column.
+    Args:
+        date_str (str): A date string in the format 'YYYY-MM-DD'.
+        
+    Returns:
+        int: The day of the date.
+    """
+    return _date_component(date_str, 'day')
 
 def get_month(date_str):
     """
-    Get the month from a date string.
+    Get the month from a date string. Use split_dates for a whole column.
     Args:
         date_str (str): A date string in the format 'YYYY-MM-DD'.
         
     Returns:
         int: The month of the date.
     """
-    if not isinstance(date_str, str):
-        return date_str
-    
-    date = date_str.split('-')
-    if len(date) < 2:
-        return None
-    return int(date[1])
+    return _date_component(date_str, 'month')
 
 def get_year(date_str):
     """
-    Get the year from a date string.
+    Get the year from a date string. Use split_dates for a whole column.
     Args:
         date_str (str): A date string in the format 'YYYY-MM-DD'.
         
     Returns:
         int: The year of the date.
     """
-    if not isinstance(date_str, str):
-        return date_str
-    
-    date = date_str.split('-')
-    if len(date) < 1:
-        return None
-    return int(date[0])
+    return _date_component(date_str, 'year')
+
+# One "'/m/..': 'Name'" entry of a Freebase dictionary, with JSON (double) or Python repr (single or double) quotes
+FREEBASE_ENTRY_PATTERN = (
+    r"""(?P<quote>['"])(?P<freebase_id>/m/[^'"]+)(?P=quote)\s*:\s*"""
+    r"""(?:"(?P<dq_name>(?:[^"\\]|\\.)*)"|'(?P<sq_name>(?:[^'\\]|\\.)*)')"""
+)
+_FREEBASE_ENTRY_REGEX = re.compile(FREEBASE_ENTRY_PATTERN)
+
+def _unescape_name(name, double_quoted):
+    if '\\' not in name:
+        return name
+    return json.loads(f'"{name}"') if double_quoted else ast.literal_eval(f"'{name}'")
+
+def parse_freebase_dict(dict_str):
+    """
+    Parse a Freebase dictionary string such as {"/m/02h40lc": "English Language"} (raw TSV)
+    or {'/m/02h40lc': 'English Language'} (preprocessed CSV). Names containing apostrophes are kept.
+    Args:
+        dict_str (str): String representation of the dictionary.
+        
+    Returns:
+        dict: Freebase id -> name.
+    """
+    return {
+        match['freebase_id']: _unescape_name(match['dq_name'], True) if match['dq_name'] is not None
+        else _unescape_name(match['sq_name'], False)
+        for match in _FREEBASE_ENTRY_REGEX.finditer(dict_str)
+    }
+
+def explode_freebase_column(freebase_dicts):
+    """
+    Parse a whole column of Freebase dictionary strings at once into a long table,
+    with one row per (movie, entry) and interned (categorical) ids and names.
+    Args:
+        freebase_dicts (pd.Series): Freebase dictionary strings, missing values are skipped.
+        
+    Returns:
+        pd.DataFrame: Columns 'row' (position in `freebase_dicts`), 'freebase_id' and 'name' (categoricals),
+        sorted by row.
+    """
+    values = pd.Series(freebase_dicts).reset_index(drop=True).astype('string')
+    entries = values.str.extractall(FREEBASE_ENTRY_PATTERN)
+
+    double_quoted = entries['dq_name'].notna()
+    names = entries['dq_name'].fillna(entries['sq_name'])
+
+    # Escape sequences are rare, only decode those
+    escaped = names.str.contains('\\', regex=False).fillna(False).to_numpy(dtype=bool)
+    if escaped.any():
+        names = names.astype(object)
+        names.iloc[escaped] = [
+            _unescape_name(name, is_double)
+            for name, is_double in zip(names.iloc[escaped], double_quoted.iloc[escaped])
+        ]
+
+    return pd.DataFrame({
+        'row': entries.index.get_level_values(0).to_numpy(dtype=np.int64),
+        'freebase_id': pd.Categorical(entries['freebase_id'].astype(object)),
+        'name': pd.Categorical(names.astype(object)),
+    })
+
+def parse_freebase_column(freebase_dicts, as_list=False):
+    """
+    Vectorized convert_to_dict / convert_to_list for a whole column, parsing each cell once.
+    The ids and names are shared between rows instead of being one string object per cell.
+    Args:
+        freebase_dicts (pd.Series): Freebase dictionary strings.
+        as_list (bool): Return the list of names instead of the dictionary.
+        
+    Returns:
+        pd.Series: One dict (or list) per row, missing values are kept as is.
+    """
+    freebase_dicts = pd.Series(freebase_dicts)
+    long = explode_freebase_column(freebase_dicts)
+
+    ids = long['freebase_id'].astype(object).to_numpy()
+    names = long['name'].astype(object).to_numpy()
+    bounds = np.searchsorted(long['row'].to_numpy(), np.arange(len(freebase_dicts) + 1))
+
+    parsed = pd.Series(
+        [names[start:end].tolist() if as_list else dict(zip(ids[start:end], names[start:end]))
+         for start, end in zip(bounds[:-1], bounds[1:])],
+        index=freebase_dicts.index, dtype=object
+    )
+    return parsed.where(freebase_dicts.notna(), freebase_dicts)
 
 def convert_to_dict(dict_str):
     """
@@ -64,7 +163,12 @@ def convert_to_dict(dict_str):
     """
     if not isinstance(dict_str, str):
         return dict_str
-    
+
+    parsed = parse_freebase_dict(dict_str)
+    if parsed:
+        return parsed
+
+    # Not a Freebase dictionary
     dict_str = dict_str.replace("'", '"')
     try:
         return json.loads(dict_str)
@@ -112,76 +216,201 @@ def get_name_from_freebase_id(freebase_id):
     
     
 def create_genre_list(data):
-
-    new_data = []
-    
-    for genre in data:
-        # Clean genre names
-        genre = genre.lower()\
-            .replace('romantic', 'romance')\
-            .replace('sci-fi', 'science-fiction')\
-            .replace('science fiction', 'science-fiction')\
-            .replace('comedy-drama', 'comedy drama')\
-            .replace('period piece', 'period_piece')\
-            .replace('computer animation', 'computer_animation')\
-            .replace('glamorized spy', 'glamorized_spy')\
-            .replace('time travel', 'time_travel')\
-            .replace(' of ', '_of_')\
-            .replace(' and ', '_and_')\
-            .replace(' cinema', '')\
-            .replace(' films', '')\
-            .replace(' film', '')\
-            .replace('film ', '')\
-            .replace(' movies', '')\
-            .replace(' movie', '')\
-            .replace('/', ' ')
-        new_genre = genre.split()
-
-        new_data += new_genre
-
-    # Remove duplicates
-    new_data = list(set(new_data))
-
-    return new_data
+    """
+    Clean and split a list of genres, e.g. ['Action/Adventure'] -> ['action', 'adventure'].
+    Use normalization.GENRE_NORMALIZER.normalize_lists for a whole column.
+    Args:
+        data (list): Genre names.
+        
+    Returns:
+        list: The unique normalized genres.
+    """
+    return list(dict.fromkeys(genre for raw_genre in data for genre in GENRE_NORMALIZER.normalize(raw_genre)))
 
     
 def create_ethnicity_list(data_str):
+    """
+    Clean and split an ethnicity name, e.g. 'Asian Americans' -> ['asian', 'american'].
+    Args:
+        data_str (str): Ethnicity name.
+        
+    Returns:
+        list: The normalized ethnicity names.
+    """
     if not data_str:
         return []
 
-    # Clean ethnicity names
-    new = data_str.lower()\
-        .replace('ans', 'an')\
-        .replace('people', '')\
-        .replace('peoples', '')\
-        .replace('names', '')\
-        .replace('culture', '')\
-        .replace(' of', '')\
-        .replace(' the', '')\
-        .replace(' and', '')\
-        .replace(' in', '')\
-        .replace(' to', '')\
-        .replace('united states', 'united_states')\
-        .replace('united kingdom', 'united_kingdom')\
-        .replace('puerto rican', 'puerto_rican')\
-        .replace('afro', 'african')\
-        .replace('afro-', 'african ')\
-        .replace('south african', 'south_african')\
-        .replace('african-american', 'african american')\
-        .replace('jews', 'jewish')
-    
-    # Split the string into a list of ethnicity names
-    return new.split()
+    return list(ETHNICITY_NORMALIZER.normalize(data_str))
+
+def _label_lists(values):
+    """Labels of each row of a column of lists (or dicts, whose values are the labels), and the number per row."""
+    labels, lengths = [], np.zeros(len(values), dtype=np.int64)
+    for row, cell in enumerate(values):
+        if isinstance(cell, dict):
+            cell = cell.values()
+        elif not isinstance(cell, (list, tuple, set, np.ndarray)):
+            continue  # Missing value
+        cell = list(dict.fromkeys(cell))  # A label counts once per row
+        labels.extend(cell)
+        lengths[row] = len(cell)
+    return labels, lengths
+
+class MultiHotEncoder:
+    """
+    Multi-hot encoding of a column of label lists (genres, ethnicities) or Freebase dicts (languages, countries)
+    as a scipy sparse CSR matrix (rows x labels), instead of exploding the dataframe.
+
+    - `aggregate(matrix, values)` computes per-label counts, sums and means with sparse matrix-vector products.
+    - `inverted_index(matrix)` maps each label to the positions of the rows having it.
+    - The matrix can be used as features by the models of src.models (scipy.sparse.hstack with the other features).
+    """
+
+    def __init__(self, min_count=1, max_labels=None, dtype=np.float32):
+        """
+        Args:
+            min_count (int): Minimum number of rows of a label to be in the vocabulary.
+            max_labels (int): Maximum size of the vocabulary (most frequent labels first), None for no limit.
+            dtype: Type of the matrix values.
+        """
+        self.min_count = min_count
+        self.max_labels = max_labels
+        self.dtype = dtype
+        self.vocabulary = None
+
+    def fit(self, values):
+        """
+        Builds the vocabulary, sorted by decreasing frequency then by label.
+
+        Args:
+            values (pd.Series): Lists of labels or dicts {freebase id: name}, missing values are ignored.
+
+        Returns:
+            MultiHotEncoder: The encoder.
+        """
+        labels, _ = _label_lists(values)
+        counts = pd.Series(labels, dtype=object).value_counts()
+        counts = counts[counts >= self.min_count]
+        counts = counts.rename_axis('label').reset_index(name='count').sort_values(['count', 'label'], ascending=[False, True])
+        if self.max_labels is not None:
+            counts = counts.head(self.max_labels)
+        self.vocabulary = counts['label'].tolist()
+        return self
+
+    def transform(self, values):
+        """
+        Encodes a column with the fitted vocabulary, unknown labels are ignored.
+
+        Args:
+            values (pd.Series): Lists of labels or dicts {freebase id: name}.
+
+        Returns:
+            scipy.sparse.csr_matrix: Shape (len(values), len(vocabulary)), 1 where a row has a label.
+        """
+        if self.vocabulary is None:
+            raise ValueError("Call fit before transform.")
+        labels, lengths = _label_lists(values)
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+        columns = pd.Categorical(labels, categories=self.vocabulary).codes.astype(np.int64)
+        known = columns >= 0
+
+        return sparse.csr_matrix(
+            (np.ones(known.sum(), dtype=self.dtype), (rows[known], columns[known])),
+            shape=(len(lengths), len(self.vocabulary))
+        )
+
+    def fit_transform(self, values):
+        return self.fit(values).transform(values)
+
+    @property
+    def feature_names(self):
+        """Names of the matrix columns."""
+        return list(self.vocabulary)
+
+    def inverted_index(self, matrix):
+        """
+        Args:
+            matrix (scipy.sparse matrix): Matrix returned by transform.
+
+        Returns:
+            dict: Label -> array of the positions of the rows having it.
+        """
+        by_label = sparse.csc_matrix(matrix)
+        return {label: by_label.indices[by_label.indptr[column]:by_label.indptr[column + 1]]
+                for column, label in enumerate(self.vocabulary)}
+
+    def aggregate(self, matrix, values):
+        """
+        Per-label statistics of a numeric column (e.g. the box office revenue) with sparse matrix-vector products,
+        the equivalent of exploding the labels and grouping by label.
+
+        Args:
+            matrix (scipy.sparse matrix): Matrix returned by transform.
+            values (pd.Series): Numeric values of the rows, missing values are ignored.
+
+        Returns:
+            pd.DataFrame: 'count', 'sum' and 'mean' of each label (index), sorted by decreasing mean.
+        """
+        values = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=float)
+        known = ~np.isnan(values)
+        counts = matrix.T @ known.astype(float)
+        sums = matrix.T @ np.where(known, values, 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means = np.where(counts > 0, sums / counts, np.nan)
+
+        return pd.DataFrame({'count': counts.astype(np.int64), 'sum': sums, 'mean': means},
+                            index=pd.Index(self.vocabulary, name='label')).sort_values('mean', ascending=False)
+
+
+RELEASE_SEASONS = ['Summer', 'Holiday', 'Other']
+# Index of the season of each month in RELEASE_SEASONS (index 0 is unused)
+_SEASON_CODE_BY_MONTH = np.array([-1, 1, 2, 2, 2, 2, 0, 0, 0, 2, 2, 2, 1], dtype=np.int8)
+
+AGE_GROUPS = ['child', 'teen', 'young_adult', 'adult', 'senior']
+AGE_GROUP_BINS = [0, 13, 18, 35, 65, np.inf]
+
+def categorize_release_seasons(months):
+    """
+    Vectorized categorize_release_season for a whole column of release months, stricter about missing values:
+    they give NaN instead of 'Other'.
+    Args:
+        months (pd.Series): Release months (1-12), missing or invalid months give NaN.
         
-    
+    Returns:
+        pd.Series: Ordered categorical of RELEASE_SEASONS.
+    """
+    months = pd.Series(months)
+    values = pd.to_numeric(months, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+
+    valid = (values >= 1) & (values <= 12) & (values == np.floor(values))
+    codes = np.full(len(values), -1, dtype=np.int8)
+    codes[valid] = _SEASON_CODE_BY_MONTH[values[valid].astype(np.int64)]
+
+    return pd.Series(pd.Categorical.from_codes(codes, categories=RELEASE_SEASONS, ordered=True), index=months.index)
+
+def categorize_age_groups(ages):
+    """
+    Vectorized categorize_age_group for a whole column of ages, stricter about invalid values: they give NaN
+    instead of a group, and integer ages are categorized like floats.
+    Args:
+        ages (pd.Series): Actor ages, missing, non-numeric, infinite or negative ages give NaN.
+        
+    Returns:
+        pd.Series: Ordered categorical of AGE_GROUPS.
+    """
+    ages = pd.to_numeric(pd.Series(ages), errors='coerce')
+    return pd.cut(ages, bins=AGE_GROUP_BINS, labels=AGE_GROUPS, right=False, ordered=True)
+
 def categorize_release_season(month):
     """
-    Categorize a release date into one of the following categories: Spring, Summer, Holiday, or Other.
+    Categorize a release month into one of the following categories: Summer (June to August),
+    Holiday (December and January), or Other. Use categorize_release_seasons for a whole column
+    (which gives NaN instead of 'Other' for missing or invalid months).
     Args:
-        date: The release date of a movie.
+        month (float): The release month of a movie.
         
     Returns:
-        str: The category of the release date.
+        str: The category of the release month ('Other' for any other float, e.g. NaN),
+        non-float values are returned unchanged.
     """
     if not isinstance(month, float):
         return month
@@ -195,12 +424,14 @@ def categorize_release_season(month):
     
 def categorize_age_group(age):
     """
-    Categorize a release date into one of the following categories: Spring, Summer, Holiday, or Other.
+    Categorize an age into one of the following categories: child, teen, young_adult, adult or senior.
+    Use categorize_age_groups for a whole column (which gives NaN for missing, infinite or negative ages,
+    and also categorizes integer ages).
     Args:
-        date (datetime): The release date of a movie.
+        age (float): The age of an actor.
         
     Returns:
-        str: The category of the release date.
+        str: The age group (negative ages give 'teen', NaN gives 'senior'), non-float values are returned unchanged.
     """
     if not isinstance(age, float):
         return age
@@ -0,0 +1,227 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import torch
+from transformers import AutoModel, AutoTokenizer
+
+DEFAULT_STORE_DIR = 'data/cache/plot_embeddings'
+DEFAULT_MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+
+
+class EmbeddingStore:
+    """
+    Append-only store of float16 vectors indexed by movie id, memory-mapped for reading.
+
+    The vectors and the ids are appended to two raw binary files (vectors first), so an interrupted append
+    leaves at most a partial record at the end, which is ignored (and overwritten) when the store is reopened.
+    """
+
+    def __init__(self, store_dir=DEFAULT_STORE_DIR, dim=None, model_name=None):
+        """
+        Args:
+            store_dir (str): Directory of the store.
+            dim (int): Dimension of the vectors, required to create the store.
+            model_name (str): Name of the model producing the vectors, checked against an existing store.
+        """
+        self.store_dir = store_dir
+        self.vectors_path = os.path.join(store_dir, 'vectors.f16')
+        self.ids_path = os.path.join(store_dir, 'ids.i64')
+        self.meta_path = os.path.join(store_dir, 'meta.json')
+
+        if os.path.isfile(self.meta_path):
+            with open(self.meta_path, 'r') as f:
+                meta = json.load(f)
+            if dim is not None and meta['dim'] != dim:
+                raise ValueError(f"The store in {store_dir} has vectors of dimension {meta['dim']}, not {dim}.")
+            if model_name is not None and meta['model_name'] not in (None, model_name):
+                raise ValueError(f"The store in {store_dir} was built with {meta['model_name']}, not {model_name}.")
+            self.dim, self.model_name = meta['dim'], meta['model_name']
+        else:
+            if dim is None:
+                raise ValueError(f"No store in {store_dir}, the dimension of the vectors is required to create it.")
+            os.makedirs(store_dir, exist_ok=True)
+            self.dim, self.model_name = dim, model_name
+            with open(self.meta_path, 'w') as f:
+                json.dump({'dim': dim, 'model_name': model_name}, f)
+            for file_path in (self.vectors_path, self.ids_path):
+                open(file_path, 'ab').close()
+
+        self._truncate_partial_records()
+        self._ids = np.fromfile(self.ids_path, dtype=np.int64)
+        self._index = pd.Index(self._ids)
+
+    def _truncate_partial_records(self):
+        vector_bytes = self.dim * np.dtype(np.float16).itemsize
+        n_vectors = os.path.getsize(self.vectors_path) // vector_bytes
+        n_ids = os.path.getsize(self.ids_path) // np.dtype(np.int64).itemsize
+        n_records = min(n_vectors, n_ids)
+        os.truncate(self.vectors_path, n_records * vector_bytes)
+        os.truncate(self.ids_path, n_records * np.dtype(np.int64).itemsize)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, movie_id):
+        return movie_id in self._index
+
+    @property
+    def ids(self):
+        """Movie id of each stored vector."""
+        return self._ids
+
+    @property
+    def vectors(self):
+        """All the vectors, as a read-only (len(store), dim) float16 memory map."""
+        if len(self) == 0:
+            return np.empty((0, self.dim), dtype=np.float16)
+        return np.memmap(self.vectors_path, dtype=np.float16, mode='r', shape=(len(self), self.dim))
+
+    def missing(self, movie_ids):
+        """
+        Args:
+            movie_ids (array-like): Movie ids.
+
+        Returns:
+            np.ndarray: Boolean mask of the ids without a stored vector.
+        """
+        return ~pd.Index(movie_ids).isin(self._index)
+
+    def append(self, movie_ids, vectors):
+        """
+        Appends vectors to the store, and flushes them to disk.
+
+        Args:
+            movie_ids (array-like): Movie id of each vector.
+            vectors (np.ndarray): Shape (len(movie_ids), dim), converted to float16.
+        """
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float16)
+        if vectors.shape != (len(movie_ids), self.dim):
+            raise ValueError(f"Expected vectors of shape {(len(movie_ids), self.dim)}, got {vectors.shape}.")
+
+        # Vectors first: an id is only written once its vector is on disk
+        for file_path, array in ((self.vectors_path, vectors), (self.ids_path, movie_ids)):
+            with open(file_path, 'ab') as f:
+                f.write(array.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+        self._ids = np.concatenate([self._ids, movie_ids])
+        self._index = pd.Index(self._ids)
+
+    def get(self, movie_ids, dtype=np.float32):
+        """
+        Args:
+            movie_ids (array-like): Movie ids.
+            dtype: Type of the returned vectors.
+
+        Returns:
+            np.ndarray: One vector per id, NaN for the ids without a vector (the last stored one for duplicated ids).
+        """
+        # The last vector of a duplicated id is used
+        last_rows = np.flatnonzero(~self._index.duplicated(keep='last'))
+        positions = self._index[last_rows].get_indexer(pd.Index(movie_ids))
+        positions = np.where(positions >= 0, last_rows[positions], -1)
+
+        result = np.full((len(positions), self.dim), np.nan, dtype=dtype)
+        known = positions >= 0
+        result[known] = self.vectors[positions[known]]
+        return result
+
+
+def length_buckets(lengths, batch_size):
+    """
+    Batches of positions with similar lengths, to minimize the padding.
+
+    Args:
+        lengths (np.ndarray): Token count of each text.
+        batch_size (int): Number of texts per batch.
+
+    Returns:
+        list: Arrays of positions, from the longest texts to the shortest.
+    """
+    order = np.argsort(-np.asarray(lengths), kind='stable')
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+def pad_batch(encodings, positions, pad_token_id):
+    """
+    Tensors of a batch of tokenized texts, padded up to the longest text of the batch.
+
+    Args:
+        encodings: Output of the tokenizer (lists of token ids per text, without padding).
+        positions (np.ndarray): Positions of the texts of the batch.
+        pad_token_id (int): Id of the padding token.
+
+    Returns:
+        dict: The model inputs ('input_ids', 'attention_mask' and the other fields of the encodings).
+    """
+    lengths = [len(encodings['input_ids'][position]) for position in positions]
+    batch = {}
+    for key in encodings.keys():
+        padding = pad_token_id if key == 'input_ids' else 0
+        batch[key] = torch.tensor([encodings[key][position] + [padding] * (max(lengths) - length)
+                                   for position, length in zip(positions, lengths)])
+    return batch
+
+
+def mean_pooling(hidden_states, attention_mask):
+    """Mean of the token embeddings, ignoring the padding."""
+    mask = attention_mask.unsqueeze(-1).to(hidden_states.dtype)
+    return (hidden_states * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+
+
+def embed_summaries(df_plots, store_dir=DEFAULT_STORE_DIR, model_name=DEFAULT_MODEL_NAME, id_column='movie_id',
+                    text_column='summary', batch_size=32, max_length=256, num_threads=None, normalize=True,
+                    verbose=False):
+    """
+    Transformer embeddings of the plot summaries, on CPU. Only the summaries of movies not yet in the store are embedded:
+    an interrupted run resumes where it stopped.
+
+    The texts are tokenized once, sorted by length into batches (padding only up to the longest text of a batch),
+    and run through the model under torch.inference_mode. Each batch is appended to the store as soon as it is computed.
+
+    Args:
+        df_plots (pd.DataFrame): Plot summaries.
+        store_dir (str): Directory of the EmbeddingStore.
+        model_name (str): Hugging Face model (mean pooling of its last hidden states).
+        id_column (str): Column of the movie ids.
+        text_column (str): Column of the summaries.
+        batch_size (int): Number of summaries per forward pass.
+        max_length (int): Maximum number of tokens per summary (longer ones are truncated).
+        num_threads (int): Number of torch CPU threads, None to keep the default.
+        normalize (bool): L2-normalize the embeddings.
+        verbose (bool): Print the number of summaries to embed.
+
+    Returns:
+        EmbeddingStore: The store, with a vector for every movie of df_plots.
+    """
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    store = EmbeddingStore(store_dir, dim=model.config.hidden_size, model_name=model_name)
+
+    df_plots = df_plots.drop_duplicates(subset=[id_column])
+    df_plots = df_plots[store.missing(df_plots[id_column])]
+    if df_plots.empty:
+        return store
+
+    movie_ids = df_plots[id_column].to_numpy(dtype=np.int64)
+    encodings = tokenizer(df_plots[text_column].fillna('').tolist(), truncation=True, max_length=max_length)
+    lengths = np.array([len(input_ids) for input_ids in encodings['input_ids']])
+    if verbose:
+        print(f"Embedding {len(movie_ids)} summaries ({len(store)} already stored)...")
+
+    with torch.inference_mode():
+        for positions in length_buckets(lengths, batch_size):
+            batch = pad_batch(encodings, positions, tokenizer.pad_token_id)
+            hidden_states = model(**batch).last_hidden_state
+            embeddings = mean_pooling(hidden_states, batch['attention_mask'])
+            if normalize:
+                embeddings = torch.nn.functional.normalize(embeddings, dim=1)
+            store.append(movie_ids[positions], embeddings.numpy())
+
+    return store
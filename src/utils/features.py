@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+
+# Features used by the revenue models of the notebook
+MODEL_FEATURES = ['runtime', 'release_year', 'is_holiday_release', 'num_actors', 'num_male_actors',
+                  'num_female_actors', 'avg_actor_age']
+CAST_FEATURES = ['num_actors', 'num_male_actors', 'num_female_actors', 'avg_actor_age']
+
+# One row per (movie, actor): an actor playing several characters of a movie is counted once
+CAST_COLUMNS = ['wikipedia_movie_id', 'actor_key', 'actor_gender', 'actor_age', 'actor_ethnicity']
+
+# Summer blockbusters and Christmas releases
+HOLIDAY_RELEASE_MONTHS = [6, 7, 8, 12]
+
+
+def holiday_release(release_months):
+    """
+    Flag the movies released during the summer or in December.
+
+    Args:
+        release_months (pd.Series): Release months (1-12).
+
+    Returns:
+        pd.Series: 1 for holiday releases, 0 otherwise (including unknown months).
+    """
+    return pd.Series(release_months).isin(HOLIDAY_RELEASE_MONTHS).astype(int)
+
+
+def _ethnicity_labels(value, ethnicities):
+    """Sorted tuple of the ethnicity names of an actor (None if unknown), from a list of names or a Freebase id."""
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return tuple(sorted(set(value))) or None
+    if isinstance(value, str):
+        if ethnicities is None:
+            raise ValueError("Raw Freebase ethnicity ids need the `ethnicities` mapping (see processings.resolve_ethnicities).")
+        return tuple(sorted(set(ethnicities.get(value) or []))) or None
+    return None
+
+
+def cast_rows(df_characters, ethnicities=None):
+    """
+    Deduplicated (movie, actor) rows of character metadata, raw (character.metadata.tsv) or preprocessed.
+    Actors are identified by their Freebase id when available, by their name otherwise.
+
+    Args:
+        df_characters (pd.DataFrame): Characters with 'wikipedia_movie_id', 'actor_gender', 'actor_age',
+            'freebase_actor_id' and/or 'actor_name', and optionally 'actor_ethnicity' (or rows returned by cast_rows).
+        ethnicities (dict): Freebase id -> list of ethnicity names, required for raw ethnicity ids.
+
+    Returns:
+        pd.DataFrame: CAST_COLUMNS, the first known value of each column for each (movie, actor),
+        with the ethnicity as a sorted tuple of names.
+    """
+    actor_key = pd.Series(np.nan, index=df_characters.index, dtype=object)
+    # Later columns take precedence (rows already deduplicated by cast_rows have an 'actor_key')
+    for column in ('actor_name', 'freebase_actor_id', 'actor_key'):
+        if column in df_characters:
+            actor_key = df_characters[column].astype(object).where(df_characters[column].notna(), actor_key)
+
+    ethnicity = df_characters['actor_ethnicity'] if 'actor_ethnicity' in df_characters else pd.Series(None, index=df_characters.index, dtype=object)
+
+    cast = pd.DataFrame({
+        'wikipedia_movie_id': pd.to_numeric(df_characters['wikipedia_movie_id']).astype(np.int64),
+        'actor_key': actor_key,
+        'actor_gender': df_characters['actor_gender'].astype(object),
+        # Ages such as 'Unknown' or negative ones (birth after release) are ignored
+        'actor_age': pd.to_numeric(df_characters['actor_age'], errors='coerce').where(lambda age: age >= 0),
+        'actor_ethnicity': pd.Series([_ethnicity_labels(value, ethnicities) for value in ethnicity], index=df_characters.index, dtype=object),
+    }).dropna(subset=['actor_key'])
+
+    return cast.groupby(['wikipedia_movie_id', 'actor_key'], sort=False).first().reset_index()[CAST_COLUMNS]
+
+
+def cast_counts(cast):
+    """
+    CAST_FEATURES of each movie, with a single groupby over its (movie, actor) rows.
+
+    Args:
+        cast (pd.DataFrame): Rows returned by cast_rows.
+
+    Returns:
+        pd.DataFrame: CAST_FEATURES indexed by 'wikipedia_movie_id'.
+    """
+    cast = cast.assign(
+        is_male=(cast['actor_gender'] == 'M').astype(np.int64),
+        is_female=(cast['actor_gender'] == 'F').astype(np.int64),
+    )
+    return cast.groupby('wikipedia_movie_id').agg(
+        num_actors=('actor_key', 'size'),
+        num_male_actors=('is_male', 'sum'),
+        num_female_actors=('is_female', 'sum'),
+        avg_actor_age=('actor_age', 'mean'),
+    )
+
+
+def cast_features(df_characters):
+    """
+    Per-movie cast features, computed with a single groupby over the characters.
+    An actor playing several characters of a movie is counted once.
+
+    Args:
+        df_characters (pd.DataFrame): Characters with 'wikipedia_movie_id', 'actor_name' (and/or 'freebase_actor_id'),
+            'actor_gender' and 'actor_age'.
+
+    Returns:
+        pd.DataFrame: CAST_FEATURES indexed by 'wikipedia_movie_id'.
+    """
+    # The ethnicities are not part of these features
+    return cast_counts(cast_rows(df_characters.drop(columns=['actor_ethnicity'], errors='ignore')))
+
+
+def build_model_features(df_movies, df_characters=None, dropna=True, cast=None):
+    """
+    Add the model features (MODEL_FEATURES) to the movies.
+
+    Args:
+        df_movies (pd.DataFrame): Preprocessed movies with 'wikipedia_movie_id', 'runtime', 'release_year' and 'release_month'.
+        df_characters (pd.DataFrame): Preprocessed characters, not needed if `cast` is given.
+        dropna (bool): Drop the movies with a missing feature.
+        cast (pd.DataFrame): Precomputed cast features indexed by 'wikipedia_movie_id' (e.g. CastFeatureStore.get()),
+            instead of aggregating df_characters.
+
+    Returns:
+        pd.DataFrame: The movies with the feature columns.
+    """
+    if cast is None:
+        if df_characters is None:
+            raise ValueError("Either df_characters or cast must be given.")
+        cast = cast_features(df_characters)
+    df_combined = df_movies.merge(cast, left_on='wikipedia_movie_id', right_index=True, how='left')
+    df_combined['is_holiday_release'] = holiday_release(df_combined['release_month'])
+
+    if dropna:
+        df_combined = df_combined.dropna(subset=MODEL_FEATURES)
+
+    return df_combined
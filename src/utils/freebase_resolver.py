@@ -0,0 +1,186 @@
+import os
+import csv
+import time
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from SPARQLWrapper import SPARQLWrapper, JSON
+
+WIKIDATA_SPARQL_ENDPOINT = "https://query.wikidata.org/bigdata/namespace/wdq/sparql"
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.11 (KHTML, like Gecko) Chrome/23.0.1271.64 Safari/537.11"
+DEFAULT_CACHE_PATH = 'data/cache/freebase_names.sqlite'
+
+
+class FreebaseResolver:
+    """
+    Resolves Freebase ids (e.g. '/m/0dryh9k') to their English Wikidata label.
+
+    - Many ids are resolved with a single SPARQL query (`VALUES` clause), and a bounded number
+      of queries run concurrently.
+    - Every answer is stored in a SQLite cache, including the ids without a label (negative cache),
+      so an id is only ever queried once.
+    - The cache can be pre-seeded from a TSV mapping file (`freebase_id<TAB>name`) and the resolver
+      can run fully offline, in which case unknown ids resolve to None.
+    """
+
+    def __init__(self, cache_path=DEFAULT_CACHE_PATH, endpoint=WIKIDATA_SPARQL_ENDPOINT, batch_size=100,
+                 max_workers=4, offline=False, seed_path=None, negative_ttl=None, timeout=60):
+        """
+        Args:
+            cache_path (str): Path of the SQLite cache, ':memory:' for a non-persistent cache.
+            endpoint (str): URL of the SPARQL endpoint.
+            batch_size (int): Number of ids per query.
+            max_workers (int): Maximum number of concurrent queries.
+            offline (bool): Never query the endpoint, only use the cache.
+            seed_path (str): TSV mapping file loaded into the cache, if any.
+            negative_ttl (float): Seconds after which an id without label is queried again. None to never expire.
+            timeout (int): Timeout of a query, in seconds.
+        """
+        self.endpoint = endpoint
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.offline = offline
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+
+        if cache_path != ':memory:':
+            os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(cache_path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS names (freebase_id TEXT PRIMARY KEY, name TEXT, resolved_at REAL NOT NULL)"
+        )
+        self.connection.commit()
+
+        if seed_path is not None:
+            self.load_seed(seed_path)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def load_seed(self, seed_path):
+        """
+        Load a TSV mapping file (`freebase_id<TAB>name`, empty name for ids without label) into the cache.
+
+        Args:
+            seed_path (str): Path of the mapping file.
+
+        Returns:
+            int: Number of ids loaded.
+        """
+        with open(seed_path, 'r', encoding='utf-8', newline='') as f:
+            rows = [(row[0], row[1] if len(row) > 1 and row[1] else None)
+                    for row in csv.reader(f, delimiter='\t') if row]
+        self._store(rows)
+        return len(rows)
+
+    def export_seed(self, seed_path):
+        """
+        Write the content of the cache as a TSV mapping file, to run offline elsewhere.
+
+        Args:
+            seed_path (str): Path of the mapping file.
+        """
+        with open(seed_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f, delimiter='\t')
+            for freebase_id, name in self.connection.execute("SELECT freebase_id, name FROM names ORDER BY freebase_id"):
+                writer.writerow([freebase_id, name or ''])
+
+    def resolve(self, freebase_ids):
+        """
+        Resolve freebase ids to their names.
+
+        Args:
+            freebase_ids (iterable): Freebase ids, missing values and duplicates are ignored.
+
+        Returns:
+            dict: Freebase id -> name, or None if the id has no label (or could not be resolved).
+        """
+        ids = sorted({freebase_id for freebase_id in freebase_ids if isinstance(freebase_id, str) and freebase_id})
+        names = self._lookup(ids)
+
+        missing = [freebase_id for freebase_id in ids if freebase_id not in names]
+        if missing and not self.offline:
+            names.update(self._query_all(missing))
+
+        return {freebase_id: names.get(freebase_id) for freebase_id in ids}
+
+    def resolve_one(self, freebase_id):
+        """Resolve a single freebase id, see `resolve`."""
+        return self.resolve([freebase_id]).get(freebase_id)
+
+    def _lookup(self, ids):
+        """Return the cached names of the given ids, ignoring expired negative entries."""
+        names = {}
+        now = time.time()
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            query = f"SELECT freebase_id, name, resolved_at FROM names WHERE freebase_id IN ({placeholders})"
+            for freebase_id, name, resolved_at in self.connection.execute(query, chunk):
+                if name is None and self.negative_ttl is not None and now - resolved_at > self.negative_ttl:
+                    continue
+                names[freebase_id] = name
+        return names
+
+    def _store(self, rows):
+        now = time.time()
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO names (freebase_id, name, resolved_at) VALUES (?, ?, ?)",
+            [(freebase_id, name, now) for freebase_id, name in rows]
+        )
+        self.connection.commit()
+
+    def _query_all(self, ids):
+        """Query the endpoint for all the ids, in concurrent batches, and cache the answers."""
+        batches = [ids[start:start + self.batch_size] for start in range(0, len(ids), self.batch_size)]
+        names = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._query_batch, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    found = future.result()
+                except Exception as e:
+                    # Not cached, the batch will be queried again next time
+                    print(f"Error while consulting Freebase IDs {batch[0]}...{batch[-1]}: {e}")
+                    continue
+
+                batch_names = {freebase_id: found.get(freebase_id) for freebase_id in batch}
+                # The SQLite connection is only used from this thread
+                self._store(batch_names.items())
+                names.update(batch_names)
+
+        return names
+
+    def _query_batch(self, batch):
+        """
+        Run one SPARQL query for a batch of ids.
+
+        Returns:
+            dict: Freebase id -> name, for the ids with a label.
+        """
+        sparql = SPARQLWrapper(self.endpoint, agent=USER_AGENT)
+        values = ' '.join(f'"{freebase_id}"' for freebase_id in batch)
+        sparql.setQuery(f"""
+            SELECT ?freebase_id ?itemLabel WHERE {{
+            VALUES ?freebase_id {{ {values} }}
+            ?item wdt:P646 ?freebase_id.
+            SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en". }}
+            }}
+        """)
+        sparql.setReturnFormat(JSON)
+        sparql.setTimeout(self.timeout)
+
+        results = sparql.query().convert()
+        found = {}
+        for binding in results["results"]["bindings"]:
+            # Keep the first label if an id maps to several items, like get_name_from_freebase_id
+            found.setdefault(binding["freebase_id"]["value"], binding["itemLabel"]["value"])
+        return found
@@ -0,0 +1,127 @@
+import re
+from functools import lru_cache
+import pandas as pd
+
+# Rules are (regex, replacement) pairs, applied to the lowercased strings in one of two ways:
+# - genres (sequential=True): rule by rule, in order, each rule rewriting the output of the previous ones,
+#   exactly like the old chain of str.replace calls of create_genre_list (e.g. 'film cinema' -> 'film').
+# - ethnicities: in a single pass, the rules compiled into one alternation regex tried in order at each
+#   position, so the output of a rule is never rewritten by another one. The chains of the old str.replace
+#   calls are spelled out explicitly instead (e.g. 'south africans' -> 'south_african').
+# Patterns must not contain capturing groups, use (?:...) instead.
+
+GENRE_RULES = [
+    (r'romantic', 'romance'),
+    (r'sci-fi', 'science-fiction'),
+    (r'science fiction', 'science-fiction'),
+    (r'comedy-drama', 'comedy drama'),
+    (r'period piece', 'period_piece'),
+    (r'computer animation', 'computer_animation'),
+    (r'glamorized spy', 'glamorized_spy'),
+    (r'time travel', 'time_travel'),
+    (r' of ', '_of_'),
+    (r' and ', '_and_'),
+    (r' cinema', ''),
+    (r' films', ''),
+    (r' film', ''),
+    (r'film ', ''),
+    (r' movies', ''),
+    (r' movie', ''),
+    (r'/', ' '),
+]
+
+ETHNICITY_RULES = [
+    (r'united states', 'united_states'),
+    (r'united kingdom', 'united_kingdom'),
+    (r'puerto ricans?\b', 'puerto_rican'),
+    (r'south africans?\b', 'south_african'),
+    (r'(?:african|afro)-americans?\b', 'african american'),
+    (r'afro-', 'african '),
+    (r'afro', 'african'),
+    (r'jews\b', 'jewish'),
+    (r'peoples?\b', ''),
+    (r'names\b', ''),
+    (r'culture\b', ''),
+    (r' (?:of|the|and|in|to)\b', ''),
+    # Plurals: 'americans' -> 'american'
+    (r'ans\b', 'an'),
+]
+
+
+class Normalizer:
+    """
+    Normalizes strings into lists of tokens with a declarative table of rewriting rules,
+    compiled into one regex. Results are memoized per distinct input string.
+    """
+
+    def __init__(self, rules, cache_size=None, sequential=False):
+        """
+        Args:
+            rules (list): Ordered (regex, replacement) pairs, the first rule matching at a position wins.
+            cache_size (int): Maximum number of memoized strings, None for no limit.
+            sequential (bool): Apply the rules one after the other (each rule rewrites the output of the previous
+                ones), instead of a single pass.
+        """
+        self.rules = list(rules)
+        self.sequential = sequential
+        self._sequence = [(re.compile(pattern), replacement) for pattern, replacement in self.rules]
+        self._replacements = {f'rule{i}': replacement for i, (_, replacement) in enumerate(self.rules)}
+        self._regex = re.compile('|'.join(f'(?P<rule{i}>{pattern})' for i, (pattern, _) in enumerate(self.rules)))
+        self.normalize = lru_cache(maxsize=cache_size)(self._normalize)
+
+    def _normalize(self, text):
+        """
+        Args:
+            text (str): The string to normalize.
+
+        Returns:
+            tuple: The normalized tokens.
+        """
+        text = text.lower()
+        if self.sequential:
+            for regex, replacement in self._sequence:
+                text = regex.sub(replacement, text)
+            return tuple(text.split())
+        return tuple(self._regex.sub(self._replace, text).split())
+
+    def _replace(self, match):
+        return self._replacements[match.lastgroup]
+
+    def normalize_series(self, texts):
+        """
+        Normalize a column of strings, once per distinct value.
+
+        Args:
+            texts (pd.Series): Strings, missing values are kept as is.
+
+        Returns:
+            pd.Series: One list of tokens per row.
+        """
+        mapping = {text: list(self.normalize(text)) for text in pd.unique(texts.dropna())}
+        return texts.map(mapping)
+
+    def normalize_lists(self, lists):
+        """
+        Normalize a column of lists of strings (e.g. the genres of each movie) into a column
+        of lists of unique tokens, normalizing each distinct string once.
+
+        Args:
+            lists (pd.Series): Lists of strings, missing values become empty lists.
+
+        Returns:
+            pd.Series: One list of unique tokens per row, in order of first appearance.
+        """
+        exploded = lists.reset_index(drop=True).explode().dropna()
+        mapping = {text: self.normalize(text) for text in pd.unique(exploded)}
+
+        tokens = exploded.map(mapping).explode().dropna().rename('token').rename_axis('row').reset_index()
+        grouped = tokens.drop_duplicates().groupby('row', sort=False)['token'].agg(list)
+
+        normalized = [[] for _ in range(len(lists))]
+        for row, row_tokens in grouped.items():
+            normalized[row] = row_tokens
+        return pd.Series(normalized, index=lists.index, dtype=object)
+
+
+GENRE_NORMALIZER = Normalizer(GENRE_RULES, sequential=True)
+ETHNICITY_NORMALIZER = Normalizer(ETHNICITY_RULES)
@@ -0,0 +1,180 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+FREEBASE_ENTRY_TYPE = pa.struct([('freebase_id', pa.string()), ('name', pa.string())])
+CATEGORY_TYPE = pa.dictionary(pa.int32(), pa.string())
+
+# Typed schemas of the preprocessed tables: Freebase dictionaries are lists of (id, name) structs,
+# lists of names and small sets of values are dictionary-encoded, years and months are integers
+PLOT_SUMMARIES_SCHEMA = pa.schema([
+    ('movie_id', pa.int64()),
+    ('summary', pa.string()),
+    ('summary_length', pa.int32()),
+])
+
+MOVIE_METADATA_SCHEMA = pa.schema([
+    ('wikipedia_movie_id', pa.int64()),
+    ('movie_name', pa.string()),
+    ('box_office_revenue', pa.float64()),
+    ('runtime', pa.float64()),
+    ('languages', pa.list_(FREEBASE_ENTRY_TYPE)),
+    ('countries', pa.list_(FREEBASE_ENTRY_TYPE)),
+    ('genres', pa.list_(CATEGORY_TYPE)),
+    ('release_month', pa.int8()),
+    ('release_year', pa.int16()),
+])
+
+CHARACTER_METADATA_SCHEMA = pa.schema([
+    ('wikipedia_movie_id', pa.int64()),
+    ('box_office_revenue', pa.float64()),
+    ('actor_gender', CATEGORY_TYPE),
+    ('actor_ethnicity', pa.list_(CATEGORY_TYPE)),
+    ('actor_name', pa.string()),
+    ('actor_age', pa.float64()),
+])
+
+# Nullable integers stay integers in pandas instead of becoming floats
+_PANDAS_INTEGER_TYPES = {
+    pa.int8(): pd.Int8Dtype(),
+    pa.int16(): pd.Int16Dtype(),
+    pa.int32(): pd.Int32Dtype(),
+    pa.int64(): pd.Int64Dtype(),
+}
+
+
+def _missing(value):
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+
+def _to_arrow_column(values, field_type):
+    """Arrow array of a pandas column, for the column types of the schemas above."""
+    values = pd.Series(values)
+
+    if pa.types.is_list(field_type) and field_type.value_type == FREEBASE_ENTRY_TYPE:
+        # Dicts {freebase id: name} -> lists of structs
+        entries = [None if _missing(entry) else [{'freebase_id': key, 'name': name} for key, name in entry.items()]
+                   for entry in values]
+        return pa.array(entries, type=field_type)
+
+    if pa.types.is_list(field_type) and pa.types.is_dictionary(field_type.value_type):
+        lists = pa.array([None if _missing(names) else list(names) for names in values], type=pa.list_(pa.string()))
+        return pa.ListArray.from_arrays(lists.offsets, lists.values.dictionary_encode(), mask=lists.is_null())
+
+    if pa.types.is_dictionary(field_type):
+        return pa.array(values.astype(object).where(values.notna(), None), type=pa.string()).dictionary_encode()
+
+    if pa.types.is_integer(field_type):
+        return pa.array(pd.to_numeric(values).astype('Int64'), type=pa.int64(), from_pandas=True).cast(field_type)
+
+    return pa.array(values, type=field_type, from_pandas=True)
+
+
+def to_arrow_table(df, schema):
+    """
+    Converts a preprocessed dataframe (Python dicts and lists in its cells) to a typed Arrow table.
+
+    Args:
+        df (pd.DataFrame): The dataframe, with at least the columns of the schema.
+        schema (pa.Schema): Schema of the table.
+
+    Returns:
+        pa.Table: The typed table.
+    """
+    columns = [_to_arrow_column(df[field.name].reset_index(drop=True), field.type) for field in schema]
+    # Dictionary-encoded columns get the index type of the schema
+    columns = [column if column.type == field.type else column.cast(field.type) for column, field in zip(columns, schema)]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def write_parquet(df, path, schema):
+    """
+    Writes a preprocessed dataframe as a typed Parquet file.
+
+    Args:
+        df (pd.DataFrame): The dataframe.
+        path (str): Path of the Parquet file.
+        schema (pa.Schema): Schema of the table.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.part"
+    pq.write_table(to_arrow_table(df, schema), tmp_path)
+    os.replace(tmp_path, path)
+
+
+class ChunkedParquetWriter:
+    """
+    Parquet counterpart of processings.ChunkedCSVWriter: appends dataframes as row groups of a
+    temporary file, which only replaces the output once the writer is closed without error.
+    """
+    def __init__(self, output_path, schema):
+        self.output_path = output_path
+        self.tmp_path = f"{output_path}.part"
+        self.schema = schema
+        self.n_rows = 0
+        self._writer = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.output_path) or '.', exist_ok=True)
+        self._writer = pq.ParquetWriter(self.tmp_path, self.schema)
+        return self
+
+    def append(self, df):
+        self._writer.write_table(to_arrow_table(df, self.schema))
+        self.n_rows += len(df)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._writer.close()
+        if exc_type is None:
+            os.replace(self.tmp_path, self.output_path)
+        elif os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+        return False
+
+
+def _list_column(column, as_dicts):
+    """Python lists (or dicts for lists of Freebase entries) of a list column, split by its offsets without parsing."""
+    column = column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+    offsets = column.offsets.to_numpy()
+    values = column.values
+    if as_dicts:
+        ids = values.field('freebase_id').to_numpy(zero_copy_only=False)
+        names = values.field('name').to_numpy(zero_copy_only=False)
+        cells = [dict(zip(ids[start:end], names[start:end])) for start, end in zip(offsets[:-1], offsets[1:])]
+    else:
+        if pa.types.is_dictionary(values.type):
+            values = values.dictionary_decode()
+        values = values.to_numpy(zero_copy_only=False)
+        cells = [values[start:end].tolist() for start, end in zip(offsets[:-1], offsets[1:])]
+
+    is_null = column.is_null().to_numpy(zero_copy_only=False)
+    return [np.nan if null else cell for cell, null in zip(cells, is_null)]
+
+
+def read_parquet(path, columns=None, python_objects=True):
+    """
+    Reads a typed Parquet file written by write_parquet or ChunkedParquetWriter in a single columnar read.
+
+    Args:
+        path (str): Path of the Parquet file.
+        columns (list): Columns to read, None for all of them.
+        python_objects (bool): Convert the list columns to Python lists (and the Freebase entries to dicts),
+            as in the dataframes of src.utils.processings. If False, they are kept as Arrow-backed columns,
+            which is the fastest.
+
+    Returns:
+        pd.DataFrame: The dataframe, with nullable integer and categorical columns.
+    """
+    table = pq.read_table(path, columns=columns, memory_map=True)
+    if not python_objects:
+        return table.to_pandas(types_mapper=lambda arrow_type: pd.ArrowDtype(arrow_type) if pa.types.is_list(arrow_type) else _PANDAS_INTEGER_TYPES.get(arrow_type))
+
+    list_columns = [field.name for field in table.schema if pa.types.is_list(field.type)]
+    df = table.drop_columns(list_columns).to_pandas(types_mapper=_PANDAS_INTEGER_TYPES.get)
+    for field in table.schema:
+        if field.name in list_columns:
+            df[field.name] = pd.Series(_list_column(table[field.name], field.type.value_type == FREEBASE_ENTRY_TYPE),
+                                       index=df.index, dtype=object)
+    return df[table.column_names]
@@ -0,0 +1,244 @@
+import os
+import json
+import inspect
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+DEFAULT_STATE_PATH = 'data/preprocessed/.pipeline_state.json'
+
+
+def file_digest(file_path, chunk_size=1 << 20):
+    """SHA-256 of a file, read by chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def code_digest(objects):
+    """
+    SHA-256 of the source code of functions, classes or modules, so that a stage is
+    re-run when the code producing its outputs changes.
+    """
+    digest = hashlib.sha256()
+    for obj in objects:
+        digest.update(inspect.getsource(obj).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class Stage:
+    """
+    A step of a pipeline: a function of fixed keyword arguments, reading `inputs` and writing `outputs` (file paths).
+    """
+
+    def __init__(self, name, func, inputs, outputs, kwargs=None, code=None):
+        """
+        Args:
+            name (str): Name of the stage.
+            func (callable): Module-level function running the stage (it is run in a worker process).
+            inputs (list): Paths of the files read by the stage.
+            outputs (list): Paths of the files written by the stage.
+            kwargs (dict): Keyword arguments of `func`, part of the stage fingerprint.
+            code (list): Functions or modules whose source is part of the stage fingerprint. Defaults to [func].
+        """
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.kwargs = kwargs or {}
+        self.code = list(code) if code is not None else [func]
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, inputs={self.inputs}, outputs={self.outputs})"
+
+
+def _run_stage(func, kwargs):
+    return func(**kwargs)
+
+
+class Pipeline:
+    """
+    Incremental runner of stages. A stage is skipped when its outputs exist and were produced from the same
+    input contents, the same arguments and the same code. Stages that do not depend on each other
+    (no output of one is an input of the other) run concurrently in worker processes.
+
+    The fingerprints are stored in a JSON state file. The file hashes are cached by (size, mtime), so unchanged
+    files are not read again.
+    """
+
+    def __init__(self, stages, state_path=DEFAULT_STATE_PATH, max_workers=None):
+        """
+        Args:
+            stages (list): The stages, in any order.
+            state_path (str): Path of the JSON state file.
+            max_workers (int): Maximum number of stages running at once, None for the number of stages.
+        """
+        names = [stage.name for stage in stages]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicated stage names in {names}.")
+
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_path = state_path
+        self.max_workers = max_workers
+
+        producers = {}
+        for stage in stages:
+            for output in stage.outputs:
+                if output in producers:
+                    raise ValueError(f"{output} is written by both {producers[output]} and {stage.name}.")
+                producers[output] = stage.name
+        # Stage name -> names of the stages producing its inputs
+        self.dependencies = {
+            stage.name: {producers[path] for path in stage.inputs if path in producers} for stage in stages
+        }
+        self._check_acyclic()
+
+    def _check_acyclic(self):
+        visiting, visited = set(), set()
+
+        def visit(name):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"The stages have a dependency cycle through {name}.")
+            visiting.add(name)
+            for dependency in self.dependencies[name]:
+                visit(dependency)
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    def _load_state(self):
+        if not os.path.isfile(self.state_path):
+            return {'files': {}, 'stages': {}}
+        try:
+            with open(self.state_path, 'r') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return {'files': {}, 'stages': {}}
+
+    def _save_state(self, state):
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        tmp_path = f"{self.state_path}.part"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+    @staticmethod
+    def _file_digest(state, file_path):
+        """Hash of a file, None if it does not exist. Reuses the cached hash if the size and mtime did not change."""
+        if not os.path.isfile(file_path):
+            return None
+        stat = os.stat(file_path)
+        cached = state['files'].get(file_path)
+        if cached is not None and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+            return cached['sha256']
+        sha256 = file_digest(file_path)
+        state['files'][file_path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256}
+        return sha256
+
+    def _stage_key(self, state, stage):
+        input_digests = {}
+        for path in stage.inputs:
+            input_digests[path] = self._file_digest(state, path)
+            if input_digests[path] is None:
+                raise ValueError(f"Input {path} of stage {stage.name} does not exist.")
+        fingerprint = {
+            'inputs': input_digests,
+            'kwargs': stage.kwargs,
+            'code': code_digest(stage.code),
+        }
+        return hashlib.sha256(json.dumps(fingerprint, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def _is_up_to_date(self, state, stage, key):
+        record = state['stages'].get(stage.name)
+        if record is None or record['key'] != key:
+            return False
+        return all(self._file_digest(state, path) == record['outputs'].get(path) for path in stage.outputs)
+
+    def _required(self, targets):
+        """The target stages and all the stages they depend on."""
+        required, to_visit = set(), list(targets)
+        while to_visit:
+            name = to_visit.pop()
+            if name not in self.stages:
+                raise ValueError(f"Unknown stage {name}, expected one of {list(self.stages)}.")
+            if name not in required:
+                required.add(name)
+                to_visit.extend(self.dependencies[name])
+        return required
+
+    def status(self):
+        """
+        Returns:
+            dict: Stage name -> True if its outputs are up to date (only checked when its inputs exist).
+        """
+        state = self._load_state()
+        statuses = {}
+        for name, stage in self.stages.items():
+            try:
+                statuses[name] = self._is_up_to_date(state, stage, self._stage_key(state, stage))
+            except ValueError:
+                statuses[name] = False
+        return statuses
+
+    def run(self, targets=None, force=False):
+        """
+        Runs the stages needed to bring the targets up to date.
+
+        Args:
+            targets (list): Names of the stages to bring up to date (with their dependencies), None for all of them.
+            force (list or bool): Names of stages to re-run even if up to date, or True for all the required stages.
+
+        Returns:
+            dict: Stage name -> 'skipped' or 'ran' for each required stage.
+        """
+        required = self._required(targets if targets is not None else list(self.stages))
+        forced = required if force is True else set(force or ())
+
+        state = self._load_state()
+        results = {}
+        pending = set(required)
+        running = {}
+
+        with ProcessPoolExecutor(max_workers=self.max_workers or len(required) or 1) as executor:
+            while pending or running:
+                # Stages whose dependencies are all done (a stage is only checked once its inputs are final)
+                ready = [name for name in sorted(pending) if not (self.dependencies[name] & (pending | set(running.values())))]
+                for name in ready:
+                    pending.discard(name)
+                    stage = self.stages[name]
+                    key = self._stage_key(state, stage)
+                    if name not in forced and self._is_up_to_date(state, stage, key):
+                        print(f"[{name}] up to date, skipped")
+                        results[name] = 'skipped'
+                        continue
+                    print(f"[{name}] running...")
+                    running[executor.submit(_run_stage, stage.func, stage.kwargs)] = name
+                    state['stages'].pop(name, None)
+
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    stage = self.stages[name]
+                    future.result()  # Re-raises the error of the stage (the state of the other stages is kept)
+
+                    missing = [path for path in stage.outputs if not os.path.isfile(path)]
+                    if missing:
+                        raise ValueError(f"Stage {name} did not write {missing}.")
+                    state['stages'][name] = {
+                        'key': self._stage_key(state, stage),
+                        'outputs': {path: self._file_digest(state, path) for path in stage.outputs},
+                    }
+                    self._save_state(state)
+                    results[name] = 'ran'
+                    print(f"[{name}] done")
+
+        self._save_state(state)
+        return results
@@ -1,11 +1,62 @@
+import os
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import src.utils.data_utils as utils
+import src.utils.normalization as normalization
+import src.utils.freebase_resolver as freebase_resolver
+from src.utils.freebase_resolver import FreebaseResolver
+from src.utils.normalization import GENRE_NORMALIZER
+from src.utils.pipeline import Stage, Pipeline
+import src.utils.parquet_io as parquet_io
+from src.utils.parquet_io import (
+    ChunkedParquetWriter, write_parquet, read_parquet,
+    PLOT_SUMMARIES_SCHEMA, MOVIE_METADATA_SCHEMA, CHARACTER_METADATA_SCHEMA
+)
 from collections import Counter
 
+CMU_DATA_INITIAL_PATH = 'data/initial/'
 CMU_DATA_PREPROCESSED_PATH = 'data/preprocessed/'
 
+PLOT_SUMMARIES_CATEGORIES = ['movie_id', 'summary']
+
+MOVIE_METADATA_CATEGORIES = [
+    'wikipedia_movie_id',
+    'freebase_movie_id',
+    'movie_name',
+    'release_date',
+    'box_office_revenue',
+    'runtime',
+    'languages',
+    'countries',
+    'genres'
+]
+
+CHARACTER_METADATA_CATEGORIES = [
+    'wikipedia_movie_id',
+    'freebase_movie_id',
+    'release_date',
+    'character_name',
+    'actor_birth',
+    'actor_gender',
+    'actor_height',
+    'actor_ethnicity',
+    'actor_name',
+    'actor_age',
+    'freebase_character_actor_id',
+    'freebase_character_id',
+    'freebase_actor_id'
+]
+
+DEFAULT_CHUNKSIZE = 10_000
+
+# Typed Parquet schema of each preprocessed table, written next to its CSV
+PREPROCESSED_SCHEMAS = {
+    'plot_summaries': PLOT_SUMMARIES_SCHEMA,
+    'movie.metadata': MOVIE_METADATA_SCHEMA,
+    'character.metadata': CHARACTER_METADATA_SCHEMA,
+}
+
 def process_plot_summaries(df_plots):
     assert df_plots['summary'].isnull().sum() == 0, "Missing values found in 'summary' column"
     assert df_plots['movie_id'].isnull().sum() == 0, "Missing values found in 'movie_id' column"
@@ -15,6 +66,7 @@ def process_plot_summaries(df_plots):
     print(df_plots['summary_length'].describe())
 
     df_plots.to_csv(CMU_DATA_PREPROCESSED_PATH + 'plot_summaries.csv', index=False)
+    write_parquet(df_plots, CMU_DATA_PREPROCESSED_PATH + 'plot_summaries.parquet', PLOT_SUMMARIES_SCHEMA)
 
     # summary lengths distribution
     plt.figure(figsize=(10,6))
@@ -26,60 +78,344 @@ def process_plot_summaries(df_plots):
 
     print(df_plots.sample(5))
 
-def process_movie_metadata(df_movies):
-    df_movies = df_movies.copy()
+def clean_movie_metadata(df_movies):
+    """
+    Cleaning steps of the movie metadata, without any printing or saving.
+    Works on the full dataframe as well as on a chunk of it.
 
+    Args:
+        df_movies (pd.DataFrame): Raw movie metadata.
+
+    Returns:
+        pd.DataFrame: The cleaned movie metadata (a new dataframe).
+    """
     # Removing freebase (deprecated)
-    if 'freebase_movie_id' in df_movies.columns:
-        df_movies.drop(columns=['freebase_movie_id'], inplace=True)
+    df_movies = df_movies.drop(columns=['freebase_movie_id'], errors='ignore')
 
     df_movies = df_movies.dropna(subset=['box_office_revenue'])
 
     assert df_movies['box_office_revenue'].isnull().sum() == 0
 
-    df_movies['languages'] = df_movies['languages'].apply(utils.convert_to_dict)
-    df_movies['countries'] = df_movies['countries'].apply(utils.convert_to_dict)
+    # Each Freebase dictionary column is parsed once, for all the rows at a time
+    df_movies['languages'] = utils.parse_freebase_column(df_movies['languages'])
+    df_movies['countries'] = utils.parse_freebase_column(df_movies['countries'])
 
-    df_movies['release_month'] = df_movies['release_date'].apply(utils.get_month)
-    df_movies['release_year'] = df_movies['release_date'].apply(utils.get_year)
-    df_movies.drop(columns=['release_date'], inplace=True)
+    release_dates = utils.split_dates(df_movies['release_date'])
+    df_movies['release_month'] = release_dates['month']
+    df_movies['release_year'] = release_dates['year']
+    df_movies = df_movies.drop(columns=['release_date'])
 
-    df_movies = df_movies[df_movies['release_year'] >= 1900]
+    df_movies = df_movies[df_movies['release_year'].ge(1900).fillna(False)].copy()
 
-    df_movies['genres'] = df_movies['genres'].apply(utils.convert_to_list)
-    print("Genres :", df_movies['genres'].explode(), "\n")
+    df_movies['genres'] = utils.parse_freebase_column(df_movies['genres'], as_list=True)
 
-    # create_genre_list will convert the string to a list of genres. For a genre like "Action/Adventure", it will return ['Action', 'Adventure']
-    df_movies['genres'] = df_movies['genres'].apply(utils.create_genre_list)
+    # Converts the lists of genres to lists of clean genres. For a genre like "Action/Adventure", it will return ['action', 'adventure']
+    # Each distinct genre name is only normalized once
+    df_movies['genres'] = GENRE_NORMALIZER.normalize_lists(df_movies['genres'])
+
+    return df_movies
+
+def process_movie_metadata(df_movies):
+    df_movies = clean_movie_metadata(df_movies)
+    print("Genres :", df_movies['genres'].explode(), "\n")
 
     df_movies.to_csv(CMU_DATA_PREPROCESSED_PATH + 'movie.metadata.csv', index=False)
+    write_parquet(df_movies, CMU_DATA_PREPROCESSED_PATH + 'movie.metadata.parquet', MOVIE_METADATA_SCHEMA)
 
     print("\n", df_movies.sample(5))
 
     return df_movies
 
-def process_character_metadata(df_characters, df_movies):
-    # Merge the character dataframe with the movie dataframe
-    df_actors_revenues = df_characters.merge(df_movies[['wikipedia_movie_id', 'box_office_revenue']], how='inner')
+def resolve_ethnicities(freebase_ids, ethnicities=None, unresolved=None, verbose=True, resolver=None):
+    """
+    Resolve freebase ethnicity ids to lists of ethnicity names.
 
-    df_actors_revenues = df_actors_revenues[['wikipedia_movie_id', 'box_office_revenue', 'actor_gender', 'actor_ethnicity', 'actor_name', 'actor_age']]
+    Args:
+        freebase_ids (iterable): Freebase ids to resolve.
+        ethnicities (dict): Already resolved ids, updated in place.
+        unresolved (set): Ids known to have no name, updated in place.
+        verbose (bool): Print the resolved names.
+        resolver (FreebaseResolver): Resolver to use. Defaults to one with the persistent cache.
 
-    ethnicities = {}
-    print("Ethnicities:")
-    for ethnicity in df_actors_revenues['actor_ethnicity'].unique():
-        # get_name_from_freebase_id will return the name of the ethnicity
-        freebase_name = utils.get_name_from_freebase_id(ethnicity)
+    Returns:
+        dict: Freebase id -> list of ethnicity names.
+    """
+    ethnicities = {} if ethnicities is None else ethnicities
+    unresolved = set() if unresolved is None else unresolved
+
+    to_resolve = [ethnicity for ethnicity in freebase_ids
+                  if not pd.isna(ethnicity) and ethnicity not in ethnicities and ethnicity not in unresolved]
+    if not to_resolve:
+        return ethnicities
 
+    if resolver is None:
+        with FreebaseResolver() as default_resolver:
+            names = default_resolver.resolve(to_resolve)
+    else:
+        # All the ids are resolved in batched queries, backed by the on-disk cache
+        names = resolver.resolve(to_resolve)
+
+    for ethnicity, freebase_name in names.items():
         if freebase_name:
-            print(freebase_name)
+            if verbose:
+                print(freebase_name)
             # create_ethnicity_list will split if multiple (i.e 'Asian American' -> ['Asian', 'American'])
             ethnicities[ethnicity] = utils.create_ethnicity_list(freebase_name)
+        else:
+            unresolved.add(ethnicity)
+
+    return ethnicities
+
+def clean_character_metadata(df_characters, df_movies, ethnicities):
+    """
+    Cleaning steps of the character metadata, without any printing or saving.
+    Works on the full dataframe as well as on a chunk of it.
+
+    Args:
+        df_characters (pd.DataFrame): Raw character metadata.
+        df_movies (pd.DataFrame): Movies with at least 'wikipedia_movie_id' and 'box_office_revenue'.
+        ethnicities (dict): Freebase id -> list of ethnicity names.
+
+    Returns:
+        pd.DataFrame: The characters of the movies with a known revenue.
+    """
+    # Merge the character dataframe with the movie dataframe
+    df_actors_revenues = df_characters.merge(df_movies[['wikipedia_movie_id', 'box_office_revenue']], how='inner')
+
+    df_actors_revenues = df_actors_revenues[['wikipedia_movie_id', 'box_office_revenue', 'actor_gender', 'actor_ethnicity', 'actor_name', 'actor_age']]
 
     # Map the freebase ids to the actual names
     df_actors_revenues['actor_ethnicity'] = df_actors_revenues['actor_ethnicity'].map(ethnicities)
 
+    return df_actors_revenues
+
+def process_character_metadata(df_characters, df_movies, resolver=None):
+    print("Ethnicities:")
+    ethnicities = resolve_ethnicities(df_characters['actor_ethnicity'].unique(), resolver=resolver)
+
+    df_actors_revenues = clean_character_metadata(df_characters, df_movies, ethnicities)
+
     df_actors_revenues.to_csv(CMU_DATA_PREPROCESSED_PATH + 'character.metadata.csv', index=False)
+    write_parquet(df_actors_revenues, CMU_DATA_PREPROCESSED_PATH + 'character.metadata.parquet', CHARACTER_METADATA_SCHEMA)
 
     print("\n", df_actors_revenues.sample(5))
 
-    return df_actors_revenues
\ No newline at end of file
+    return df_actors_revenues
+
+def read_tsv_chunks(file_path, categories, chunksize=DEFAULT_CHUNKSIZE, **kwargs):
+    """
+    Read a headerless TSV file of the CMU corpus by chunks of rows.
+
+    Args:
+        file_path (str): Path of the TSV file.
+        categories (list): Names of the columns.
+        chunksize (int): Number of rows per chunk.
+
+    Returns:
+        Iterator[pd.DataFrame]: The chunks of the file.
+    """
+    return pd.read_csv(file_path, sep='\t', header=None, names=categories, chunksize=chunksize, **kwargs)
+
+class ChunkedCSVWriter:
+    """
+    Append dataframes to a CSV file. The rows are written to a temporary file,
+    which only replaces the output once the writer is closed without error.
+    """
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.tmp_path = f"{output_path}.part"
+        self.n_rows = 0
+        self._header_written = False
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.output_path) or '.', exist_ok=True)
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+        return self
+
+    def append(self, df):
+        df.to_csv(self.tmp_path, mode='a', header=not self._header_written, index=False)
+        self._header_written = True
+        self.n_rows += len(df)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            os.replace(self.tmp_path, self.output_path)
+        elif os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+        return False
+
+def stream_plot_summaries(data_dir, chunksize=DEFAULT_CHUNKSIZE, output_dir=CMU_DATA_PREPROCESSED_PATH):
+    """
+    Streaming version of process_plot_summaries: reads plot_summaries.txt by chunks and appends
+    them to the preprocessed CSV and Parquet files, so that memory stays bounded by the chunk size.
+
+    Args:
+        data_dir (str): Directory containing the 'plain' folder.
+        chunksize (int): Number of rows per chunk.
+        output_dir (str): Directory of the preprocessed files.
+
+    Returns:
+        pd.Series: Summary statistics of the summary lengths.
+    """
+    n_summaries, total_length = 0, 0
+    min_length, max_length = float('inf'), 0
+
+    with ChunkedCSVWriter(os.path.join(output_dir, 'plot_summaries.csv')) as writer, \
+            ChunkedParquetWriter(os.path.join(output_dir, 'plot_summaries.parquet'), PLOT_SUMMARIES_SCHEMA) as parquet_writer:
+        for df_plots in read_tsv_chunks(os.path.join(data_dir, 'plain', 'plot_summaries.txt'), PLOT_SUMMARIES_CATEGORIES, chunksize):
+            assert df_plots['summary'].isnull().sum() == 0, "Missing values found in 'summary' column"
+            assert df_plots['movie_id'].isnull().sum() == 0, "Missing values found in 'movie_id' column"
+
+            df_plots['summary_length'] = df_plots['summary'].str.len()
+            writer.append(df_plots)
+            parquet_writer.append(df_plots)
+
+            n_summaries += len(df_plots)
+            total_length += df_plots['summary_length'].sum()
+            min_length = min(min_length, df_plots['summary_length'].min())
+            max_length = max(max_length, df_plots['summary_length'].max())
+
+    stats = pd.Series({
+        'count': n_summaries,
+        'mean': total_length / n_summaries if n_summaries else float('nan'),
+        'min': min_length if n_summaries else float('nan'),
+        'max': max_length if n_summaries else float('nan'),
+    }, name='summary_length')
+    print(stats)
+    return stats
+
+def stream_movie_metadata(data_dir, chunksize=DEFAULT_CHUNKSIZE, output_dir=CMU_DATA_PREPROCESSED_PATH):
+    """
+    Streaming version of process_movie_metadata: applies clean_movie_metadata to each chunk
+    of movie.metadata.tsv and appends it to the preprocessed CSV and Parquet files.
+
+    Args:
+        data_dir (str): Directory containing the 'plain' folder.
+        chunksize (int): Number of rows per chunk.
+        output_dir (str): Directory of the preprocessed files.
+
+    Returns:
+        int: Number of movies written.
+    """
+    with ChunkedCSVWriter(os.path.join(output_dir, 'movie.metadata.csv')) as writer, \
+            ChunkedParquetWriter(os.path.join(output_dir, 'movie.metadata.parquet'), MOVIE_METADATA_SCHEMA) as parquet_writer:
+        for df_movies in read_tsv_chunks(os.path.join(data_dir, 'plain', 'movie.metadata.tsv'), MOVIE_METADATA_CATEGORIES, chunksize):
+            df_movies = clean_movie_metadata(df_movies)
+            writer.append(df_movies)
+            parquet_writer.append(df_movies)
+
+    print(f"{writer.n_rows} movies written to {writer.output_path}")
+    return writer.n_rows
+
+def stream_character_metadata(data_dir, chunksize=DEFAULT_CHUNKSIZE, output_dir=CMU_DATA_PREPROCESSED_PATH, resolver=None,
+                              offline=False, seed_path=None):
+    """
+    Streaming version of process_character_metadata: joins each chunk of character.metadata.tsv
+    with the revenues of the preprocessed movies and appends it to the preprocessed CSV and Parquet files.
+    Only the movie ids and revenues are kept in memory, along with the resolved ethnicities.
+
+    Args:
+        data_dir (str): Directory containing the 'plain' folder.
+        chunksize (int): Number of rows per chunk.
+        output_dir (str): Directory of the preprocessed files, must contain movie.metadata.csv.
+        resolver (FreebaseResolver): Resolver of the ethnicity ids. Defaults to one with the persistent cache,
+            built with `offline` and `seed_path`.
+        offline (bool): The default resolver never queries the endpoint, only uses its cache.
+        seed_path (str): TSV mapping file loaded into the cache of the default resolver, if any.
+
+    Returns:
+        int: Number of characters written.
+    """
+    movies_path = os.path.join(output_dir, 'movie.metadata.csv')
+    if not os.path.isfile(movies_path):
+        raise ValueError(f"{movies_path} does not exist, run stream_movie_metadata first.")
+    df_movies = pd.read_csv(movies_path, usecols=['wikipedia_movie_id', 'box_office_revenue'])
+
+    own_resolver = resolver is None
+    resolver = FreebaseResolver(offline=offline, seed_path=seed_path) if own_resolver else resolver
+
+    ethnicities, unresolved = {}, set()
+    try:
+        with ChunkedCSVWriter(os.path.join(output_dir, 'character.metadata.csv')) as writer, \
+                ChunkedParquetWriter(os.path.join(output_dir, 'character.metadata.parquet'), CHARACTER_METADATA_SCHEMA) as parquet_writer:
+            for df_characters in read_tsv_chunks(os.path.join(data_dir, 'plain', 'character.metadata.tsv'), CHARACTER_METADATA_CATEGORIES, chunksize):
+                resolve_ethnicities(df_characters['actor_ethnicity'].unique(), ethnicities, unresolved, verbose=False, resolver=resolver)
+                df_actors_revenues = clean_character_metadata(df_characters, df_movies, ethnicities)
+                writer.append(df_actors_revenues)
+                parquet_writer.append(df_actors_revenues)
+    finally:
+        if own_resolver:
+            resolver.close()
+
+    print(f"{writer.n_rows} characters written to {writer.output_path}")
+    return writer.n_rows
+
+def preprocessing_pipeline(data_dir=CMU_DATA_INITIAL_PATH, output_dir=CMU_DATA_PREPROCESSED_PATH, chunksize=DEFAULT_CHUNKSIZE,
+                           state_path=None, max_workers=None, offline=False, seed_path=None):
+    """
+    The preprocessing of the CMU corpus as an incremental pipeline (see src.utils.pipeline.Pipeline):
+    plot summaries and movie metadata run concurrently, the character metadata runs once the movie metadata is written,
+    and each stage is skipped while its input files, its arguments and its code are unchanged.
+
+    Usage: preprocessing_pipeline().run() or preprocessing_pipeline().run(['character_metadata']).
+
+    Args:
+        data_dir (str): Directory containing the 'plain' folder.
+        output_dir (str): Directory of the preprocessed files.
+        chunksize (int): Number of rows per chunk.
+        state_path (str): Path of the pipeline state. Defaults to '<output_dir>/.pipeline_state.json'.
+        max_workers (int): Maximum number of stages running at once.
+        offline (bool): Resolve the ethnicity ids from the resolver cache only, without querying the endpoint.
+        seed_path (str): TSV mapping file of ethnicity ids loaded into the resolver cache (an input of the
+            'character_metadata' stage), if any.
+
+    Returns:
+        Pipeline: The pipeline, with the stages 'plot_summaries', 'movie_metadata' and 'character_metadata'.
+    """
+    plain_dir = os.path.join(data_dir, 'plain')
+    movies_output = os.path.join(output_dir, 'movie.metadata.csv')
+    chunked_io = [read_tsv_chunks, ChunkedCSVWriter, parquet_io]
+
+    stages = [
+        Stage('plot_summaries', stream_plot_summaries,
+              inputs=[os.path.join(plain_dir, 'plot_summaries.txt')],
+              outputs=[os.path.join(output_dir, 'plot_summaries.csv'), os.path.join(output_dir, 'plot_summaries.parquet')],
+              kwargs={'data_dir': data_dir, 'chunksize': chunksize, 'output_dir': output_dir},
+              code=[stream_plot_summaries] + chunked_io),
+        Stage('movie_metadata', stream_movie_metadata,
+              inputs=[os.path.join(plain_dir, 'movie.metadata.tsv')],
+              outputs=[movies_output, os.path.join(output_dir, 'movie.metadata.parquet')],
+              kwargs={'data_dir': data_dir, 'chunksize': chunksize, 'output_dir': output_dir},
+              code=[stream_movie_metadata, clean_movie_metadata, utils, normalization] + chunked_io),
+        Stage('character_metadata', stream_character_metadata,
+              inputs=[os.path.join(plain_dir, 'character.metadata.tsv'), movies_output] + ([seed_path] if seed_path else []),
+              outputs=[os.path.join(output_dir, 'character.metadata.csv'), os.path.join(output_dir, 'character.metadata.parquet')],
+              kwargs={'data_dir': data_dir, 'chunksize': chunksize, 'output_dir': output_dir,
+                      'offline': offline, 'seed_path': seed_path},
+              code=[stream_character_metadata, clean_character_metadata, resolve_ethnicities, utils, normalization,
+                    freebase_resolver] + chunked_io),
+    ]
+    return Pipeline(stages, state_path=state_path or os.path.join(output_dir, '.pipeline_state.json'), max_workers=max_workers)
+
+def read_preprocessed(name, output_dir=CMU_DATA_PREPROCESSED_PATH, columns=None, python_objects=True):
+    """
+    Loads a preprocessed table from its typed Parquet file: a single columnar read, with integer years and months,
+    categorical genres and ethnicities, and the Freebase dictionaries already parsed.
+
+    Args:
+        name (str): 'plot_summaries', 'movie.metadata' or 'character.metadata'.
+        output_dir (str): Directory of the preprocessed files.
+        columns (list): Columns to read, None for all of them.
+        python_objects (bool): Lists and dicts in the cells, as returned by the process_* functions,
+            or Arrow-backed list columns if False (fastest).
+
+    Returns:
+        pd.DataFrame: The preprocessed table.
+    """
+    if name not in PREPROCESSED_SCHEMAS:
+        raise ValueError(f"Unknown preprocessed table {name}, expected one of {list(PREPROCESSED_SCHEMAS)}.")
+    file_path = os.path.join(output_dir, f"{name}.parquet")
+    if not os.path.isfile(file_path):
+        raise ValueError(f"{file_path} does not exist, run the preprocessing first.")
+    return read_parquet(file_path, columns=columns, python_objects=python_objects)
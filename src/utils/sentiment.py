@@ -0,0 +1,152 @@
+import os
+import hashlib
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from textblob import TextBlob
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+DEFAULT_CACHE_PATH = 'data/cache/sentiment.sqlite'
+
+VADER_COLUMNS = ['compound', 'pos', 'neg', 'neu']
+TEXTBLOB_COLUMNS = ['polarity', 'subjectivity']
+SENTIMENT_COLUMNS = VADER_COLUMNS + TEXTBLOB_COLUMNS
+
+# One analyzer per process, created by _init_worker (or lazily in the main process)
+_analyzer = None
+
+
+def _init_worker():
+    global _analyzer
+    _analyzer = SentimentIntensityAnalyzer()
+
+
+def score_text(text):
+    """
+    VADER and TextBlob sentiment scores of a text.
+
+    Args:
+        text (str): The text to score.
+
+    Returns:
+        tuple: The scores, in the order of SENTIMENT_COLUMNS.
+    """
+    if _analyzer is None:
+        _init_worker()
+    vader = _analyzer.polarity_scores(text)
+    blob = TextBlob(text).sentiment
+    return tuple(vader[column] for column in VADER_COLUMNS) + (blob.polarity, blob.subjectivity)
+
+
+def _score_texts(texts):
+    return [score_text(text) for text in texts]
+
+
+def text_hash(text):
+    """Hash of a text, to detect summaries that changed since they were scored."""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class SentimentCache:
+    """
+    SQLite store of sentiment scores keyed by (movie_id, text hash), so that only new or changed
+    summaries are ever scored.
+    """
+
+    def __init__(self, cache_path=DEFAULT_CACHE_PATH):
+        if cache_path != ':memory:':
+            os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(cache_path)
+        columns = ', '.join(f'{column} REAL NOT NULL' for column in SENTIMENT_COLUMNS)
+        self.connection.execute(
+            f"CREATE TABLE IF NOT EXISTS sentiment (movie_id INTEGER NOT NULL, text_hash TEXT NOT NULL, {columns}, "
+            "PRIMARY KEY (movie_id, text_hash))"
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def load(self):
+        """
+        Returns:
+            pd.DataFrame: All the cached scores, with 'movie_id' and 'text_hash' columns.
+        """
+        df_scores = pd.read_sql_query(f"SELECT movie_id, text_hash, {', '.join(SENTIMENT_COLUMNS)} FROM sentiment", self.connection)
+        return df_scores.astype({'movie_id': np.int64, **{column: float for column in SENTIMENT_COLUMNS}})
+
+    def store(self, df_scores):
+        """
+        Args:
+            df_scores (pd.DataFrame): Scores with 'movie_id' and 'text_hash' columns.
+        """
+        columns = ['movie_id', 'text_hash'] + SENTIMENT_COLUMNS
+        rows = [(int(movie_id), hash_, *map(float, values))
+                for movie_id, hash_, *values in df_scores[columns].itertuples(index=False, name=None)]
+        self.connection.executemany(
+            f"INSERT OR REPLACE INTO sentiment ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows
+        )
+        self.connection.commit()
+
+
+def score_sentiments(df_plots, id_column='movie_id', text_column='summary', cache_path=DEFAULT_CACHE_PATH,
+                     n_jobs=None, chunksize=256):
+    """
+    Sentiment scores of plot summaries as flat float columns. Summaries already scored (same movie id and
+    same text) are read from the cache, the others are scored in a process pool and added to the cache.
+
+    Args:
+        df_plots (pd.DataFrame): Plot summaries.
+        id_column (str): Column of the movie ids.
+        text_column (str): Column of the summaries.
+        cache_path (str): Path of the SQLite cache, None to disable the cache.
+        n_jobs (int): Number of processes, None for all cores.
+        chunksize (int): Number of summaries per task.
+
+    Returns:
+        pd.DataFrame: SENTIMENT_COLUMNS with the index of `df_plots`.
+    """
+    keys = pd.DataFrame({
+        'movie_id': df_plots[id_column].to_numpy(dtype=np.int64),
+        'text_hash': [text_hash(text) for text in df_plots[text_column]],
+    })
+
+    cache = SentimentCache(cache_path if cache_path is not None else ':memory:')
+    try:
+        scores = keys.merge(cache.load(), on=['movie_id', 'text_hash'], how='left')
+
+        missing = scores[SENTIMENT_COLUMNS[0]].isna().to_numpy()
+        if missing.any():
+            to_score = keys[missing].drop_duplicates()
+            texts = df_plots[text_column].to_numpy(dtype=object)[to_score.index]
+            print(f"Scoring {len(texts)} summaries ({(~missing).sum()} cached)...")
+
+            new_scores = to_score.reset_index(drop=True)
+            new_scores[SENTIMENT_COLUMNS] = np.array(_score_all(texts, n_jobs, chunksize), dtype=float).reshape(-1, len(SENTIMENT_COLUMNS))
+            cache.store(new_scores)
+
+            filled = keys[missing].merge(new_scores, on=['movie_id', 'text_hash'], how='left')
+            scores.loc[missing, SENTIMENT_COLUMNS] = filled[SENTIMENT_COLUMNS].to_numpy()
+    finally:
+        cache.close()
+
+    return scores[SENTIMENT_COLUMNS].astype(float).set_axis(df_plots.index, axis=0)
+
+
+def _score_all(texts, n_jobs, chunksize):
+    n_jobs = n_jobs or os.cpu_count() or 1
+    chunks = [texts[start:start + chunksize] for start in range(0, len(texts), chunksize)]
+
+    if n_jobs == 1 or len(chunks) <= 1:
+        return [scores for chunk in chunks for scores in _score_texts(chunk)]
+
+    with ProcessPoolExecutor(max_workers=min(n_jobs, len(chunks)), initializer=_init_worker) as executor:
+        return [scores for chunk_scores in executor.map(_score_texts, chunks) for scores in chunk_scores]
@@ -0,0 +1,359 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
+from src.utils.data_utils import MultiHotEncoder
+
+DEFAULT_INDEX_PATH = 'data/cache/movie_index.npz'
+
+NUMERIC_COLUMNS = ['runtime', 'release_year']
+SEARCH_METHODS = ['exact', 'ivf']
+
+# Standardized runtimes and years are clipped, so that a few outliers (e.g. 1000 minutes runtimes) do not dominate
+NUMERIC_CLIP = 3.0
+
+
+def _unit_rows(matrix):
+    """L2-normalized rows of a dense array (rows of zeros stay zeros)."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+class MovieVectorizer:
+    """
+    Dense per-movie vectors for the similarity index, made of weighted blocks:
+
+    - the plot representation (dense embeddings, or sparse TF-IDF reduced by a truncated SVD),
+    - the multi-hot genres and languages (MultiHotEncoder),
+    - the standardized runtime and release year.
+
+    The plot, genre and language blocks are L2-normalized, so the squared euclidean distance between two movies is
+    the weighted sum of 2 - 2 * cosine similarity of these blocks and of the squared differences of the numeric features.
+    Missing values give empty blocks (zeros).
+    """
+
+    def __init__(self, plot_weight=1.0, genre_weight=1.0, language_weight=0.5, numeric_weight=0.5,
+                 plot_components=128, min_count=5, random_state=42):
+        """
+        Args:
+            plot_weight (float): Weight of the plot block.
+            genre_weight (float): Weight of the genre block.
+            language_weight (float): Weight of the language block.
+            numeric_weight (float): Weight of the runtime and release year.
+            plot_components (int): Dimension of the reduced sparse plot features.
+            min_count (int): Minimum number of movies of a genre or language to be encoded.
+            random_state (int): Seed of the truncated SVD.
+        """
+        self.plot_weight = plot_weight
+        self.genre_weight = genre_weight
+        self.language_weight = language_weight
+        self.numeric_weight = numeric_weight
+        self.plot_components = plot_components
+        self.min_count = min_count
+        self.random_state = random_state
+        self.genre_encoder = None
+        self.language_encoder = None
+        self.svd = None
+        self.has_plot = False
+
+    @staticmethod
+    def _numeric(df_movies):
+        return np.column_stack([pd.to_numeric(df_movies[column], errors='coerce').to_numpy(dtype=float)
+                                for column in NUMERIC_COLUMNS])
+
+    def fit(self, df_movies, plot=None):
+        """
+        Fits the encoders, the numeric standardization and the plot reduction.
+
+        Args:
+            df_movies (pd.DataFrame): Preprocessed movies, with 'genres', 'languages', 'runtime' and 'release_year'.
+            plot (np.ndarray or scipy.sparse matrix): Plot features aligned with the rows of df_movies
+                (e.g. EmbeddingStore.get or align_rows of the TF-IDF features), None to ignore the plots.
+
+        Returns:
+            MovieVectorizer: The vectorizer.
+        """
+        self.genre_encoder = MultiHotEncoder(min_count=self.min_count).fit(df_movies['genres'])
+        self.language_encoder = MultiHotEncoder(min_count=self.min_count).fit(df_movies['languages'])
+
+        numeric = self._numeric(df_movies)
+        self.numeric_center = np.nan_to_num(np.nanmedian(numeric, axis=0))
+        scale = np.nan_to_num(np.nanstd(numeric, axis=0))
+        self.numeric_scale = np.where(scale > 0, scale, 1.0)
+
+        self.has_plot = plot is not None
+        self.svd = None
+        if sparse.issparse(plot) and plot.shape[1] > self.plot_components:
+            self.svd = TruncatedSVD(n_components=self.plot_components, random_state=self.random_state).fit(plot)
+        return self
+
+    def transform(self, df_movies, plot=None):
+        """
+        Args:
+            df_movies (pd.DataFrame): Movies with the columns used by fit.
+            plot (np.ndarray or scipy.sparse matrix): Plot features aligned with the rows of df_movies,
+                required if the vectorizer was fitted with plots (NaN rows, e.g. movies without a summary, are ignored).
+
+        Returns:
+            np.ndarray: Shape (len(df_movies), dim), float32.
+        """
+        if self.genre_encoder is None:
+            raise ValueError("Call fit before transform.")
+        if self.has_plot and plot is None:
+            raise ValueError("The vectorizer was fitted with plot features, they are required.")
+
+        blocks = [
+            np.sqrt(self.genre_weight) * _unit_rows(self.genre_encoder.transform(df_movies['genres']).toarray()),
+            np.sqrt(self.language_weight) * _unit_rows(self.language_encoder.transform(df_movies['languages']).toarray()),
+        ]
+        if self.has_plot:
+            if self.svd is not None:
+                plot = self.svd.transform(plot)
+            elif sparse.issparse(plot):
+                plot = plot.toarray()
+            blocks.append(np.sqrt(self.plot_weight) * _unit_rows(np.nan_to_num(np.asarray(plot, dtype=float))))
+
+        numeric = (self._numeric(df_movies) - self.numeric_center) / self.numeric_scale
+        blocks.append(np.sqrt(self.numeric_weight) * np.clip(np.nan_to_num(numeric), -NUMERIC_CLIP, NUMERIC_CLIP))
+
+        return np.hstack(blocks).astype(np.float32)
+
+    def fit_transform(self, df_movies, plot=None):
+        return self.fit(df_movies, plot).transform(df_movies, plot)
+
+
+def _merge_top_k(best_distances, best_positions, distances, positions, k):
+    """The k smallest distances (unsorted) of each row among the current best ones and new candidates."""
+    distances = np.concatenate([best_distances, distances], axis=1)
+    positions = np.concatenate([best_positions, positions], axis=1)
+    if distances.shape[1] > k:
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        distances = np.take_along_axis(distances, top, axis=1)
+        positions = np.take_along_axis(positions, top, axis=1)
+    return distances, positions
+
+
+class NeighborIndex:
+    """
+    Nearest-neighbour index of vectors (squared euclidean distance), keyed by ids (e.g. 'wikipedia_movie_id').
+
+    - 'exact': brute force over blocks of the corpus, one matrix product per (query batch, block).
+    - 'ivf': inverted file, the vectors are partitioned by k-means and a query only scans the `n_probe` lists
+      of its closest centroids (approximate, for large corpora).
+    """
+
+    def __init__(self, method='exact', n_lists=None, n_probe=8, block_size=8192, random_state=42):
+        """
+        Args:
+            method (str): One of SEARCH_METHODS.
+            n_lists (int): Number of inverted lists of 'ivf', None for about sqrt(number of vectors).
+            n_probe (int): Number of lists scanned per query by 'ivf' (more is slower and more accurate).
+            block_size (int): Number of corpus vectors compared at once by 'exact'.
+            random_state (int): Seed of the k-means of 'ivf'.
+        """
+        if method not in SEARCH_METHODS:
+            raise ValueError(f"Unknown method {method}, expected one of {SEARCH_METHODS}.")
+        self.method = method
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.block_size = block_size
+        self.random_state = random_state
+        self.vectors = None
+        self.ids = None
+        self.centroids = None
+        self.offsets = None
+
+    def __len__(self):
+        return 0 if self.ids is None else len(self.ids)
+
+    def build(self, vectors, ids=None):
+        """
+        Indexes vectors, replacing the current ones.
+
+        Args:
+            vectors (np.ndarray): Shape (n, dim).
+            ids (array-like): Id of each vector, None for their positions.
+
+        Returns:
+            NeighborIndex: The index.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        ids = np.arange(len(vectors)) if ids is None else np.asarray(ids)
+        if vectors.ndim != 2 or len(ids) != len(vectors):
+            raise ValueError(f"Expected vectors of shape (len(ids), dim), got {vectors.shape} for {len(ids)} ids.")
+
+        if self.method == 'ivf' and len(vectors) > 0:
+            n_lists = min(self.n_lists or max(1, int(np.sqrt(len(vectors)))), len(vectors))
+            kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=self.random_state, n_init=3,
+                                     batch_size=max(1024, 4 * n_lists)).fit(vectors)
+            # Vectors sorted by list: list l is vectors[offsets[l]:offsets[l + 1]]
+            order = np.argsort(kmeans.labels_, kind='stable')
+            vectors, ids = vectors[order], ids[order]
+            self.centroids = kmeans.cluster_centers_.astype(np.float32)
+            self.offsets = np.concatenate([[0], np.cumsum(np.bincount(kmeans.labels_, minlength=n_lists))])
+
+        self.vectors, self.ids = vectors, ids
+        self.norms = np.einsum('ij,ij->i', vectors, vectors)
+        return self
+
+    def _distances(self, queries, query_norms, start, end, exclude_ids):
+        distances = query_norms[:, None] + self.norms[None, start:end] - 2 * (queries @ self.vectors[start:end].T)
+        np.maximum(distances, 0, out=distances)
+        if exclude_ids is not None:
+            distances[exclude_ids[:, None] == self.ids[None, start:end]] = np.inf
+        return distances
+
+    def _top_k(self, distances, start, k):
+        if distances.shape[1] > k:
+            positions = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            return np.take_along_axis(distances, positions, axis=1), positions + start
+        return distances, np.broadcast_to(np.arange(start, start + distances.shape[1]), distances.shape)
+
+    def _search_exact(self, queries, query_norms, k, exclude_ids):
+        best_distances = np.full((len(queries), 0), np.inf, dtype=np.float32)
+        best_positions = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(self), self.block_size):
+            end = min(start + self.block_size, len(self))
+            distances, positions = self._top_k(self._distances(queries, query_norms, start, end, exclude_ids), start, k)
+            best_distances, best_positions = _merge_top_k(best_distances, best_positions, distances, positions, k)
+        return best_distances, best_positions
+
+    def _search_ivf(self, queries, query_norms, k, exclude_ids):
+        n_lists = len(self.centroids)
+        n_probe = min(self.n_probe, n_lists)
+        centroid_distances = query_norms[:, None] - 2 * (queries @ self.centroids.T) + np.einsum('ij,ij->i', self.centroids, self.centroids)
+        probes = np.argpartition(centroid_distances, n_probe - 1, axis=1)[:, :n_probe] if n_probe < n_lists \
+            else np.broadcast_to(np.arange(n_lists), (len(queries), n_lists))
+
+        best_distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        best_positions = np.full((len(queries), k), -1, dtype=np.int64)
+        # One matrix product per list, between its vectors and all the queries probing it
+        for list_id in np.unique(probes):
+            start, end = self.offsets[list_id], self.offsets[list_id + 1]
+            if start == end:
+                continue
+            rows = np.flatnonzero((probes == list_id).any(axis=1))
+            distances, positions = self._top_k(
+                self._distances(queries[rows], query_norms[rows], start, end, None if exclude_ids is None else exclude_ids[rows]),
+                start, k)
+            best_distances[rows], best_positions[rows] = _merge_top_k(best_distances[rows], best_positions[rows],
+                                                                      distances, positions, k)
+        return best_distances, best_positions
+
+    def search(self, queries, k=10, batch_size=1024, exclude_ids=None):
+        """
+        The k nearest neighbours of each query, by batches of queries.
+
+        Args:
+            queries (np.ndarray): Shape (n, dim).
+            k (int): Number of neighbours.
+            batch_size (int): Number of queries searched at once.
+            exclude_ids (array-like): One id per query never returned for it (e.g. the query movie itself), or None.
+
+        Returns:
+            tuple: Ids and squared distances of the neighbours, both of shape (n, k), sorted by increasing distance.
+            Missing neighbours (fewer than k candidates) have the id -1 and an infinite distance.
+        """
+        if self.vectors is None:
+            raise ValueError("Call build before search.")
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if queries.shape[1] != self.vectors.shape[1]:
+            raise ValueError(f"Expected queries of dimension {self.vectors.shape[1]}, got {queries.shape[1]}.")
+        if exclude_ids is not None:
+            exclude_ids = np.asarray(exclude_ids)
+
+        search = self._search_ivf if self.method == 'ivf' and len(self) > 0 else self._search_exact
+        all_distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        all_positions = np.full((len(queries), k), -1, dtype=np.int64)
+        for start in range(0, len(queries), batch_size):
+            batch = queries[start:start + batch_size]
+            distances, positions = search(batch, np.einsum('ij,ij->i', batch, batch), k,
+                                          None if exclude_ids is None else exclude_ids[start:start + batch_size])
+            order = np.argsort(distances, axis=1, kind='stable')
+            width = distances.shape[1]
+            all_distances[start:start + len(batch), :width] = np.take_along_axis(distances, order, axis=1)
+            all_positions[start:start + len(batch), :width] = np.take_along_axis(positions, order, axis=1)
+
+        # Excluded candidates have an infinite distance
+        found = (all_positions >= 0) & np.isfinite(all_distances)
+        ids = np.full(all_positions.shape, -1, dtype=np.int64)
+        ids[found] = self.ids[all_positions[found]]
+        all_distances[~found] = np.inf
+        return ids, all_distances
+
+    def save(self, path=DEFAULT_INDEX_PATH):
+        """
+        Saves the index (parameters, vectors, ids and inverted lists) in a single .npz file.
+
+        Args:
+            path (str): Path of the .npz file.
+        """
+        if self.vectors is None:
+            raise ValueError("Call build before save.")
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        params = {'method': self.method, 'n_lists': self.n_lists, 'n_probe': self.n_probe,
+                  'block_size': self.block_size, 'random_state': self.random_state}
+        arrays = {'vectors': self.vectors, 'ids': self.ids, 'params': np.array(json.dumps(params))}
+        if self.centroids is not None:
+            arrays.update(centroids=self.centroids, offsets=self.offsets)
+        tmp_path = f"{path}.part.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_INDEX_PATH):
+        """
+        Loads an index saved with `save`.
+
+        Args:
+            path (str): Path of the .npz file.
+
+        Returns:
+            NeighborIndex: The index.
+        """
+        with np.load(path) as arrays:
+            index = cls(**json.loads(str(arrays['params'])))
+            index.vectors, index.ids = arrays['vectors'], arrays['ids']
+            if 'centroids' in arrays:
+                index.centroids, index.offsets = arrays['centroids'], arrays['offsets']
+        index.norms = np.einsum('ij,ij->i', index.vectors, index.vectors)
+        return index
+
+
+def comparables(index, queries, df_movies, k=10, query_ids=None, exclude_self=True, batch_size=1024):
+    """
+    The most similar movies of each query, with their box office revenue.
+
+    Args:
+        index (NeighborIndex): Index of movie vectors keyed by 'wikipedia_movie_id'.
+        queries (np.ndarray): Vectors of the queried movies (MovieVectorizer.transform).
+        df_movies (pd.DataFrame): Movies with 'wikipedia_movie_id', 'movie_name' and 'box_office_revenue'.
+        k (int): Number of similar movies per query.
+        query_ids (array-like): Movie id of each query, or None for queries that are not indexed movies
+            ('query_id' is then the position of the query, and no movie is excluded).
+        exclude_self (bool): Never return a queried movie as its own comparable (only applies with query_ids).
+        batch_size (int): Number of queries searched at once.
+
+    Returns:
+        pd.DataFrame: 'query_id', 'rank', 'wikipedia_movie_id', 'movie_name', 'distance' and 'box_office_revenue',
+        one row per (query, similar movie).
+    """
+    # Positions are not movie ids, excluding them would drop the movies whose id happens to match a position
+    exclude_ids = np.asarray(query_ids) if exclude_self and query_ids is not None else None
+    query_ids = np.arange(len(np.atleast_2d(queries))) if query_ids is None else np.asarray(query_ids)
+    ids, distances = index.search(queries, k=k, batch_size=batch_size, exclude_ids=exclude_ids)
+
+    found = ids >= 0
+    movies = df_movies.drop_duplicates(subset=['wikipedia_movie_id']).set_index('wikipedia_movie_id')
+    neighbors = movies.reindex(ids[found])
+    return pd.DataFrame({
+        'query_id': np.repeat(query_ids, found.sum(axis=1)),
+        'rank': np.nonzero(found)[1] + 1,
+        'wikipedia_movie_id': ids[found],
+        'movie_name': neighbors['movie_name'].to_numpy(),
+        'distance': distances[found],
+        'box_office_revenue': neighbors['box_office_revenue'].to_numpy(),
+    })
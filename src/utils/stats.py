@@ -0,0 +1,164 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from src.utils.data_utils import MultiHotEncoder
+
+STATISTICS = {'mean': np.mean, 'median': np.median}
+METHODS = ('poisson', 'index')
+
+
+def _is_label_list(cell):
+    return isinstance(cell, (list, tuple, set, dict, np.ndarray))
+
+
+def group_matrix(keys):
+    """
+    Sparse indicator matrix (groups x rows) of a group key column. Columns of lists (genres, ethnicities)
+    or Freebase dicts (languages) put a row in each of its groups, without exploding the dataframe.
+
+    Args:
+        keys (pd.Series): Group key of each row, or list of group keys.
+
+    Returns:
+        tuple: The CSR matrix and the group labels (one per matrix row). Groups without rows are dropped.
+    """
+    keys = pd.Series(keys).reset_index(drop=True)
+    if keys.map(_is_label_list).any():
+        encoder = MultiHotEncoder(dtype=np.float64)
+        return encoder.fit_transform(keys).T.tocsr(), encoder.feature_names
+
+    # Categorical keys keep the order of their categories, other keys are sorted as in groupby
+    categorical = keys.astype('category') if not isinstance(keys.dtype, pd.CategoricalDtype) else keys
+    codes = categorical.cat.codes.to_numpy()
+    known = codes >= 0
+    matrix = sparse.csr_matrix(
+        (np.ones(known.sum()), (codes[known], np.flatnonzero(known))),
+        shape=(len(categorical.cat.categories), len(keys))
+    )
+    observed = np.asarray(matrix.sum(axis=1)).ravel() > 0
+    return matrix[observed], list(categorical.cat.categories[observed])
+
+
+def _poisson_batch(matrices, values, n_resamples, seed):
+    """
+    Bootstrap means of all the groups of all the keys at once: each row gets a Poisson(1) weight per resample,
+    shared by all the group keys.
+    """
+    rng = np.random.default_rng(seed)
+    weights = rng.poisson(1.0, size=(len(values), n_resamples)).astype(np.float64)
+    weighted_values = weights * values[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Empty resamples of a group (all its weights are 0) give NaN, ignored by the quantiles
+        return [(matrix @ weighted_values) / (matrix @ weights) for matrix in matrices]
+
+
+def _index_batch(matrices, values, n_resamples, seed, statistic):
+    """
+    Bootstrap statistics of all the groups of each key at once: one uniform draw per (resample, group entry),
+    scaled by the size of its group (through `indptr`) into an index of a row of that group.
+    """
+    rng = np.random.default_rng(seed)
+    batches = []
+    for matrix in matrices:
+        sizes = np.diff(matrix.indptr)
+        starts = matrix.indptr[:-1]
+        group_of_entry = np.repeat(np.arange(matrix.shape[0]), sizes)
+        entry_sizes, entry_starts = sizes[group_of_entry], starts[group_of_entry]
+        # Resampled entry j of group g is the entry indptr[g] + floor(u * size(g)) of the same group
+        entries = (rng.random((n_resamples, matrix.nnz)) * entry_sizes).astype(np.int64)
+        np.minimum(entries, entry_sizes - 1, out=entries)
+        entries += entry_starts
+
+        entry_values = values[matrix.indices]
+        if statistic == 'mean':
+            results = np.add.reduceat(entry_values[entries], starts, axis=1) / sizes
+        else:
+            # With the entries of each group sorted by value, sorting the drawn entries sorts the resampled values
+            # of each group: the median is the middle (or the mean of the two middle) values
+            entry_values = entry_values[np.lexsort((entry_values, group_of_entry))]
+            entries.sort(axis=1)
+            resampled = entry_values[entries]
+            results = (resampled[:, starts + (sizes - 1) // 2] + resampled[:, starts + sizes // 2]) / 2
+        batches.append(results.T)
+    return batches
+
+
+def _run_batch(args):
+    method, matrices, values, n_resamples, seed, statistic = args
+    if method == 'poisson':
+        return _poisson_batch(matrices, values, n_resamples, seed)
+    return _index_batch(matrices, values, n_resamples, seed, statistic)
+
+
+def bootstrap_ci(df, by, value='box_office_revenue', statistic='mean', n_resamples=1000, confidence=0.95,
+                 method='poisson', seed=42, n_jobs=1, batch_size=64):
+    """
+    Percentile bootstrap confidence intervals of a statistic of `value` for every group of one or several
+    group keys (e.g. 'release_season', 'genres', 'runtime_category', 'actor_age_group', 'predominant_gender'),
+    all the groups being resampled at once instead of one loop per group.
+
+    The resamples are drawn by batches, each with its own seed spawned from `seed`, so the result does not
+    depend on `n_jobs`.
+
+    Args:
+        df (pd.DataFrame): The data.
+        by (str or list): Group key column(s). Columns of lists (genres, ethnicities) or dicts (languages)
+            count each row in all of its groups.
+        value (str): Numeric column of the statistic, missing values are ignored.
+        statistic (str): 'mean' or 'median'.
+        n_resamples (int): Number of bootstrap resamples.
+        confidence (float): Confidence level of the intervals.
+        method (str): 'poisson' (Poisson bootstrap weights, all the groups in one sparse product, mean only)
+            or 'index' (classical resampling, one index matrix covering all the groups of a key).
+        seed (int): Seed of the resampling.
+        n_jobs (int): Number of processes, None for all cores.
+        batch_size (int): Number of resamples drawn at once, bounds the memory (rows x batch_size weights).
+
+    Returns:
+        pd.DataFrame: One row per (variable, group) with 'n', 'estimate', 'std_error', 'ci_low' and 'ci_high'.
+    """
+    if statistic not in STATISTICS:
+        raise ValueError(f"Unknown statistic {statistic}, expected one of {list(STATISTICS)}.")
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method}, expected one of {METHODS}.")
+    if method == 'poisson' and statistic != 'mean':
+        raise ValueError("The Poisson bootstrap only supports the mean, use method='index'.")
+
+    by = [by] if isinstance(by, str) else list(by)
+    df = df[pd.to_numeric(df[value], errors='coerce').notna()]
+    values = pd.to_numeric(df[value]).to_numpy(dtype=np.float64)
+
+    n_batches = -(-n_resamples // batch_size)
+    seeds = np.random.SeedSequence(seed).spawn(n_batches)
+    sizes = [min(batch_size, n_resamples - batch * batch_size) for batch in range(n_batches)]
+    n_jobs = n_jobs or os.cpu_count() or 1
+    alpha = (1 - confidence) / 2
+
+    matrices, labels = zip(*(group_matrix(df[key]) for key in by))
+    tasks = [(method, matrices, values, size, batch_seed, statistic) for size, batch_seed in zip(sizes, seeds)]
+    if n_jobs == 1 or len(tasks) <= 1:
+        batches = [_run_batch(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(tasks))) as executor:
+            batches = list(executor.map(_run_batch, tasks))
+
+    frames = []
+    for position, (key, matrix) in enumerate(zip(by, matrices)):
+        resamples = np.hstack([batch[position] for batch in batches])
+        counts = np.diff(matrix.indptr)
+        estimates = np.array([STATISTICS[statistic](values[matrix.indices[start:end]])
+                              for start, end in zip(matrix.indptr[:-1], matrix.indptr[1:])])
+        ci_low, ci_high = np.nanquantile(resamples, [alpha, 1 - alpha], axis=1)
+        frames.append(pd.DataFrame({
+            'variable': key,
+            'group': labels[position],
+            'n': counts,
+            'estimate': estimates,
+            'std_error': np.nanstd(resamples, axis=1, ddof=1),
+            'ci_low': ci_low,
+            'ci_high': ci_high,
+        }))
+
+    return pd.concat(frames, ignore_index=True)
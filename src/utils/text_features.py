@@ -0,0 +1,145 @@
+import os
+import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+from src.utils.processings import read_tsv_chunks, PLOT_SUMMARIES_CATEGORIES, DEFAULT_CHUNKSIZE
+
+DEFAULT_CACHE_PATH = 'data/cache/plot_tfidf.npz'
+DEFAULT_N_FEATURES = 2 ** 18
+
+
+def _vectorizer(n_features):
+    # Raw term counts: the idf weighting needs the document frequencies of the whole corpus
+    return HashingVectorizer(n_features=n_features, alternate_sign=False, norm=None, stop_words='english', dtype=np.float32)
+
+
+def _hash_chunk(args):
+    texts, n_features = args
+    return _vectorizer(n_features).transform(texts)
+
+
+def _chunk_tasks(file_path, n_features, chunksize, movie_ids):
+    for df_plots in read_tsv_chunks(file_path, PLOT_SUMMARIES_CATEGORIES, chunksize):
+        movie_ids.append(df_plots['movie_id'].to_numpy(dtype=np.int64))
+        yield df_plots['summary'].fillna('').tolist(), n_features
+
+
+def _map_bounded(func, tasks, n_jobs):
+    """Ordered results of func over tasks in a process pool, reading at most 2 * n_jobs tasks ahead."""
+    results, pending = [], deque()
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        for task in tasks:
+            pending.append(executor.submit(func, task))
+            if len(pending) >= 2 * n_jobs:
+                results.append(pending.popleft().result())
+        results.extend(future.result() for future in pending)
+    return results
+
+
+def _source_fingerprint(file_path, **params):
+    stat = os.stat(file_path)
+    return json.dumps({'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, **params}, sort_keys=True)
+
+
+def save_text_features(path, matrix, movie_ids, fingerprint=''):
+    """
+    Saves a CSR matrix and the movie id of each of its rows in a single .npz file.
+
+    Args:
+        path (str): Path of the .npz file.
+        matrix (scipy.sparse matrix): The features.
+        movie_ids (np.ndarray): Movie id of each row.
+        fingerprint (str): Description of the source and parameters, to invalidate the cache.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    matrix = sparse.csr_matrix(matrix)
+    tmp_path = f"{path}.part.npz"
+    np.savez(tmp_path, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr, shape=np.array(matrix.shape),
+             movie_ids=np.asarray(movie_ids, dtype=np.int64), fingerprint=np.array(fingerprint))
+    os.replace(tmp_path, path)
+
+
+def load_text_features(path):
+    """
+    Loads a file written by save_text_features.
+
+    Args:
+        path (str): Path of the .npz file.
+
+    Returns:
+        tuple: The CSR matrix, the movie ids of its rows and the fingerprint.
+    """
+    with np.load(path) as arrays:
+        matrix = sparse.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=tuple(arrays['shape']))
+        return matrix, arrays['movie_ids'], str(arrays['fingerprint'])
+
+
+def plot_tfidf_features(file_path, cache_path=DEFAULT_CACHE_PATH, n_features=DEFAULT_N_FEATURES, chunksize=DEFAULT_CHUNKSIZE,
+                        n_jobs=None, sublinear_tf=True):
+    """
+    Hashed TF-IDF features of the plot summaries. plot_summaries.txt is streamed by chunks, hashed in worker
+    processes (no vocabulary pass, bounded memory), then weighted by the inverse document frequencies.
+    The result is cached and only recomputed when the file or the parameters change.
+
+    Args:
+        file_path (str): Path of plot_summaries.txt.
+        cache_path (str): Path of the cached .npz file, None to disable the cache.
+        n_features (int): Number of hashed features.
+        chunksize (int): Number of summaries per chunk.
+        n_jobs (int): Number of processes, None for all cores.
+        sublinear_tf (bool): Use 1 + log(tf) instead of the raw term frequencies.
+
+    Returns:
+        tuple: The L2-normalized CSR matrix (summaries x n_features, float32) and the movie id of each row.
+    """
+    fingerprint = _source_fingerprint(file_path, n_features=n_features, sublinear_tf=sublinear_tf)
+    if cache_path is not None and os.path.isfile(cache_path):
+        matrix, movie_ids, cached_fingerprint = load_text_features(cache_path)
+        if cached_fingerprint == fingerprint:
+            return matrix, movie_ids
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    movie_ids = []
+    tasks = _chunk_tasks(file_path, n_features, chunksize, movie_ids)
+    if n_jobs == 1:
+        chunks = [_hash_chunk(task) for task in tasks]
+    else:
+        chunks = _map_bounded(_hash_chunk, tasks, n_jobs)
+
+    counts = sparse.vstack(chunks, format='csr') if chunks else sparse.csr_matrix((0, n_features), dtype=np.float32)
+    matrix = TfidfTransformer(sublinear_tf=sublinear_tf).fit_transform(counts).astype(np.float32)
+    movie_ids = np.concatenate(movie_ids) if movie_ids else np.empty(0, dtype=np.int64)
+
+    if cache_path is not None:
+        save_text_features(cache_path, matrix, movie_ids, fingerprint)
+    return matrix, movie_ids
+
+
+def align_rows(matrix, movie_ids, target_ids):
+    """
+    Reorders the rows of a feature matrix to follow other movie ids (e.g. df_movies['wikipedia_movie_id']),
+    movies without a row get an empty row. The result can be stacked with the numeric features
+    (scipy.sparse.hstack) and fed to the models of src.models.
+
+    Args:
+        matrix (scipy.sparse matrix): The features.
+        movie_ids (np.ndarray): Movie id of each row of the matrix.
+        target_ids (array-like): Movie ids of the output rows.
+
+    Returns:
+        scipy.sparse.csr_matrix: One row per target id.
+    """
+    movie_ids = pd.Index(movie_ids)
+    # The first row of a duplicated movie id is used
+    first_rows = np.flatnonzero(~movie_ids.duplicated())
+    positions = movie_ids[first_rows].get_indexer(pd.Index(target_ids))
+    known = positions >= 0
+    selection = sparse.csr_matrix(
+        (np.ones(known.sum(), dtype=matrix.dtype), (np.flatnonzero(known), first_rows[positions[known]])),
+        shape=(len(positions), matrix.shape[0])
+    )
+    return (selection @ matrix).tocsr()
@@ -0,0 +1,223 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from fuzzywuzzy import fuzz
+
+
+def normalize_titles(titles):
+    """
+    Normalize movie titles: lowercase, remove special characters and collapse whitespaces.
+    Vectorized version of the notebook's normalize_title.
+
+    Args:
+        titles (pd.Series): Movie titles.
+
+    Returns:
+        pd.Series: The normalized titles (missing values are kept).
+    """
+    return (pd.Series(titles).astype('string').str.lower()
+            .str.replace(r'[^\w\s]', '', regex=True)
+            .str.replace(r'\s+', ' ', regex=True)
+            .str.strip()
+            .astype(object).where(lambda normalized: normalized.notna(), None))
+
+
+def _title_ngrams(title, n):
+    """Character n-grams of each token of the title: they do not depend on the order of the tokens."""
+    return {f' {token} '[i:i + n] for token in title.split() for i in range(len(token) + 3 - n)}
+
+
+def _ngram_matrix(titles, vocabulary, n):
+    """Binary titles x n-grams CSR matrix, the vocabulary (n-gram -> column) is extended in place."""
+    indices, indptr = [], [0]
+    for title in titles:
+        for ngram in _title_ngrams(title, n):
+            indices.append(vocabulary.setdefault(ngram, len(vocabulary)))
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.float32)
+    return sparse.csr_matrix((data, np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)))
+
+
+class TitleIndex:
+    """
+    Blocking index over a set of titles (e.g. the MovieFranchises titles). The titles are normalized once and
+    indexed by character n-grams, so that a query only scores the few titles sharing enough n-grams
+    (and released around the same year), instead of every title.
+    """
+
+    def __init__(self, titles, years=None, ngram_size=3):
+        """
+        Args:
+            titles (pd.Series): Titles to index.
+            years (pd.Series): Release years of the titles, if any.
+            ngram_size (int): Size of the character n-grams.
+        """
+        self.index = pd.Series(titles).index
+        self.titles = normalize_titles(titles).fillna('').to_numpy(dtype=object)
+        self.years = None if years is None else pd.to_numeric(pd.Series(years), errors='coerce').to_numpy(dtype=float)
+        self.ngram_size = ngram_size
+
+        self.vocabulary = {}
+        self.matrix = _ngram_matrix(self.titles, self.vocabulary, ngram_size)
+        self.n_ngrams = np.asarray(self.matrix.sum(axis=1)).ravel()
+
+    def candidates(self, titles, years=None, year_tolerance=1, min_similarity=0.5, top_k=5, block_size=2048):
+        """
+        Candidate pairs between the queried titles and the indexed titles.
+
+        Args:
+            titles (np.ndarray): Normalized query titles.
+            years (np.ndarray): Release years of the queries, if any.
+            year_tolerance (int): Maximum difference between the release years (ignored if a year is missing).
+            min_similarity (float): Minimum Dice coefficient between the n-gram sets.
+            top_k (int): Maximum number of candidates per query.
+            block_size (int): Number of queries compared at once, bounds the memory.
+
+        Returns:
+            tuple: Query positions and indexed positions of the candidate pairs.
+        """
+        # Unknown n-grams of the queries can not match, they only count in their total
+        vocabulary = dict(self.vocabulary)
+        queries = _ngram_matrix(titles, vocabulary, self.ngram_size)
+        n_query_ngrams = np.asarray(queries.sum(axis=1)).ravel()
+        queries = queries[:, :self.matrix.shape[1]].tocsr()
+        if queries.shape[1] < self.matrix.shape[1]:
+            queries.resize((queries.shape[0], self.matrix.shape[1]))
+
+        query_positions, indexed_positions = [], []
+        for start in range(0, queries.shape[0], block_size):
+            shared = (queries[start:start + block_size] @ self.matrix.T).tocoo()
+            rows, cols = shared.row + start, shared.col
+            dice = 2 * shared.data / (n_query_ngrams[rows] + self.n_ngrams[cols])
+
+            keep = dice >= min_similarity
+            if years is not None and self.years is not None:
+                year_gap = np.abs(years[rows] - self.years[cols])
+                keep &= ~(year_gap > year_tolerance)  # NaN gaps (missing years) are kept
+            rows, cols, dice = rows[keep], cols[keep], dice[keep]
+
+            # Best top_k candidates of each query
+            order = np.lexsort((-dice, rows))
+            rows, cols = rows[order], cols[order]
+            rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+            query_positions.append(rows[rank < top_k])
+            indexed_positions.append(cols[rank < top_k])
+
+        if not query_positions:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(query_positions), np.concatenate(indexed_positions)
+
+    def match(self, titles, years=None, threshold=85, year_tolerance=1, min_similarity=0.5, top_k=5,
+              scorer=fuzz.token_sort_ratio, n_jobs=None):
+        """
+        Best match of each query title among the indexed titles, like fuzzywuzzy's process.extractOne,
+        but only scoring the candidates of the blocking index.
+
+        Args:
+            titles (pd.Series): Query titles.
+            years (pd.Series): Release years of the queries, if any.
+            threshold (int): Minimum score of a match.
+            year_tolerance (int): Maximum difference between the release years.
+            min_similarity (float): Minimum n-gram Dice coefficient of a candidate.
+            top_k (int): Maximum number of candidates scored per query.
+            scorer (callable): Scoring function of two strings (0-100), must be picklable if n_jobs != 1.
+            n_jobs (int): Number of processes scoring the candidates, None for all cores.
+
+        Returns:
+            pd.DataFrame: One row per matched query: 'query_index', 'match_index' (indexes of the inputs),
+            'query_title', 'matched_title' (normalized) and 'score'.
+        """
+        titles = pd.Series(titles)
+        normalized = normalize_titles(titles).fillna('').to_numpy(dtype=object)
+        years = None if years is None else pd.to_numeric(pd.Series(years), errors='coerce').to_numpy(dtype=float)
+
+        query_positions, indexed_positions = self.candidates(
+            normalized, years, year_tolerance=year_tolerance, min_similarity=min_similarity, top_k=top_k
+        )
+        scores = score_pairs(normalized[query_positions], self.titles[indexed_positions], scorer=scorer, n_jobs=n_jobs)
+
+        matches = pd.DataFrame({'query': query_positions, 'match': indexed_positions, 'score': scores})
+        matches = matches[matches['score'] >= threshold]
+        # Keep the best score of each query, the first candidate on ties
+        matches = matches.sort_values(['query', 'score'], ascending=[True, False], kind='stable').drop_duplicates('query')
+
+        query_positions, indexed_positions = matches['query'].to_numpy(), matches['match'].to_numpy()
+        return pd.DataFrame({
+            'query_index': titles.index[query_positions],
+            'match_index': self.index[indexed_positions],
+            'query_title': normalized[query_positions],
+            'matched_title': self.titles[indexed_positions],
+            'score': matches['score'].to_numpy(),
+        })
+
+
+def _score_chunk(args):
+    left, right, scorer = args
+    return [scorer(a, b) for a, b in zip(left, right)]
+
+
+def score_pairs(left, right, scorer=fuzz.token_sort_ratio, n_jobs=None, chunk_size=5000):
+    """
+    Score pairs of strings, in parallel across processes.
+
+    Args:
+        left (np.ndarray): First strings of the pairs.
+        right (np.ndarray): Second strings of the pairs.
+        scorer (callable): Scoring function of two strings, must be picklable if n_jobs != 1.
+        n_jobs (int): Number of processes, None for all cores.
+        chunk_size (int): Number of pairs per task.
+
+    Returns:
+        np.ndarray: The scores.
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+    chunks = [(left[start:start + chunk_size], right[start:start + chunk_size], scorer)
+              for start in range(0, len(left), chunk_size)]
+
+    if n_jobs == 1 or len(chunks) <= 1:
+        results = [_score_chunk(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(chunks))) as executor:
+            results = list(executor.map(_score_chunk, chunks))
+
+    return np.array([score for chunk_scores in results for score in chunk_scores], dtype=np.int64)
+
+
+def fuzzy_merge(df1, df2, key1, key2, columns, year1=None, year2=None, threshold=85, **kwargs):
+    """
+    Add columns of df2 to df1 by fuzzy matching of titles (indexed version of the notebook's fuzzy_merge_budget).
+    Unmatched rows get missing values.
+
+    Args:
+        df1 (pd.DataFrame): Dataframe to complete.
+        df2 (pd.DataFrame): Dataframe with the columns to add.
+        key1 (str): Title column of df1.
+        key2 (str): Title column of df2.
+        columns (list): Columns of df2 to add to df1.
+        year1 (str): Release year column of df1, if any.
+        year2 (str): Release year column of df2, if any.
+        threshold (int): Minimum match score.
+        **kwargs: Other arguments of TitleIndex.match.
+
+    Returns:
+        tuple: The merged dataframe and the match table.
+    """
+    # Positional indexes, so that duplicated labels are not an issue
+    df2_positional = df2.reset_index(drop=True)
+    index = TitleIndex(df2_positional[key2], None if year2 is None else df2_positional[year2])
+    matches = index.match(df1[key1].reset_index(drop=True), None if year1 is None else df1[year1].reset_index(drop=True),
+                          threshold=threshold, **kwargs)
+
+    added = df2_positional.loc[matches['match_index'], columns].set_axis(matches['query_index'], axis=0)
+    added = added.reindex(pd.RangeIndex(len(df1)))
+
+    df_merged = df1.copy()
+    for column in columns:
+        df_merged[column] = added[column].to_numpy()
+
+    # Report the matches with the labels of the inputs
+    matches['query_index'] = df1.index[matches['query_index'].to_numpy()]
+    matches['match_index'] = df2.index[matches['match_index'].to_numpy()]
+    return df_merged, matches